@@ -0,0 +1,334 @@
+"""
+Benchmarks for each stage of the processing pipeline.
+
+Each stage is timed over the captured feeds in `tests/data`, scaled up to a single feed, an hour of feeds, or a day of
+feeds, and its throughput and peak memory use are reported as JSON, so that results can be compared from one commit to
+the next. For example:
+
+    python benchmarks.py --scales feed hour --output results.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import processing
+import synthetic_feeds
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "data")
+
+# The captured pulls which the scaled-up feed sequences are built out of. Pull 8 is left out, as it contains a trip
+# update which `_ActionLogBuilder` does not accept.
+FEED_FIXTURES = ["gtfs_realtime_pull_1.dat", "gtfs_realtime_pull_2.dat"]
+ACTION_LOG_FIXTURES = ["S02R_tripwise_action_log_1.csv", "S02R_tripwise_action_log_2.csv"]
+
+# The length of each scale, in seconds of feeds.
+SCALES = {'feed': 0, 'hour': 3600, 'day': 86400}
+
+SOURCES = ['fixtures', 'synthetic']
+
+STAGES = ['decode', 'action_log', 'wire_action_log', 'trip_log', 'trip_logbook', 'join_trip_logs',
+          'merge_trip_logbooks']
+
+
+def load_feed_fixtures(data_directory=DATA_DIRECTORY):
+    """
+    Returns the raw bytes of each of the captured feeds.
+    """
+    ret = []
+    for filename in FEED_FIXTURES:
+        with open(os.path.join(data_directory, filename), "rb") as f:
+            ret.append(f.read())
+    return ret
+
+
+def load_action_log_fixtures(data_directory=DATA_DIRECTORY):
+    """
+    Returns the captured S02R tripwise action logs, in information time order. Identifiers are read as strings, as
+    they are in parsed feeds; a route id of 1 would otherwise be read in as an integer.
+    """
+    dtypes = {'trip_id': str, 'route_id': str, 'stop_id': str}
+    return [pd.read_csv(os.path.join(data_directory, filename), index_col=0, dtype=dtypes)
+            for filename in ACTION_LOG_FIXTURES]
+
+
+def scale_feeds(fixtures, duration, cadence=60, trip_lifetime=1800):
+    """
+    Builds a sequence of raw feeds covering `duration` seconds at one feed every `cadence` seconds (or a single feed,
+    if `duration` is zero) by replaying the captured feeds in turn.
+
+    Replaying the same feeds over and over would have the same trips running all day long, so the trip ids in each
+    successive `trip_lifetime` seconds' worth of feeds are given a fresh suffix: every trip runs for that long, and then
+    terminates, and is replaced by a new one.
+
+    Returns a (feeds, information times) tuple.
+    """
+    from google.transit import gtfs_realtime_pb2
+
+    n = max(1, duration // cadence)
+    feeds_per_generation = max(1, trip_lifetime // cadence)
+
+    feeds, information_times, start = [], [], None
+    for i in range(n):
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(fixtures[i % len(fixtures)])
+        start = int(feed.header.timestamp) if start is None else start
+
+        suffix = "_{0}".format(i // feeds_per_generation)
+        for entity in feed.entity:
+            if entity.HasField('trip_update'):
+                entity.trip_update.trip.trip_id += suffix
+            elif entity.HasField('vehicle'):
+                entity.vehicle.trip.trip_id += suffix
+
+        feeds.append(feed.SerializeToString())
+        information_times.append(start + i * cadence)
+    return feeds, information_times
+
+
+def synthesize_feeds(duration, cadence=60, lines=10, headway=300, seed=0):
+    """
+    Builds a sequence of raw synthetic feeds (see `synthetic_feeds.generate_feeds`) covering `duration` seconds at one
+    feed every `cadence` seconds, for `lines` lines each dispatching a trip every `headway` seconds. If `duration` is
+    zero, a single feed is built, taken from the end of an hour's worth so that the lines are fully loaded.
+
+    Returns a (feeds, information times) tuple.
+    """
+    generated = synthetic_feeds.generate_feeds(lines=lines, trips_per_line=max(1, max(duration, 3600) // headway),
+                                               cadence=cadence, duration=max(duration, 3600), raw=True, seed=seed)
+    generated = list(generated) if duration > 0 else list(generated)[-1:]
+    return [feed for _, feed in generated], [information_time for information_time, _ in generated]
+
+
+def measure(stage, scale, unit, items, setup, run, repeat=3):
+    """
+    Times a stage, returning its result record.
+
+    `setup` is called before every run, and returns the arguments to `run`, so that the cost of preparing a stage's
+    inputs is excluded from its measurements. The stage is timed `repeat` times, and the fastest run is kept; its peak
+    memory use (the most memory allocated by the run, over and above its inputs) is measured in one further run under
+    tracemalloc, which would otherwise slow it down.
+    """
+    seconds = []
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        seconds.append(time.perf_counter() - start)
+
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(seconds)
+    return {
+        'stage': stage,
+        'scale': scale,
+        'unit': unit,
+        'items': items,
+        'seconds': best,
+        'throughput': items / best if best > 0 else None,
+        'peak_memory_bytes': peak
+    }
+
+
+def split_feeds(feeds, information_times, bounds):
+    """
+    Splits a sequence of feeds into runs of consecutive feeds at the given bounds. A sequence of a single feed is split
+    by giving each run its own copy of it, each a second later than the last, so that there is still something to join.
+    """
+    bounds = [0] + list(bounds) + [len(feeds)]
+    if len(feeds) == 1:
+        return [([feeds[0]], [information_times[0] + i]) for i in range(len(bounds) - 1)]
+    return [(feeds[start:stop], information_times[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def benchmark_scale(scale, fixtures, action_logs, cadence=60, trip_lifetime=1800, repeat=3, chunk_size=10,
+                    stages=None, source='fixtures'):
+    """
+    Runs each of the benchmarks at a single scale, returning a list of result records.
+    """
+    stages = stages if stages is not None else STAGES
+    if source == 'synthetic':
+        feeds, information_times = synthesize_feeds(SCALES[scale], cadence=cadence)
+    else:
+        feeds, information_times = scale_feeds(fixtures, SCALES[scale], cadence=cadence, trip_lifetime=trip_lifetime)
+    n = len(feeds)
+    results = []
+
+    if 'decode' in stages:
+        results.append(measure('decode', scale, 'feeds', n, lambda: (feeds,),
+                               lambda raw: [processing._decode_feed(feed) for feed in raw], repeat=repeat))
+
+    if 'action_log' in stages:
+        decoded = [processing._decode_feed(feed) for feed in feeds]
+        results.append(measure(
+            'action_log', scale, 'feeds', n, lambda: (decoded,),
+            lambda parsed: [processing._parse_message_list_into_action_log(feed.entity, information_time)
+                            for feed, information_time in zip(parsed, information_times)],
+            repeat=repeat
+        ))
+        del decoded
+
+    if 'wire_action_log' in stages:
+        # Unlike the action_log stage, this starts from raw bytes, as the wire decoder does not go through the bindings.
+        results.append(measure(
+            'wire_action_log', scale, 'feeds', n, lambda: (feeds,),
+            lambda raw: [processing._parse_feed_into_action_log(feed, information_time, decoder='wire')
+                         for feed, information_time in zip(raw, information_times)],
+            repeat=repeat
+        ))
+
+    if 'trip_log' in stages:
+        # A single feed gives every trip just the one action log, so the captured S02R action logs are added in.
+        tables = processing._parse_feeds_into_action_log_tables(feeds, information_times)
+        presence = processing.index_trip_presence(table.keys() for table in tables)
+        tripwise_action_logs = [action_logs] + [
+            [table[trip_id] for table in tables[seen.first_seen:seen.last_seen + 1] if trip_id in table]
+            for trip_id, seen in presence.items()
+        ]
+        del tables
+        results.append(measure(
+            'trip_log', scale, 'trips', len(tripwise_action_logs), lambda: (tripwise_action_logs,),
+            lambda jobs: [processing.parse_tripwise_action_logs_into_trip_log(logs) for logs in jobs],
+            repeat=repeat
+        ))
+        del tripwise_action_logs
+
+    if 'trip_logbook' in stages:
+        results.append(measure('trip_logbook', scale, 'feeds', n, lambda: (feeds, information_times),
+                               processing.parse_feeds_into_trip_logbook, repeat=repeat))
+
+    if 'join_trip_logs' in stages:
+        # The feeds are split in two in the middle of a trip lifetime, so that the trips running then are in both.
+        middle = min(n - 1, n // 2 + max(1, trip_lifetime // cadence) // 2)
+        halves = split_feeds(feeds, information_times, [middle])
+        left, right = [processing.parse_feeds_into_trip_logbook(*half) for half in halves]
+        pairs = [(left[trip_id], right[trip_id]) for trip_id in left if trip_id in right]
+        results.append(measure(
+            'join_trip_logs', scale, 'trips', len(pairs), lambda: (pairs,),
+            lambda jobs: [processing._join_trip_logs(l, r) for l, r in jobs], repeat=repeat
+        ))
+        del left, right, pairs
+
+    if 'merge_trip_logbooks' in stages:
+        bounds = list(range(chunk_size, n, chunk_size)) if n > 1 else [1]
+        logbooks = [processing.parse_feeds_into_trip_logbook(*part)
+                    for part in split_feeds(feeds, information_times, bounds)]
+        for method in ['fold', 'tree']:
+            # Folding updates its accumulator in place, so each run gets its own copy of the logbooks.
+            results.append(measure(
+                'merge_trip_logbooks[{0}]'.format(method), scale, 'logbooks', len(logbooks),
+                lambda: ([dict(logbook) for logbook in logbooks],),
+                lambda books, method=method: processing.merge_trip_logbooks(books, method=method), repeat=repeat
+            ))
+
+    for result in results:
+        result['feeds'] = n
+    return results
+
+
+def _git_commit():
+    """
+    Returns the hash of the commit the benchmarks are being run against, or None if it cannot be determined.
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales=('feed', 'hour'), cadence=60, trip_lifetime=1800, repeat=3, chunk_size=10, stages=None,
+                   source='fixtures', data_directory=DATA_DIRECTORY):
+    """
+    Runs the benchmarks at each of the given scales, returning a JSON-serializable report.
+
+    Parameters
+    ----------
+    scales, iterable of {'feed', 'hour', 'day'}
+        The scales at which to run the benchmarks.
+    cadence, int
+        The number of seconds between successive feeds.
+    trip_lifetime, int
+        The number of seconds each trip runs for before terminating; see `scale_feeds`.
+    repeat, int
+        The number of times each stage is timed. The fastest time is reported.
+    chunk_size, int
+        The number of feeds in each of the logbooks being merged by the `merge_trip_logbooks` benchmarks.
+    stages, list of str or None
+        The stages to benchmark; see STAGES. All of them, if None.
+    source: {'fixtures', 'synthetic'}
+        Whether to build the feeds by replaying the captured fixtures (see `scale_feeds`), or to generate synthetic
+        ones (see `synthesize_feeds`), which have a realistic mix of trips starting, running, and terminating.
+    data_directory, str
+        The directory containing the captured fixtures.
+    """
+    for scale in scales:
+        if scale not in SCALES:
+            raise ValueError("Unknown scale {0!r}; must be one of {1}.".format(scale, ", ".join(SCALES)))
+    for stage in stages or []:
+        if stage not in STAGES:
+            raise ValueError("Unknown stage {0!r}; must be one of {1}.".format(stage, ", ".join(STAGES)))
+    if source not in SOURCES:
+        raise ValueError("Unknown source {0!r}; must be one of {1}.".format(source, ", ".join(SOURCES)))
+
+    fixtures, action_logs = load_feed_fixtures(data_directory), load_action_log_fixtures(data_directory)
+    results = []
+    for scale in scales:
+        results += benchmark_scale(scale, fixtures, action_logs, cadence=cadence, trip_lifetime=trip_lifetime,
+                                   repeat=repeat, chunk_size=chunk_size, stages=stages, source=source)
+
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'source': source,
+        'cadence': cadence,
+        'trip_lifetime': trip_lifetime,
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the processing pipeline.")
+    parser.add_argument('--scales', nargs='+', default=['feed', 'hour'], choices=list(SCALES))
+    parser.add_argument('--stages', nargs='+', default=None, choices=STAGES)
+    parser.add_argument('--source', default='fixtures', choices=SOURCES)
+    parser.add_argument('--cadence', type=int, default=60, help="Seconds between successive feeds.")
+    parser.add_argument('--trip-lifetime', type=int, default=1800, help="Seconds each trip runs for.")
+    parser.add_argument('--repeat', type=int, default=3, help="Times each stage is timed; the fastest is reported.")
+    parser.add_argument('--chunk-size', type=int, default=10, help="Feeds per logbook in the merge benchmarks.")
+    parser.add_argument('--output', default=None, help="File to write the report to, instead of standard output.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(scales=args.scales, cadence=args.cadence, trip_lifetime=args.trip_lifetime,
+                            repeat=args.repeat, chunk_size=args.chunk_size, stages=args.stages, source=args.source)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,110 @@
 import pandas as pd
 import numpy as np
+import bisect
 import collections
+import collections.abc
+import contextlib
+import functools
 import itertools
+import os
+import sys
+import time
+
+
+ARCHIVE_URL = "https://datamine-history.s3.amazonaws.com/{0}-{1}"
+
+
+class ArchiveCache:
+    def __init__(self, directory, max_bytes=None, offline=False):
+        """
+        An on-disk cache of raw archival GTFS-Realtime data, keyed on the rollup kind and timestamp. The archives are
+        immutable, so once one has been downloaded it never needs to be downloaded again.
+
+        Parameters
+        ----------
+        directory, str
+            The directory the cached archives are kept in.
+        max_bytes, int or None
+            The maximum total size of the cache. When this is exceeded, the least recently used archives are evicted
+            until it no longer is. If None, the cache may grow without bound.
+        offline, bool
+            If True, `fetch_archival_gtfs_realtime_data` will never touch the network when using this cache; archives
+            not already in the cache raise a LookupError instead.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, kind, timestamp):
+        return os.path.join(self.directory, "{0}-{1}".format(kind, timestamp))
+
+    def get(self, kind, timestamp):
+        """
+        Returns the cached bytes for an archive, or None if it is not in the cache.
+        """
+        path = self._path(kind, timestamp)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # Recency of use is tracked using the file modification time, so that it persists across processes.
+        os.utime(path)
+        self.hits += 1
+        return content
+
+    def put(self, kind, timestamp, content):
+        """
+        Stores the bytes for an archive in the cache, evicting the least recently used archives if need be.
+        """
+        path = self._path(kind, timestamp)
+        with open(path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+        self._evict(keep=os.path.basename(path))
+
+    def _evict(self, keep=None):
+        if self.max_bytes is None:
+            return
+
+        # Other threads or processes may be evicting from the same directory concurrently.
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+        entries.sort()
 
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
 
-def fetch_archival_gtfs_realtime_data(kind='gtfs', timestamp='2014-09-17-09-31', raw=False):
+    @property
+    def size(self):
+        """The total size of the archives in the cache, in bytes."""
+        return sum(os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)
+                   if not name.endswith(".tmp"))
+
+
+def fetch_archival_gtfs_realtime_data(kind='gtfs', timestamp='2014-09-17-09-31', raw=False, cache=None,
+                                      archive_url=ARCHIVE_URL, pack=None):
     """
     Returns archived GTFS data for a particular time_assigned.
 
@@ -18,93 +118,760 @@ def fetch_archival_gtfs_realtime_data(kind='gtfs', timestamp='2014-09-17-09-31',
         41, 46, 51, and 56 minutes after the hour, so only these times will be valid.
     raw: bool
         Whether or not to return the raw requests object instead of the parsed GRFS-R record. Used in testing.
+    cache: ArchiveCache or None
+        If provided, archives are read from this cache when present, and stored in it after being downloaded.
+    archive_url: str
+        The URL template the archives are downloaded from, formatted with the kind and timestamp.
+    pack: FeedPack or None
+        If provided, and the archive is in this feed pack, it is read from there (as a memoryview, if `raw`) instead.
     """
-    import requests
-    from google.transit import gtfs_realtime_pb2
+    content = pack.get(kind, timestamp) if pack is not None else None
+    if content is None and cache is not None:
+        content = cache.get(kind, timestamp)
+
+    if content is None:
+        if cache is not None and cache.offline:
+            raise LookupError("The {0}-{1} archive is not in the cache, and the cache is offline.".format(kind,
+                                                                                                        timestamp))
+
+        import requests
+        response = requests.get(archive_url.format(kind, timestamp))
+        content = response.content
 
-    response = requests.get("https://datamine-history.s3.amazonaws.com/{0}-{1}".format(kind, timestamp))
+        if cache is not None and _classify_archive_response(response.status_code, content) is None:
+            cache.put(kind, timestamp, content)
 
     if raw:
-        return response.content
+        return content
     else:
+        from google.transit import gtfs_realtime_pb2
+
         feed = gtfs_realtime_pb2.FeedMessage()
-        feed.ParseFromString(response.content)
+        feed.ParseFromString(content)
         return feed
 
 
-def _parse_gtfs_into_action_log(feed, information_time):
+class ArchiveFetchError(IOError):
+    def __init__(self, kind, timestamp, reason, detail=None):
+        """
+        An archive which could not be fetched.
+
+        Parameters
+        ----------
+        kind, str
+            The rollup the archive belongs to.
+        timestamp, str
+            The timestamp of the archive.
+        reason: {'permission-denied', 'truncated', 'missing', 'http-error', 'network', 'offline'}
+            Why the archive could not be fetched. 'permission-denied' and 'truncated' are the two failure modes
+            described in data/README.md: the server answering every request with "Permission denied", and the server
+            returning a partially written message (which cannot be parsed) while it is mid-update. In the latter
+            scenario the server may also respond 404, which is reported as 'missing'.
+        detail, str or None
+            Any additional information about the failure.
+        """
+        message = "Could not fetch the {0}-{1} archive ({2})".format(kind, timestamp, reason)
+        super().__init__(message + (": {0}".format(detail) if detail else "."))
+        self.kind = kind
+        self.timestamp = timestamp
+        self.reason = reason
+
+
+def _classify_archive_response(status_code, content):
     """
-    Parses a GTFS-Realtime feed into a single pandas.DataFrame
+    Returns None if an archive response holds a valid GTFS-Realtime message, or the ArchiveFetchError reason
+    explaining why it does not.
+    """
+    from google.transit import gtfs_realtime_pb2
+    from google.protobuf.message import DecodeError
+
+    if status_code in (401, 403) or content.strip().startswith(b'Permission denied'):
+        return 'permission-denied'
+    elif status_code == 404:
+        return 'missing'
+    elif status_code != 200:
+        return 'http-error'
+    elif not content:
+        return 'truncated'
+
+    try:
+        gtfs_realtime_pb2.FeedMessage().ParseFromString(content)
+    except DecodeError:
+        return 'truncated'
+    return None
+
+
+def archival_timestamps(start, end):
+    """
+    Returns the list of archive timestamps between two times (inclusive), both given in the archive's
+    2014-09-18-09-31 format. Archives are stamped at 01, 06, 11, ..., 56 minutes after the hour.
+    """
+    import datetime
+
+    time_format = '%Y-%m-%d-%H-%M'
+    current = datetime.datetime.strptime(start, time_format)
+    end = datetime.datetime.strptime(end, time_format)
+    current += datetime.timedelta(minutes=(1 - current.minute) % 5)
+
+    timestamps = []
+    while current <= end:
+        timestamps.append(current.strftime(time_format))
+        current += datetime.timedelta(minutes=5)
+    return timestamps
+
+
+def fetch_archival_gtfs_realtime_data_range(kind='gtfs', start='2014-09-17-09-00', end='2014-09-17-10-00',
+                                            max_concurrency=8, cache=None, archive_url=ARCHIVE_URL, timeout=60):
+    """
+    Fetches every archive of a particular kind between two times, concurrently, over a pooled connection.
+
+    This is a generator, yielding (timestamp, content) tuples in timestamp order, each as soon as it (and every
+    archive before it) has been fetched. The content is the raw bytes of the archive or, if the archive could not be
+    fetched, an ArchiveFetchError classifying the failure. Failures do not hold up the rest of the batch.
 
     Parameters
     ----------
-    feed, gtfs_realtime_pb2.FeedMessage object
-        The feed being processed.
+    kind: {'gtfs', 'gtfs-l', 'gtfs-si'}
+        The rollup to fetch. See `fetch_archival_gtfs_realtime_data`.
+    start, end: str
+        The range of times to fetch archives for, inclusive, in the 2014-09-18-09-31 format.
+    max_concurrency: int
+        The maximum number of archives to have in flight at once.
+    cache: ArchiveCache or None
+        If provided, archives are read from this cache when present, and stored in it after being downloaded.
+    archive_url: str
+        The URL template the archives are downloaded from, formatted with the kind and timestamp.
+    timeout: float
+        How long to wait on the server before giving up on an archive, in seconds.
     """
-    return _parse_message_list_into_action_log(feed.entity, information_time)
+    import concurrent.futures
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def fetch(timestamp):
+        content = cache.get(kind, timestamp) if cache is not None else None
+        if content is not None:
+            return content
+        elif cache is not None and cache.offline:
+            return ArchiveFetchError(kind, timestamp, 'offline')
+
+        try:
+            response = session.get(archive_url.format(kind, timestamp), timeout=timeout)
+        except requests.RequestException as e:
+            return ArchiveFetchError(kind, timestamp, 'network', str(e))
+
+        reason = _classify_archive_response(response.status_code, response.content)
+        if reason is not None:
+            return ArchiveFetchError(kind, timestamp, reason)
+        if cache is not None:
+            cache.put(kind, timestamp, response.content)
+        return response.content
 
+    # Keep a bounded window of archives in flight, so that long ranges don't pile up in memory ahead of the consumer.
+    with session, concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pending = collections.deque()
+        for timestamp in archival_timestamps(start, end):
+            pending.append((timestamp, executor.submit(fetch, timestamp)))
+            if len(pending) >= 2 * max_concurrency:
+                timestamp, future = pending.popleft()
+                yield timestamp, future.result()
+        while pending:
+            timestamp, future = pending.popleft()
+            yield timestamp, future.result()
 
-def _parse_message_list_into_action_log(messages, information_time):
+
+# Feed packs are laid out as: the magic bytes, every feed's raw bytes back to back, a JSON index of the feeds' keys,
+# offsets, and lengths, and finally the offset of that index followed by the magic bytes again.
+_FEED_PACK_MAGIC = b'GTFSRPK1'
+
+
+def _read_feed_pack_index(f):
+    """
+    Given an open feed pack file, returns its index, and the offset at which the index (and hence the end of the feed
+    data) begins.
+    """
+    import json
+    import struct
+
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    if f.read(len(_FEED_PACK_MAGIC)) != _FEED_PACK_MAGIC or size < 2 * len(_FEED_PACK_MAGIC) + 8:
+        raise ValueError("This is not a feed pack file.")
+
+    f.seek(size - len(_FEED_PACK_MAGIC) - 8)
+    index_offset = struct.unpack('<Q', f.read(8))[0]
+    if f.read(len(_FEED_PACK_MAGIC)) != _FEED_PACK_MAGIC:
+        raise ValueError("The feed pack file is truncated.")
+
+    f.seek(index_offset)
+    index = json.loads(f.read(size - len(_FEED_PACK_MAGIC) - 8 - index_offset).decode('utf-8'))
+    return index, index_offset
+
+
+def append_to_feed_pack(path, kind, feeds):
     """
-    Parses a list of messages into a single pandas.DataFrame
+    Appends raw GTFS-Realtime feeds to a feed pack file, creating the file if it does not exist yet. Feed packs keep
+    many archives (for example, a day's worth) in one file, which is much faster to list, copy, and read through than
+    thousands of small per-timestamp files.
+
+    The pack is rewritten into a temporary file, which then replaces it, so that a pack is never left half-written by
+    a failed append, and feeds that have been replaced take up no space. Packs open for reading (see `FeedPack`) keep
+    seeing the feeds they were opened with.
+
+    Parameters
+    ----------
+    path, str
+        The feed pack file.
+    kind: {'gtfs', 'gtfs-l', 'gtfs-si'}
+        The rollup the feeds belong to.
+    feeds, iterable of (str, bytes) tuples
+        The timestamp and raw bytes of each of the feeds being added, e.g. as yielded by
+        `fetch_archival_gtfs_realtime_data_range` (after leaving out any failures). A feed already in the pack is
+        replaced.
     """
+    import json
+    import struct
+
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            index, _ = _read_feed_pack_index(f)
+    else:
+        index = {'kinds': [], 'timestamps': [], 'offsets': [], 'lengths': []}
+    old_entries = {(k, t): (o, l) for k, t, o, l in zip(index['kinds'], index['timestamps'], index['offsets'],
+                                                         index['lengths'])}
+
     try:
-        if messages[0].vehicle.trip.trip_id == "147200_1..N02X017":
-            import pdb; pdb.set_trace()
-    except (KeyboardInterrupt, SystemExit):
+        with open(path + ".tmp", 'wb') as f:
+            f.write(_FEED_PACK_MAGIC)
+
+            # The new feeds go first, so that the old feeds they replace are known by the time those are copied over.
+            entries = dict()
+            for timestamp, content in feeds:
+                entries[(kind, timestamp)] = (f.tell(), len(content))
+                f.write(content)
+
+            if old_entries:
+                with open(path, 'rb') as old:
+                    for key, (offset, length) in sorted(old_entries.items(), key=lambda item: item[1][0]):
+                        if key in entries:
+                            continue
+                        old.seek(offset)
+                        entries[key] = (f.tell(), length)
+                        f.write(old.read(length))
+
+            keys = sorted(entries, key=lambda key: (key[1], key[0]))
+            index = {
+                'kinds': [k for k, _ in keys],
+                'timestamps': [t for _, t in keys],
+                'offsets': [entries[key][0] for key in keys],
+                'lengths': [entries[key][1] for key in keys]
+            }
+            index_offset = f.tell()
+            f.write(json.dumps(index).encode('utf-8'))
+            f.write(struct.pack('<Q', index_offset))
+            f.write(_FEED_PACK_MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+    except BaseException:
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
         raise
-    except:
+
+
+class FeedPack:
+    def __init__(self, path):
+        """
+        Read access to a feed pack file (see `append_to_feed_pack`).
+
+        The file is memory-mapped, and feeds are handed out as zero-copy memoryview slices of it, which may be passed
+        straight to `FeedMessage.ParseFromString` or to `parse_feeds_into_trip_logbook`. Slices still in use when the
+        pack is closed stay valid; the file is unmapped once the last of them has been released or garbage collected.
+
+        Parameters
+        ----------
+        path, str
+            The feed pack file.
+        """
+        import mmap
+
+        self.path = path
+        with open(path, 'rb') as f:
+            index, _ = _read_feed_pack_index(f)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._entries = collections.OrderedDict(
+            ((k, t), (o, l)) for k, t, o, l in zip(index['kinds'], index['timestamps'], index['offsets'],
+                                                    index['lengths'])
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        """The (kind, timestamp) keys of the feeds in the pack, in timestamp order."""
+        return list(self._entries.keys())
+
+    def get(self, kind, timestamp):
+        """
+        Returns the raw bytes of a feed, as a memoryview, or None if the feed is not in the pack.
+        """
+        entry = self._entries.get((kind, timestamp))
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._view[offset:offset + length]
+
+    def feeds(self, kind='gtfs'):
+        """
+        Returns the timestamps, and raw bytes (as memoryviews), of every feed of a particular kind in the pack, in
+        timestamp order, as two lists. Information dates for `parse_feeds_into_trip_logbook` may be gotten from the
+        timestamps using `mta_archival_time_to_unix_timestamp`.
+        """
+        timestamps = [t for k, t in self._entries if k == kind]
+        return timestamps, [self.get(kind, timestamp) for timestamp in timestamps]
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Feeds handed out by the pack are still in use. They hold on to the map, which is closed when it is
+            # garbage collected, after the last of them.
+            pass
+
+
+class StageStats:
+    def __init__(self, name):
+        """
+        The statistics recorded for a single stage of the pipeline (see `instrument`).
+
+        Parameters
+        ----------
+        name, str
+            The name of the stage.
+        """
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.counts = collections.Counter()
+        self.peak_rss = None
+        self.peak_memory = None
+
+    def as_dict(self):
+        ret = {'calls': self.calls, 'seconds': self.seconds, 'peak_rss': self.peak_rss,
+               'peak_memory': self.peak_memory}
+        ret.update(self.counts)
+        return ret
+
+    def __repr__(self):
+        return "StageStats({0!r}, {1})".format(self.name, self.as_dict())
+
+
+class PipelineStats:
+    def __init__(self):
+        """
+        Statistics about the stages of the pipeline run while instrumentation was enabled, keyed by stage name (see
+        `instrument`). Stages nest (parsing feeds into a trip logbook parses action logs, for instance), and each
+        stage's times include those of the stages nested in it.
+        """
+        self.stages = collections.OrderedDict()
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def __contains__(self, name):
+        return name in self.stages
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    def as_dict(self):
+        """
+        Returns the statistics as a dict of dicts, keyed by stage name.
+        """
+        return {name: stage.as_dict() for name, stage in self.stages.items()}
+
+    def summary(self):
+        """
+        Returns a plain-text table of the statistics, one line per stage.
+        """
+        lines = []
+        for name, stage in self.stages.items():
+            counts = ", ".join("{0}={1}".format(key, value) for key, value in sorted(stage.counts.items()))
+            lines.append("{0:<12} {1:>8} calls {2:>10.3f} s  {3}".format(name, stage.calls, stage.seconds, counts))
+        return "\n".join(lines)
+
+
+class _Instrumentation:
+    """
+    The state of an `instrument` block: the statistics being recorded, the callback they are reported to, and the
+    stack of stages currently running.
+    """
+    def __init__(self, callback, trace_memory):
+        self.stats = PipelineStats()
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.stack = []
+
+
+class _StageTimer:
+    """
+    Records a single run of a stage. Stages count whatever they produce by calling `count`.
+    """
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.counts = dict()
+        self.inner_peak = 0
+
+    def count(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def __enter__(self):
+        instrumentation = self.instrumentation
+        if instrumentation.trace_memory:
+            import tracemalloc
+
+            # The traced memory peak is reset for every stage, so every enclosing stage keeps its own running peak.
+            current, peak = tracemalloc.get_traced_memory()
+            if instrumentation.stack:
+                parent = instrumentation.stack[-1]
+                parent.inner_peak = max(parent.inner_peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+        instrumentation.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        instrumentation = self.instrumentation
+        instrumentation.stack.pop()
+
+        stage = instrumentation.stats.stages.get(self.name)
+        if stage is None:
+            stage = instrumentation.stats.stages[self.name] = StageStats(self.name)
+        stage.calls += 1
+        stage.seconds += seconds
+        stage.counts.update(self.counts)
+
+        record = dict(self.counts, stage=self.name, seconds=seconds)
+        peak_rss = _peak_rss()
+        if peak_rss is not None:
+            stage.peak_rss = record['peak_rss'] = peak_rss
+        if instrumentation.trace_memory:
+            import tracemalloc
+
+            peak = max(tracemalloc.get_traced_memory()[1], self.inner_peak)
+            if instrumentation.stack:
+                parent = instrumentation.stack[-1]
+                parent.inner_peak = max(parent.inner_peak, peak)
+            record['peak_memory'] = peak - self.start_memory
+            stage.peak_memory = max(stage.peak_memory or 0, record['peak_memory'])
+
+        if instrumentation.callback is not None:
+            instrumentation.callback(self.name, record)
+        return False
+
+
+class _NullStage:
+    """
+    Stands in for a _StageTimer when instrumentation is disabled, doing nothing.
+    """
+    def count(self, **counts):
         pass
 
-    actions_list = []
-    # action_log = pd.DataFrame(columns=['trip_id', 'route_id', 'action', 'stop_id', 'time_assigned'])
+    def __enter__(self):
+        return self
 
-    # In the MTA case, alerts are provided at the end of the feed. Isolate those from the rest of the entries by
-    # finding the breakpoint at which they appear. This is a harder process than one would expect due to the way that
-    # the library is designed, hence the weirdness here.
-    alert_breakpoint = None
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
 
-    for i, message in enumerate(reversed(messages)):
-        if _is_alert(message):
-            alert_breakpoint = len(messages) - i
-            break
 
-    alerts = messages[alert_breakpoint:] if alert_breakpoint else []
+_NULL_STAGE = _NullStage()
+_instrumentation = None
+
 
-    # The rest of the entries are Trip Alert and Train Station entities.
-    trips_breakpoint = alert_breakpoint if alert_breakpoint else len(messages)
+def _stage(name):
+    """
+    Returns a context manager recording a run of the named stage, if instrumentation is enabled. If it is not, a shared
+    do-nothing stand-in is returned, so instrumented code costs next to nothing when it is disabled.
+    """
+    if _instrumentation is None:
+        return _NULL_STAGE
+    return _StageTimer(_instrumentation, name)
 
-    for i in range(0, trips_breakpoint):
-        message = messages[i]
 
-        if _is_vehicle_update(message):
-            # This is a vehicle update message.
-            # Since vehicle update messages always appear after trip update messages (is this true?),
-            # we won't process them separately.
-            pass
+def _instrumented(name, counts=None):
+    """
+    Decorator recording every call of the decorated function as a run of the named stage, if instrumentation is
+    enabled. `counts`, if provided, is called with the function's result followed by its arguments, and returns a dict
+    of the counts to record.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if _instrumentation is None:
+                return f(*args, **kwargs)
+            with _StageTimer(_instrumentation, name) as stage:
+                result = f(*args, **kwargs)
+                if counts is not None:
+                    stage.count(**counts(result, *args, **kwargs))
+            return result
+        return wrapper
+    return decorator
+
+
+def _peak_rss():
+    """
+    Returns the peak resident set size of this process so far, in bytes, or None if it cannot be determined.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # Linux reports the figure in kilobytes, macOS in bytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _current_rss():
+    """
+    Returns the resident set size of this process at present, in bytes, or None if it cannot be determined.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+@contextlib.contextmanager
+def instrument(callback=None, trace_memory=False):
+    """
+    Context manager enabling stage-level instrumentation of the pipeline for the duration of the block, yielding the
+    PipelineStats that the statistics are recorded in. For example:
+
+        with instrument() as stats:
+            logbook = parse_feeds_into_trip_logbook(feeds, information_dates)
+        print(stats.summary())
+
+    The stages recorded are 'decode', 'index', 'action_log', 'trip_log', 'termination', 'finish', 'join', 'merge',
+    'parse_feeds', 'ingest', 'spill', and 'reopen'. For each, the wall time, number of calls, peak resident set size of
+    the process and counts of what was produced (rows, trips opened, trips closed, trips joined, and so on) are
+    recorded. Work done in worker processes is not recorded stage by stage, but is included in the times of the stages
+    which wait on it.
+
+    Parameters
+    ----------
+    callback, callable or None
+        If provided, called as `callback(stage, record)` every time a stage finishes, where `record` is a dict of the
+        statistics of that run of the stage. Pass e.g. `lambda stage, record: logger.debug("%s %s", stage, record)`
+        to log these.
+    trace_memory, bool
+        Whether to also record the peak memory allocated by each stage, over and above what was allocated when it
+        began, using tracemalloc. This is precise, but slows everything down considerably.
+    """
+    global _instrumentation
+
+    import tracemalloc
+
+    previous, _instrumentation = _instrumentation, _Instrumentation(callback, trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        yield _instrumentation.stats
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _instrumentation = previous
+
+
+class CodeTable:
+    def __init__(self, values=None):
+        """
+        An append-only dictionary encoding of identifiers (stop ids or route ids) as small integer codes.
+
+        Codes are handed out in order of first appearance, and never change. Frames which store identifiers as
+        categoricals of the table's `dtype` therefore share a single code space, even if the table has grown in
+        between their being built, and their codes may be compared with one another directly. Identifiers coming from
+        elsewhere (another process, or a file written by another session) are brought into this code space by
+        `encode`.
+
+        Parameters
+        ----------
+        values, iterable or None
+            Identifiers to seed the table with.
+        """
+        self._codes = dict()
+        self._values = []
+        self._dtype = None
+        self._recodings = collections.OrderedDict()
+        if values is not None:
+            self.encode(values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, value):
+        return value in self._codes
+
+    @property
+    def dtype(self):
+        """The categorical dtype over every identifier in the table, in code order."""
+        if self._dtype is None or len(self._dtype.categories) != len(self._values):
+            self._dtype = pd.CategoricalDtype(pd.Index(self._values, dtype=object))
+        return self._dtype
+
+    def _lookup(self, values):
+        """
+        Returns the codes of a list of distinct identifiers, adding those not yet in the table to it.
+        """
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self._values)
+                self._values.append(value)
+            codes[i] = code
+        return codes
+
+    def _recoding(self, categories):
+        """
+        Returns the codes of a categorical's categories. Frames built together share their categories, so the most
+        recently seen ones are remembered.
+        """
+        key = id(categories)
+        if key in self._recodings and self._recodings[key][0] is categories:
+            self._recodings.move_to_end(key)
+            return self._recodings[key][1]
+
+        recoding = self._lookup(list(categories))
+        self._recodings[key] = (categories, recoding)
+        if len(self._recodings) > 64:
+            self._recodings.popitem(last=False)
+        return recoding
+
+    def encode(self, values):
+        """
+        Returns the codes of the given identifiers, as an array of int32, adding any identifiers not yet in the table
+        to it. Missing values are given the code -1, as in a pandas.Categorical.
+
+        Parameters
+        ----------
+        values, list, np.ndarray, pd.Series, or pd.Categorical
+            The identifiers. Only the categories of categorical values need to be looked up, which is much faster.
+        """
+        if isinstance(values, pd.Series):
+            values = values.values
+        if isinstance(values, pd.Categorical):
+            codes, recoding = values.codes, self._recoding(values.categories)
         else:
-            # This is a trip update message.
-
-            # To understand what this message means, we need to read information from the vehicle update also.
-            # First, we need to verify that there is a vehicle update present at all.
-            if i == len(messages) - 1:
-                has_associated_vehicle_update = False
-            elif (alerts and i != alert_breakpoint - 1) or not alerts:
-                has_associated_vehicle_update = _is_vehicle_update(messages[i + 1])
-            else:
-                has_associated_vehicle_update = False
-            trip_in_progress = has_associated_vehicle_update
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+            recoding = self._lookup(uniques)
 
-            # Pass reading the actions into a helper function.
-            if trip_in_progress:
-                trip_update = messages[i + 1]
-                actions = parse_message_into_action_log(message, trip_update, information_time)
-            else:
-                actions = parse_message_into_action_log(message, None, information_time)
+        # Index -1, which marks missing values, picks out the -1 appended to the end.
+        return np.append(recoding, np.int32(-1))[codes]
+
+    def decode(self, codes):
+        """
+        Returns the identifiers with the given codes, as an array of objects.
+        """
+        return np.asarray(self._values, dtype=object)[codes]
+
+    def categorical(self, values):
+        """
+        Returns the given identifiers as a pandas.Categorical of the table's `dtype`.
+        """
+        codes = self.encode(values)
+        return pd.Categorical.from_codes(codes, dtype=self.dtype)
+
+
+CodeTables = collections.namedtuple('CodeTables', ['stop_ids', 'route_ids'])
+_code_tables = CodeTables(CodeTable(), CodeTable())
+
+
+def code_tables():
+    """
+    Returns the process-wide code tables, which every action log and trip log built in this process encodes its stop
+    ids and route ids with. Trip ids are left as plain strings: unlike stops and routes, new trips keep turning up for
+    as long as feeds are read, so a table of them would only ever grow.
+    """
+    return _code_tables
+
+
+def seed_code_tables(gtfs_directory="../data/gtfs"):
+    """
+    Seeds the process-wide code tables with the stop and route ids in a static GTFS export, in the order in which they
+    appear in `stops.txt` and `routes.txt`. Seeding is optional: identifiers are added to the tables as they are
+    encountered regardless. It does however make the codes of these identifiers the same from one session to the next,
+    and save the tables from growing as the first few feeds are processed.
+    """
+    stops = pd.read_csv(os.path.join(gtfs_directory, "stops.txt"), dtype=str, usecols=['stop_id'])
+    routes = pd.read_csv(os.path.join(gtfs_directory, "routes.txt"), dtype=str, usecols=['route_id'])
+    _code_tables.stop_ids.encode(stops['stop_id'].dropna().values)
+    _code_tables.route_ids.encode(routes['route_id'].dropna().values)
+
+
+def _parse_gtfs_into_action_log(feed, information_time, index=None):
+    """
+    Parses a GTFS-Realtime feed into a single pandas.DataFrame
+
+    Parameters
+    ----------
+    feed, gtfs_realtime_pb2.FeedMessage object
+        The feed being processed.
+    index, FeedIndex or None
+        The feed's entity index, if one has already been built.
+    """
+    return _parse_message_list_into_action_log(feed.entity, information_time, index=index)
 
-            actions_list.append(actions)
 
-    return pd.concat(actions_list)
+@_instrumented('action_log', lambda action_log, *args, **kwargs: {'rows': len(action_log)})
+def _parse_message_list_into_action_log(messages, information_time, index=None):
+    """
+    Parses a list of messages into a single pandas.DataFrame.
+
+    Every trip update message in the list is paired with the vehicle update message immediately following it, if there
+    is one, and the actions for all of these pairs are written into a single set of column buffers. The result is one
+    action log for the entire list, rather than one per trip.
+    """
+    index = index if index is not None else index_feed_entities(messages)
+
+    # Alerts carry no information about stops, so they are passed over here; so are vehicle updates, which are read
+    # alongside the trip update they are paired with.
+    trip_update_indices = np.flatnonzero(index.kinds == ENTITY_TRIP_UPDATE)
+    trip_updates = [messages[int(i)] for i in trip_update_indices]
+
+    builder = _ActionLogBuilder(_action_log_capacity(trip_updates), information_time)
+    for i, message in zip(trip_update_indices, trip_updates):
+        vehicle_index = index.vehicle_indices[i]
+        builder.add(message, messages[int(vehicle_index)] if vehicle_index != -1 else None)
+    return builder.to_frame()
 
 
 def parse_message_into_action_log(message, vehicle_update, information_time):
@@ -112,23 +879,37 @@ def parse_message_into_action_log(message, vehicle_update, information_time):
     Parses the trip update and vehicle update messages (if there is one; may be None) for a particular trip into an
     action log.
 
-    This method is called by parse_message_list_into_action_log in a loop in order to get the complete action log.
+    Feed-wide parsing goes through `_parse_message_list_into_action_log` instead, which shares the same underlying
+    `_ActionLogBuilder` but emits a single action log for every trip in the list.
     """
-    # TODO: Simplify the overly complicated logic here.
-
     # To help catch errors, validate input.
     if vehicle_update is not None and not _is_vehicle_update(vehicle_update):
         raise ValueError("The vehicle update message provided is invalid.")
     if not _is_trip_update(message):
         raise ValueError("The trip update message provided is invalid.")
 
-    # If we are passed a vehicle update, then the trip must already be in progress.
-    trip_in_progress = bool(vehicle_update)
+    builder = _ActionLogBuilder(_action_log_capacity([message]), information_time)
+    builder.add(message, vehicle_update)
+    return builder.to_frame()
 
-    # The base of the log entry is the same for all possible entries.
-    # The entries are, in order of key: trip_id, route_id, and information_time.
-    # Each line will additionally contain an action, stop_id, and time_assigned.
-    base = np.array([message.trip_update.trip.trip_id, message.trip_update.trip.route_id, information_time])
+
+def _action_log_capacity(messages):
+    """
+    Returns an upper bound on the number of action log rows the given trip update messages can produce. Each stop time
+    update results in at most two rows: an arrival and a departure.
+    """
+    return sum(2 * len(message.trip_update.stop_time_update) for message in messages)
+
+
+class _ActionLogBuilder:
+    """
+    Columnar action log builder. Rows for any number of trip update / vehicle update pairs are written into
+    preallocated, typed column buffers, and a single pandas.DataFrame is constructed from them at the end.
+
+    The time columns of the action log are integers, and its `action`, `route_id`, and `stop_id` columns are
+    categorical. Routes and stops are encoded using the process-wide code tables (see `code_tables`).
+    """
+    columns = ['trip_id', 'route_id', 'information_time', 'action', 'stop_id', 'time_assigned']
 
     # Hash map for current status enums to current status strings.
     vehicle_status_dict = {
@@ -137,197 +918,255 @@ def parse_message_into_action_log(message, vehicle_update, information_time):
         2: 'IN_TRANSIT_TO'
     }
 
-    if trip_in_progress:
-        vehicle_status = vehicle_status_dict[vehicle_update.vehicle.current_status]
-        vehicle_status_poi = vehicle_update.vehicle.stop_id
-    else:
-        vehicle_status = None
-    n_stops = len(message.trip_update.stop_time_update)
+    def __init__(self, capacity, information_time):
+        """
+        Parameters
+        ----------
+        capacity, int
+            The maximum number of rows that will be written; see `_action_log_capacity`.
+        information_time, int or None
+            The information time shared by every row of the action log.
+        """
+        self.information_time = information_time
+        self.trip_id = np.empty(capacity, dtype=object)
+        self.route_id = np.empty(capacity, dtype=object)
+        self.action = np.empty(capacity, dtype=object)
+        self.stop_id = np.empty(capacity, dtype=object)
+        self.time_assigned = np.empty(capacity, dtype=np.int64)
+        self.n = 0
+
+    def _append(self, trip_id, route_id, action, stop_id, time_assigned):
+        n = self.n
+        self.trip_id[n] = trip_id
+        self.route_id[n] = route_id
+        self.action[n] = action
+        self.stop_id[n] = stop_id
+        self.time_assigned[n] = time_assigned
+        self.n = n + 1
+
+    def to_frame(self):
+        """
+        Returns the rows written so far as an action log.
+        """
+        n = self.n
+        information_time = np.nan if self.information_time is None else self.information_time
+        return pd.DataFrame({
+            'trip_id': self.trip_id[:n],
+            'route_id': _code_tables.route_ids.categorical(self.route_id[:n]),
+            'information_time': np.full(n, information_time),
+            'action': pd.Categorical(self.action[:n]),
+            'stop_id': _code_tables.stop_ids.categorical(self.stop_id[:n]),
+            'time_assigned': self.time_assigned[:n]
+        }, columns=self.columns)
+
+    def add(self, message, vehicle_update):
+        """
+        Writes the actions implied by a trip update message and its vehicle update message (if there is one; may be
+        None) into the buffers.
+        """
+        # TODO: Simplify the overly complicated logic here.
+
+        # If we are passed a vehicle update, then the trip must already be in progress.
+        trip_in_progress = bool(vehicle_update)
+
+        # The base of the log entry is the same for all possible entries.
+        # Each line will additionally contain an action, stop_id, and time_assigned.
+        trip_id = message.trip_update.trip.trip_id
+        route_id = message.trip_update.trip.route_id
+        append = self._append
 
-    lines = []
+        if trip_in_progress:
+            vehicle_status = self.vehicle_status_dict[vehicle_update.vehicle.current_status]
+            vehicle_status_poi = vehicle_update.vehicle.stop_id
+        else:
+            vehicle_status = None
+        n_stops = len(message.trip_update.stop_time_update)
 
-    for s_i, stop_time_update in enumerate(message.trip_update.stop_time_update):
+        for s_i, stop_time_update in enumerate(message.trip_update.stop_time_update):
 
-        # If we do have one, we may continue.
-        # Weirdness with detecting if we have arrival/departure times.
-        has_arrival_time = str(stop_time_update.arrival) != ''
-        has_departure_time = str(stop_time_update.departure) != ''
-        stop_time_update_poi = stop_time_update.stop_id
-        if trip_in_progress:
-            stop_is_next_stop = stop_time_update_poi == vehicle_status_poi
-
-        # If the trip is not in progress, and we are at the first index, then we will have only a planned
-        # departure to account for.
-        if not trip_in_progress and s_i == 0:
-            assert not has_arrival_time
-            assert has_departure_time
-
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_DEPART_AT', stop_time_update.stop_id, stop_time_update.departure.time]
-            ))
-            lines.append(struct)
-
-        # If the trip is not in progress, and we are not at the first index nor the last index, then we will
-        # have both types to account for.
-        elif not trip_in_progress and s_i != 0 and n_stops != s_i + 1:
-            assert has_arrival_time
-            assert has_departure_time
-
-            # Arrival.
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_ARRIVE_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-            ))
-            lines.append(struct)
-
-            # Departure.
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_DEPART_AT', stop_time_update.stop_id, stop_time_update.departure.time]
-            ))
-            lines.append(struct)
-
-        # If we are at the last index and we do not have a vehicle update present, then we will have only an arrival to
-        # account for.
-        elif n_stops == s_i + 1:
-            assert has_arrival_time
-            try:
-                assert not has_departure_time
-            except AssertionError:
-                # This isn't supposed to happen, because it means that the train is question is being made out as
-                # though it is departing to some next station on the line when there are no other stations on the
-                # line to depart to. However, this appears to occur in some cases. For example, an incidence of this
-                # occurs in the 2014-09-17-09-36 GTFS-Realtime archive, where a 4 train departs from a Utica Avenue
-                # end-stop.
-                pass
+            has_arrival_time = stop_time_update.HasField('arrival')
+            has_departure_time = stop_time_update.HasField('departure')
+            stop_id = stop_time_update.stop_id
+            if trip_in_progress:
+                stop_is_next_stop = stop_id == vehicle_status_poi
+
+            # If the trip is not in progress, and we are at the first index, then we will have only a planned
+            # departure to account for.
+            if not trip_in_progress and s_i == 0:
+                assert not has_arrival_time
+                assert has_departure_time
+
+                append(trip_id, route_id, 'EXPECTED_TO_DEPART_AT', stop_id, stop_time_update.departure.time)
+
+            # If the trip is not in progress, and we are not at the first index nor the last index, then we will
+            # have both types to account for.
+            elif not trip_in_progress and s_i != 0 and n_stops != s_i + 1:
+                assert has_arrival_time
+                assert has_departure_time
+
+                # Arrival.
+                append(trip_id, route_id, 'EXPECTED_TO_ARRIVE_AT', stop_id, stop_time_update.arrival.time)
+
+                # Departure.
+                append(trip_id, route_id, 'EXPECTED_TO_DEPART_AT', stop_id, stop_time_update.departure.time)
+
+            # If we are at the last index and we do not have a vehicle update present, then we will have only an arrival
+            # to account for.
+            elif n_stops == s_i + 1:
+                assert has_arrival_time
+                try:
+                    assert not has_departure_time
+                except AssertionError:
+                    # This isn't supposed to happen, because it means that the train is question is being made out as
+                    # though it is departing to some next station on the line when there are no other stations on the
+                    # line to depart to. However, this appears to occur in some cases. For example, an incidence of this
+                    # occurs in the 2014-09-17-09-36 GTFS-Realtime archive, where a 4 train departs from a Utica Avenue
+                    # end-stop.
+                    pass
 
-            if len(message.trip_update.stop_time_update) != 1:  # this is the final stop, but train is elsewhere
-                struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_ARRIVE_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-                ))
-                lines.append(struct)
-            elif vehicle_status != 'STOPPED_AT':  # this is the final stop, train is en route to it
-                struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_ARRIVE_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-                ))
-                lines.append(struct)
-            else:  # this is the final stop, train is STOPPED_AT it
-                struct = np.append(base.copy(), np.array(
-                ['STOPPED_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-                ))
-                lines.append(struct)
-
-        # If the trip is in progress the vehicle update and stop update in question are not talking about the
-        # same station, and the message is not the last one in the sequence, and either only an arrival or only a
-        # departure is present in the struct, then we have a forward estimate on when this train will arrive at some
-        # other station further down the line (but not at the very end), but at which it *will not stop*. In other
-        # words, this indicates that this train is going to skip this stop in its service!
-        elif trip_in_progress and not n_stops == s_i + 1 and not has_departure_time:
-            assert has_arrival_time
-
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_SKIP', stop_time_update.stop_id, stop_time_update.arrival.time]
-            ))
-            lines.append(struct)
-        elif trip_in_progress and not n_stops == s_i + 1 and not has_arrival_time:
-            assert has_departure_time
-
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_SKIP', stop_time_update.stop_id, stop_time_update.departure.time]
-            ))
-            lines.append(struct)
-
-        # If we are at the last index, and we are not stopped, then we will have only an arrival to account for.
-        elif n_stops == s_i + 1:
-            assert has_arrival_time
-            try:
-                assert not has_departure_time
-            except AssertionError:
-                # This isn't supposed to happen, because it means that the train is question is being made out as
-                # though it is departing to some next station on the line when there are no other stations on the
-                # line to depart to. However, this appears to occur in some cases. For example, an incidence of this
-                # occurs in the 2014-09-17-09-36 GTFS-Realtime archive, where a 4 train departs from a Utica Avenue
-                # end-stop.
-                pass
+                if len(message.trip_update.stop_time_update) != 1:  # this is the final stop, but train is elsewhere
+                    append(trip_id, route_id, 'EXPECTED_TO_ARRIVE_AT', stop_id, stop_time_update.arrival.time)
+                elif vehicle_status != 'STOPPED_AT':  # this is the final stop, train is en route to it
+                    append(trip_id, route_id, 'EXPECTED_TO_ARRIVE_AT', stop_id, stop_time_update.arrival.time)
+                else:  # this is the final stop, train is STOPPED_AT it
+                    append(trip_id, route_id, 'STOPPED_AT', stop_id, stop_time_update.arrival.time)
+
+            # If the trip is in progress the vehicle update and stop update in question are not talking about the
+            # same station, and the message is not the last one in the sequence, and either only an arrival or only a
+            # departure is present in the struct, then we have a forward estimate on when this train will arrive at some
+            # other station further down the line (but not at the very end), but at which it *will not stop*. In other
+            # words, this indicates that this train is going to skip this stop in its service!
+            elif trip_in_progress and not n_stops == s_i + 1 and not has_departure_time:
+                assert has_arrival_time
+
+                append(trip_id, route_id, 'EXPECTED_TO_SKIP', stop_id, stop_time_update.arrival.time)
+            elif trip_in_progress and not n_stops == s_i + 1 and not has_arrival_time:
+                assert has_departure_time
+
+                append(trip_id, route_id, 'EXPECTED_TO_SKIP', stop_id, stop_time_update.departure.time)
+
+            # If we are at the last index, and we are not stopped, then we will have only an arrival to account for.
+            elif n_stops == s_i + 1:
+                assert has_arrival_time
+                try:
+                    assert not has_departure_time
+                except AssertionError:
+                    # This isn't supposed to happen, because it means that the train is question is being made out as
+                    # though it is departing to some next station on the line when there are no other stations on the
+                    # line to depart to. However, this appears to occur in some cases. For example, an incidence of this
+                    # occurs in the 2014-09-17-09-36 GTFS-Realtime archive, where a 4 train departs from a Utica Avenue
+                    # end-stop.
+                    pass
+
+                if vehicle_status != 'STOPPED_AT':
+                    append(trip_id, route_id, 'EXPECTED_TO_ARRIVE_AT', stop_id, stop_time_update.arrival.time)
+                else:
+                    append(trip_id, route_id, 'STOPPED_AT', stop_id, stop_time_update.arrival.time)
+
+            # If the trip is in progress, we have an arrival time, and we have an INCOMING_AT or IN_TRANSIT_TO
+            # vehicle update, and the vehicle update and stop update in question are talking about the same
+            # station, then we know that we are en route to a station, but haven't arrived there yet.
+            elif trip_in_progress and vehicle_status in ['INCOMING_AT', 'IN_TRANSIT_TO'] and stop_is_next_stop:
+                assert has_arrival_time
+                assert has_departure_time
+
+                # Arrival.
+                append(trip_id, route_id, 'EXPECTED_TO_ARRIVE_AT', stop_id, stop_time_update.arrival.time)
+
+                # Departure.
+                append(trip_id, route_id, 'EXPECTED_TO_DEPART_AT', stop_id, stop_time_update.departure.time)
+
+            # If the trip is in progress, we are STOPPED_AT, we are at the first station in the line, and the vehicle
+            # update and stop update in question are talking about the same station, then we are currently stopped at
+            # the first station in the line, and will only have a departure time.
+            elif trip_in_progress and vehicle_status == 'STOPPED_AT' and s_i == 0 and not has_arrival_time:
+                assert has_departure_time
+
+                append(trip_id, route_id, 'STOPPED_AT', stop_id, stop_time_update.arrival.time)
+
+            # If the trip is in progress, we are STOPPED_AT, and the vehicle update and stop update in question are
+            # talking about the same station, then that arrival time should be the time at which this train arrived at
+            # this station.
+            elif trip_in_progress and vehicle_status == 'STOPPED_AT' and stop_is_next_stop:
+                assert has_arrival_time
+                assert has_departure_time
+
+                append(trip_id, route_id, 'STOPPED_AT', stop_id, stop_time_update.arrival.time)
+
+            # If the trip is in progress, the vehicle update and stop update in question are not talking about the
+            # same station, and the message is not the last one in the sequence, and both an arrival and
+            # departure are present in the struct, then we have a forward estimate on when this train will arrive
+            # at some other station further down the line (but not at the very end).
+            #
+            # We actually do the same thing in this case as in the first case, but to keep the logic neat let's
+            # just replicate the code.
+            elif trip_in_progress and not stop_is_next_stop and not n_stops == s_i + 1 and has_departure_time:
+                assert has_arrival_time
+
+                # Arrival.
+                append(trip_id, route_id, 'EXPECTED_TO_ARRIVE_AT', stop_id, stop_time_update.arrival.time)
+
+                # Departure.
+                append(trip_id, route_id, 'EXPECTED_TO_DEPART_AT', stop_id, stop_time_update.departure.time)
 
-            if vehicle_status != 'STOPPED_AT':
-                struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_ARRIVE_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-                ))
             else:
-                struct = np.append(base.copy(), np.array(
-                ['STOPPED_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-                ))
-            lines.append(struct)
-
-        # If the trip is in progress, we have an arrival time, and we have an INCOMING_AT or IN_TRANSIT_TO
-        # vehicle update, and the vehicle update and stop update in question are talking about the same
-        # station, then we know that we are en route to a station, but haven't arrived there yet.
-        elif trip_in_progress and vehicle_status in ['INCOMING_AT', 'IN_TRANSIT_TO'] and stop_is_next_stop:
-            assert has_arrival_time
-            assert has_departure_time
-
-            # Arrival.
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_ARRIVE_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-            ))
-            lines.append(struct)
-
-            # Departure.
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_DEPART_AT', stop_time_update.stop_id, stop_time_update.departure.time]
-            ))
-            lines.append(struct)
-
-        # If the trip is in progress, we are STOPPED_AT, we are at the first station in the line, and the vehicle
-        # update and stop update in question are talking about the same station, then we are currently stopped at the
-        #  first station in the line, and will only have a departure time.
-        elif trip_in_progress and vehicle_status == 'STOPPED_AT' and s_i == 0 and not has_arrival_time:
-            assert has_departure_time
-
-            struct = np.append(base.copy(), np.array(
-                ['STOPPED_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-            ))
-            lines.append(struct)
-
-        # If the trip is in progress, we are STOPPED_AT, and the vehicle update and stop update in question are
-        # talking about the same station, then that arrival time should be the time at which this train arrived at
-        # this station.
-        elif trip_in_progress and vehicle_status == 'STOPPED_AT' and stop_is_next_stop:
-            assert has_arrival_time
-            assert has_departure_time
-
-            struct = np.append(base.copy(), np.array(
-                ['STOPPED_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-            ))
-            lines.append(struct)
-
-        # If the trip is in progress, the vehicle update and stop update in question are not talking about the
-        # same station, and the message is not the last one in the sequence, and both an arrival and
-        # departure are present in the struct, then we have a forward estimate on when this train will arrive
-        # at some other station further down the line (but not at the very end).
-        #
-        # We actually do the same thing in this case as in the first case, but to keep the logic neat let's
-        # just replicate the code.
-        elif trip_in_progress and not stop_is_next_stop and not n_stops == s_i + 1 and has_departure_time:
-            assert has_arrival_time
-
-            # Arrival.
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_ARRIVE_AT', stop_time_update.stop_id, stop_time_update.arrival.time]
-            ))
-            lines.append(struct)
-
-            # Departure.
-            struct = np.append(base.copy(), np.array(
-                ['EXPECTED_TO_DEPART_AT', stop_time_update.stop_id, stop_time_update.departure.time]
-            ))
-            lines.append(struct)
+                raise ValueError
 
-        else:
-            raise ValueError
 
-    action_log = pd.DataFrame(lines, columns=['trip_id', 'route_id', 'information_time', 'action', 'stop_id',
-                                              'time_assigned'])
-    return action_log
+# Trip log times are floats, as any of them may be unknown (NaN). The actions a trip log may contain are fixed, so every
+# trip log shares the same categorical action type, which survives concatenation. Route and stop ids are categoricals
+# encoded using the process-wide code tables; trip ids are plain strings.
+_TRIP_LOG_COLUMNS = ['trip_id', 'route_id', 'action', 'minimum_time', 'maximum_time', 'stop_id',
+                     'latest_information_time']
+_TRIP_LOG_TIME_COLUMNS = ['minimum_time', 'maximum_time', 'latest_information_time']
+_TRIP_LOG_ACTION_DTYPE = pd.CategoricalDtype(['STOPPED_AT', 'STOPPED_OR_SKIPPED', 'EN_ROUTE_TO'])
+_TRIP_LOG_ACTION_CODES = {action: code for code, action in enumerate(_TRIP_LOG_ACTION_DTYPE.categories)}
+_TRIP_LOG_CODE_TABLES = collections.OrderedDict([
+    ('route_id', _code_tables.route_ids), ('stop_id', _code_tables.stop_ids)
+])
+
+
+def _set_trip_log_dtypes(trip_log):
+    """
+    Casts the columns of a trip log to their proper types, in place, and returns it. This also brings trip logs built
+    in another process, whose route and stop ids are encoded using that process's code tables, into this one's.
+    """
+    trip_log['trip_id'] = trip_log['trip_id'].astype(object)
+    trip_log['action'] = trip_log['action'].astype(_TRIP_LOG_ACTION_DTYPE)
+    for column, table in _TRIP_LOG_CODE_TABLES.items():
+        trip_log[column] = table.categorical(trip_log[column].values)
+    for column in _TRIP_LOG_TIME_COLUMNS:
+        trip_log[column] = trip_log[column].astype(float)
+    return trip_log
+
+
+def _build_trip_log(trip_id, route_id, action_codes, minimum_times, maximum_times, stop_codes,
+                    latest_information_times):
+    """
+    Builds the trip log for a trip out of arrays of action codes (see `_TRIP_LOG_ACTION_CODES`), minimum times,
+    maximum times, stop codes, and latest information times.
+    """
+    n = len(action_codes)
+    route_code = _code_tables.route_ids.encode([route_id])[0]
+    return _build_trip_log_frame(np.full(n, trip_id, dtype=object), np.full(n, route_code), action_codes, minimum_times,
+                                 maximum_times, stop_codes, latest_information_times)
+
+
+def _build_trip_log_frame(trip_ids, route_codes, action_codes, minimum_times, maximum_times, stop_codes,
+                          latest_information_times):
+    """
+    Builds a frame of trip log rows, for any number of trips, out of arrays of the trip ids and of the codes and times
+    in each other column.
+    """
+    return pd.DataFrame({
+        'trip_id': np.asarray(trip_ids, dtype=object),
+        'route_id': pd.Categorical.from_codes(route_codes, dtype=_code_tables.route_ids.dtype),
+        'action': pd.Categorical.from_codes(action_codes, dtype=_TRIP_LOG_ACTION_DTYPE),
+        'minimum_time': np.asarray(minimum_times, dtype=float),
+        'maximum_time': np.asarray(maximum_times, dtype=float),
+        'stop_id': pd.Categorical.from_codes(np.asarray(stop_codes, dtype=np.int32), dtype=_code_tables.stop_ids.dtype),
+        'latest_information_time': np.asarray(latest_information_times, dtype=float)
+    }, index=pd.RangeIndex(len(action_codes)))
 
 
 def parse_tripwise_action_logs_into_trip_log(tripwise_action_logs):
@@ -339,80 +1178,207 @@ def parse_tripwise_action_logs_into_trip_log(tripwise_action_logs):
     trip's stops (for example, if the train stopped at its last stop and was subsequently removed from the record in
     the time between updates) then you will need to "finish" the trip information off yourself, using the
     `finish_trip` method. This is done for you in `parse_feeds_into_trip_logs`.
+
+    The time columns of the trip log are floats, NaN wherever a time is not known, and its `action`, `route_id`, and
+    `stop_id` columns are categorical.
     """
-    all_data = pd.concat(tripwise_action_logs)
+    return _build_trip_log_from_action_log_columns(_gather_action_log_columns(tripwise_action_logs))
 
-    key_data = all_data.groupby('information_time').first().reset_index()
-    current_information_time = None
 
-    # The following bookkeeping is used to assign the *next* information time in the case of a STOPPED_AT.
-    information_times = sorted(list(set(all_data['information_time'])))
-    next_information_time_index = 1
-    next_information_time = information_times[1] if len(information_times) > 1 else np.nan
+# The parts of a trip's action logs which its trip log is built out of: its trip and route ids, and the stop codes,
+# whether or not the action is STOPPED_AT, and the information times of the rows of its action logs, back to back,
+# along with the length of each action log.
+ActionLogColumns = collections.namedtuple('ActionLogColumns', ['trip_id', 'route_id', 'stop_codes', 'stopped',
+                                                               'information_times', 'log_lengths'])
 
-    # To understand what went on during a trip, we only need to have a list of touched stops, the rows corresponding
-    # with the first action in each observation's action sublog, and the time that has passed in between the sublog
-    # entries.
-    #
-    # We can extract all of the stop information that we need by considering information pertaining to these entries,
-    # in order.
-    remaining_stops = _extract_synthetic_route_from_tripwise_action_logs(tripwise_action_logs)
 
-    # Base is trip_id, route_id.
-    base = np.array([all_data.iloc[0]['trip_id'], all_data.iloc[0]['route_id']])
+def _gather_action_log_columns(tripwise_action_logs):
+    """
+    Gathers up the ActionLogColumns of a list of action logs associated with a particular trip.
+    """
+    # Only the columns that are needed are gathered up, as arrays: concatenating many small frames is slow. Stops are
+    # worked with in terms of their codes, which are cheaper to hash and compare than stop id strings.
+    first_log = next((log for log in tripwise_action_logs if len(log)), tripwise_action_logs[0])
+    return ActionLogColumns(
+        trip_id=first_log['trip_id'].iloc[0],
+        route_id=first_log['route_id'].iloc[0],
+        stop_codes=np.concatenate([_code_tables.stop_ids.encode(log['stop_id']) for log in tripwise_action_logs]),
+        stopped=np.concatenate([np.asarray(log['action'].values == 'STOPPED_AT', dtype=bool)
+                                for log in tripwise_action_logs]),
+        information_times=np.concatenate([log['information_time'].values for log in tripwise_action_logs]),
+        log_lengths=np.array([len(log) for log in tripwise_action_logs], dtype=np.int64)
+    )
+
+
+def _concatenate_action_log_columns(pieces):
+    """
+    Concatenates the ActionLogColumns of successive runs of action logs of the same trip into one, which holds its own
+    copies of their arrays. The trip's route is that of the first.
+    """
+    return ActionLogColumns(pieces[0].trip_id, pieces[0].route_id,
+                            *[np.concatenate(column) for column in zip(*[piece[2:] for piece in pieces])])
 
-    lines = []
 
-    for ind, row in key_data.iterrows():
+@_instrumented('trip_log', lambda trip_log, *args: {'rows': len(trip_log), 'trip_logs': 1})
+def _build_trip_log_from_action_log_columns(columns):
+    """
+    Builds a trip's trip log out of its ActionLogColumns.
+    """
+    return _build_trip_log(columns.trip_id, columns.route_id,
+                           *_trip_log_arrays(columns.stop_codes, columns.stopped, columns.information_times,
+                                             columns.log_lengths))
 
-        previous_information_time = current_information_time if current_information_time is not None else np.nan
-        current_information_time = row['information_time']
 
-        # Do bookkeeping to keep track of the next information time for use by STOPPED_AT records.
-        if current_information_time == next_information_time:
-            next_information_time_index += 1
-            try:
-                next_information_time = information_times[next_information_time_index]
-            except IndexError:  # end of the record
-                next_information_time = np.nan
-
-        current_stop = row['stop_id']
-
-        i_del = 0
-        for remaining_stop in remaining_stops:
-            if remaining_stop != current_stop:
-                # action, minimum_time, maximum_time, stop_id, latest_information_time
-                skipped_stop = np.append(base.copy(), np.array(
-                    ['STOPPED_OR_SKIPPED', previous_information_time, current_information_time,
-                     remaining_stop, current_information_time]
-                ))
-                lines.append(skipped_stop)
-                i_del += 1
-            else:
-                if row['action'] == 'STOPPED_AT':
-                    stopped_stop = np.append(base.copy(), np.array(
-                        ['STOPPED_AT', previous_information_time, next_information_time,
-                         row['stop_id'], current_information_time]
-                    ))
-                    lines.append(stopped_stop)
-                    i_del += 1
-                    break
-                else:
-                    # We have learned nothing.
-                    break
-        remaining_stops = remaining_stops[i_del:]
+def _trip_log_arrays(stop_codes, stopped, information_times, log_lengths):
+    """
+    The heart of `parse_tripwise_action_logs_into_trip_log`. Takes the stop codes, whether or not the action is
+    STOPPED_AT, and the information times of the rows of a trip's action logs, back to back, along with the length of
+    each action log. Returns the action codes, minimum times, maximum times, stop codes, and latest information times
+    of the rows of its trip log, as arrays.
+    """
+    # The first action in each observation's action sublog, in information time order, is all that we need to know
+    # about that observation. Each observation is bracketed by the information times of the ones before and after it.
+    information_times, key_rows = np.unique(information_times, return_index=True)
+    information_times = information_times.astype(float)
+    key_stopped, key_stops = stopped[key_rows].tolist(), stop_codes[key_rows].tolist()
+    previous_information_times = np.concatenate([[np.nan], information_times[:-1]])
+    next_information_times = np.concatenate([information_times[1:], [np.nan]])
+
+    # The stops the trip touches, in order.
+    log_boundaries = np.cumsum(log_lengths)[:-1]
+    route = _extract_synthetic_route_from_station_lists(
+        [pd.unique(codes).tolist() for codes in np.split(stop_codes, log_boundaries)]
+    )
+    n = len(route)
+    occurrences = collections.defaultdict(list)
+    for position, stop in enumerate(route):
+        occurrences[stop].append(position)
+
+    # Each observation settles the stops along the route up to the one it places the train at (or, if that stop was
+    # settled already, every stop left): the train stopped at or skipped all of these, in the time since the previous
+    # observation. If the train is STOPPED_AT its stop, that stop is settled too, and the train is there until the
+    # next observation. Only the position of the first stop left to settle need be kept track of, as it only moves
+    # forward; the stops themselves are then classified all at once, by the observation which settled them.
+    settled_by = np.empty(n, dtype=np.int64)
+    stopped_at = np.zeros(n, dtype=bool)
+    position = 0
+    for i, (is_stopped, stop) in enumerate(zip(key_stopped, key_stops)):
+        if position == n:
+            break
+        positions = occurrences[stop]
+        j = bisect.bisect_left(positions, position)
+        stop_position = positions[j] if j < len(positions) else n
+
+        settled_by[position:stop_position] = i
+        if stop_position < n and is_stopped:
+            settled_by[stop_position] = i
+            stopped_at[stop_position] = True
+            stop_position += 1
+        position = stop_position
+
+    # Any stops left over we haven't arrived at yet, as of the latest observation.
+    settled_by, stopped_at = settled_by[:position], stopped_at[:position]
+    latest_information_time = information_times[-1] if len(information_times) else np.nan
+    en_route = np.full(n - position, latest_information_time)
+
+    action_codes = np.concatenate([
+        np.where(stopped_at, _TRIP_LOG_ACTION_CODES['STOPPED_AT'], _TRIP_LOG_ACTION_CODES['STOPPED_OR_SKIPPED']),
+        np.full(n - position, _TRIP_LOG_ACTION_CODES['EN_ROUTE_TO'])
+    ]).astype(np.int8)
+    minimum_times = np.concatenate([previous_information_times[settled_by], en_route])
+    maximum_times = np.concatenate([
+        np.where(stopped_at, next_information_times[settled_by], information_times[settled_by]),
+        np.full(n - position, np.nan)
+    ])
+    latest_information_times = np.concatenate([information_times[settled_by], en_route])
+
+    return action_codes, minimum_times, maximum_times, route, latest_information_times
+
+
+@_instrumented('update', lambda trip_log, *args: {'rows': len(trip_log), 'trip_logs': 1})
+def update_trip_log(trip_log, action_log):
+    """
+    Advances a trip log by a single new observation of the trip, returning the trip log which
+    `parse_tripwise_action_logs_into_trip_log` would have built had the new action log been included in the list of
+    action logs it was built from. This is much cheaper than rebuilding the trip log, or than building a second trip
+    log and joining it to the first, so it is the way to maintain trip logs from a live feed.
 
-    # Any stops left over we haven't arrived at yet.
-    for remaining_stop in remaining_stops:
-        future_stop = np.append(base.copy(), np.array(
-            ['EN_ROUTE_TO', current_information_time, np.nan,
-             remaining_stop, current_information_time]
-        ))
-        lines.append(future_stop)
+    The stops the train has already stopped at or skipped are left as they are; only the stops still ahead of it are
+    reconsidered, so the work done depends on how much of the trip is left, not on how long it has been observed for.
+    This makes it impossible to update trip logs whose routes change behind the train (that is, when the new action
+    log reroutes the train through stops it has already passed), and a ValueError is raised for these, in which case
+    the trip log must be rebuilt from its action logs instead.
 
-    trip = pd.DataFrame(lines, columns=['trip_id', 'route_id', 'action', 'minimum_time', 'maximum_time', 'stop_id',
-                                        'latest_information_time'])
-    return trip
+    Parameters
+    ----------
+    trip_log, pd.DataFrame
+        The trip log, as returned by `parse_tripwise_action_logs_into_trip_log` or by a previous update. It must not
+        have been finished.
+    action_log, pd.DataFrame
+        The action log of a single observation of the trip, made after every observation already in the trip log.
+    """
+    if len(trip_log) == 0:
+        return parse_tripwise_action_logs_into_trip_log([action_log])
+
+    information_times = action_log['information_time'].values
+    if len(action_log) == 0 or (information_times != information_times[0]).any():
+        raise ValueError("The action log must hold exactly one observation.")
+    information_time = float(information_times[0])
+    latest_information_time = trip_log['latest_information_time'].max()
+    if not information_time > latest_information_time:
+        raise ValueError("The observation must be made after the latest one in the trip log.")
+
+    # The trip log's stops are its synthetic route so far, and the stops the train has stopped at or skipped are a
+    # prefix of it. Both of these need to be the same along the new route for the prefix to be left as it is.
+    previous_route = _code_tables.stop_ids.encode(trip_log['stop_id'])
+    stop_codes = _code_tables.stop_ids.encode(action_log['stop_id'])
+    route = _synthesize_station_lists(previous_route.tolist(), pd.unique(stop_codes).tolist())
+    n, m = len(route), len(previous_route)
+    settled = int((trip_log['action'].values != 'EN_ROUTE_TO').sum())
+    mismatches = np.flatnonzero(previous_route[:n] != np.asarray(route[:m], dtype=previous_route.dtype))
+    common = mismatches[0] if len(mismatches) else min(n, m)
+    if not (common > settled or (settled == m == n and common == m)):
+        raise ValueError("The observation reroutes the trip behind the stops it has already passed. Rebuild the "
+                         "trip log from its action logs instead.")
+
+    action_codes = pd.Categorical(trip_log['action'].values[:settled], dtype=_TRIP_LOG_ACTION_DTYPE).codes
+    minimum_times = trip_log['minimum_time'].values[:settled]
+    maximum_times = trip_log['maximum_time'].values[:settled].copy()
+    latest_information_times = trip_log['latest_information_time'].values[:settled]
+
+    # A train which was STOPPED_AT its stop as of the previous observation was there until (at most) this one.
+    if settled and action_codes[-1] == _TRIP_LOG_ACTION_CODES['STOPPED_AT'] and np.isnan(maximum_times[-1]):
+        maximum_times[-1] = information_time
+
+    # Settle the stops up to the one this observation places the train at, as in
+    # `parse_tripwise_action_logs_into_trip_log`. The remaining stops are EN_ROUTE_TO, as of this observation.
+    position = settled
+    if position < n:
+        try:
+            stop_position = route.index(stop_codes[0], position)
+        except ValueError:
+            stop_position = n
+        stopped = stop_position < n and action_log['action'].iloc[0] == 'STOPPED_AT'
+        settling = stop_position - position + stopped
+        position += settling
+
+        action_codes = np.concatenate([
+            action_codes, np.full(settling, _TRIP_LOG_ACTION_CODES['STOPPED_OR_SKIPPED']),
+            np.full(n - position, _TRIP_LOG_ACTION_CODES['EN_ROUTE_TO'])
+        ]).astype(np.int8)
+        if stopped:
+            action_codes[position - 1] = _TRIP_LOG_ACTION_CODES['STOPPED_AT']
+        minimum_times = np.concatenate([minimum_times, np.full(settling, latest_information_time),
+                                        np.full(n - position, information_time)])
+        maximum_times = np.concatenate([maximum_times, np.full(settling, information_time),
+                                        np.full(n - position, np.nan)])
+        if stopped:
+            maximum_times[position - 1] = np.nan
+        latest_information_times = np.concatenate([latest_information_times,
+                                                   np.full(n - settled, information_time)])
+
+    return _build_trip_log(trip_log['trip_id'].iloc[0], trip_log['route_id'].iloc[0], action_codes, minimum_times,
+                           maximum_times, route, latest_information_times)
 
 
 def mta_archival_time_to_unix_timestamp(mta_archival_time):
@@ -422,7 +1388,7 @@ def mta_archival_time_to_unix_timestamp(mta_archival_time):
     """
     import datetime
 
-    datetime_parts = [int(datetime_part.lstrip('0')) for datetime_part in mta_archival_time.split("-")]
+    datetime_parts = [int(datetime_part) for datetime_part in mta_archival_time.split("-")]
     return int(datetime.datetime(*datetime_parts).timestamp())
 
 
@@ -431,10 +1397,9 @@ def _extract_synthetic_route_from_tripwise_action_logs(tripwise_action_logs):
     Given a list of trip-wise action logs, returns the synthetic route of all of the stops that train may have
     stopped at, in the order in which those stops would have occurred.
     """
-    station_lists = []
-    for log in tripwise_action_logs:
-        station_lists.append(list(log['stop_id'].unique()))
-    return _extract_synthetic_route_from_station_lists(station_lists)
+    stops = _code_tables.stop_ids
+    station_lists = [pd.unique(stops.encode(log['stop_id'])).tolist() for log in tripwise_action_logs]
+    return list(stops.decode(_extract_synthetic_route_from_station_lists(station_lists)))
 
 
 def _extract_synthetic_route_from_station_lists(station_lists):
@@ -442,34 +1407,48 @@ def _extract_synthetic_route_from_station_lists(station_lists):
     Given a list of station lists (that is: a list of lists, where each sublist consists of the series of stations
     which a train was purported to be heading towards at any one time), returns the synthetic route of all of the
     stops that train may have stopped at, in the order in which those stops would have occurred.
+
+    Thousands of trips running along the same route pattern produce identical station lists, so results are memoized.
+    """
+    return list(_extract_synthetic_route_from_station_tuples(tuple(tuple(stations) for stations in station_lists)))
+
+
+@functools.lru_cache(maxsize=2 ** 14)
+def _extract_synthetic_route_from_station_tuples(station_lists):
+    """
+    Memoized submethod of the above. Takes and returns tuples, which (unlike lists) are hashable.
     """
     ret = []
-    for i in range(len(station_lists)):
-        ret = _synthesize_station_lists(ret, station_lists[i])
-    return ret
+    for stations in station_lists:
+        ret = _synthesize_station_lists(ret, list(stations))
+    return tuple(ret)
 
 
 def _synthesize_station_lists(left, right):
     """
     Pairwise synthesis op. Submethod of the above.
     """
-    # First, find the pivot.
+    # First, find the pivot: the last station in the first list which also appears in the second list, and the first
+    # place in the second list in which it appears.
+    right_positions = dict()
+    for k, station in enumerate(right):
+        right_positions.setdefault(station, k)
+
     pivot_left = pivot_right = -1
-    for j in range(len(left)):
-        station_a = left[j]
-        for k in range(len(right)):
-            station_b = right[k]
-            if station_a == station_b:
-                pivot_left = j
-                pivot_right = k
-                break
+    for j in range(len(left) - 1, -1, -1):
+        if left[j] in right_positions:
+            pivot_left = j
+            pivot_right = right_positions[left[j]]
+            break
 
     # If we found a pivot...
     if pivot_left != -1:
         # ...then the stations that appear before the pivot in the first list, the pivot, and the stations that
         # appear after the pivot in the second list should be the ones that are included
-        return (left[:pivot_left] +
-                [s for s in right[:pivot_right] if s not in left[:pivot_left]] +
+        left_head = left[:pivot_left]
+        left_head_stations = set(left_head)
+        return (left_head +
+                [s for s in right[:pivot_right] if s not in left_head_stations] +
                 right[pivot_right:])
     # If we did not find a pivot...
     else:
@@ -479,137 +1458,760 @@ def _synthesize_station_lists(left, right):
         return left + right
 
 
+# Entity kinds, as recorded in a FeedIndex.
+ENTITY_OTHER = -1
+ENTITY_TRIP_UPDATE = 0
+ENTITY_VEHICLE_UPDATE = 1
+ENTITY_ALERT = 2
+
+FeedIndex = collections.namedtuple('FeedIndex', ['kinds', 'trip_ids', 'vehicle_indices', 'alert_range'])
+FeedIndex.__doc__ = """
+A one-pass index of the entities in a GTFS-Realtime feed.
+
+kinds, np.ndarray of int8
+    The kind of each entity: one of ENTITY_TRIP_UPDATE, ENTITY_VEHICLE_UPDATE, ENTITY_ALERT, or ENTITY_OTHER.
+trip_ids, np.ndarray of object
+    The trip id each trip update or vehicle update entity is about, or None for any other entity.
+vehicle_indices, np.ndarray of int64
+    For each trip update entity, the index of the vehicle update entity paired with it, or -1 if there is none.
+alert_range, (int, int)
+    The start and stop index of the block of alerts at the end of the feed.
+"""
+
+
+@_instrumented('index', lambda index, entities: {'entities': len(index.kinds)})
+def index_feed_entities(entities):
+    """
+    Classifies each of the entities in a feed (or any list of feed messages) exactly once, returning a FeedIndex which
+    downstream processing stages consume instead of re-probing the messages themselves.
+
+    Parameters
+    ----------
+    entities, list of gtfs_realtime_pb2.FeedEntity objects
+        The entities being indexed, e.g. `feed.entity`.
+    """
+    n = len(entities)
+    kinds = np.full(n, ENTITY_OTHER, dtype=np.int8)
+    trip_ids = np.empty(n, dtype=object)
+
+    for i, entity in enumerate(entities):
+        if entity.HasField('alert'):
+            kinds[i] = ENTITY_ALERT
+        elif entity.HasField('trip_update'):
+            kinds[i] = ENTITY_TRIP_UPDATE
+            trip_ids[i] = entity.trip_update.trip.trip_id
+        elif entity.HasField('vehicle'):
+            kinds[i] = ENTITY_VEHICLE_UPDATE
+            trip_ids[i] = entity.vehicle.trip.trip_id
+
+    return _build_feed_index(kinds, trip_ids)
+
+
+def _build_feed_index(kinds, trip_ids):
+    """
+    Builds a FeedIndex out of the kinds and trip ids of the entities in a feed.
+    """
+    n = len(kinds)
+
+    # Vehicle updates always immediately follow the trip update they are associated with.
+    vehicle_indices = np.full(n, -1, dtype=np.int64)
+    paired = np.flatnonzero((kinds[:-1] == ENTITY_TRIP_UPDATE) & (kinds[1:] == ENTITY_VEHICLE_UPDATE))
+    vehicle_indices[paired] = paired + 1
+
+    # In the MTA case, alerts are provided at the end of the feed.
+    non_alerts = np.flatnonzero(kinds != ENTITY_ALERT)
+    alert_start = int(non_alerts[-1]) + 1 if len(non_alerts) else 0
+
+    return FeedIndex(kinds=kinds, trip_ids=trip_ids, vehicle_indices=vehicle_indices, alert_range=(alert_start, n))
+
+
+def filter_feed_index(entities, index, route_ids=None, trip_id_predicate=None, entity_route_ids=None):
+    """
+    Returns a copy of a FeedIndex in which the trip update and vehicle update entities of trips not selected by the
+    given filters are reclassified as ENTITY_OTHER, so that downstream processing stages pass over them entirely.
+
+    Parameters
+    ----------
+    entities, list of gtfs_realtime_pb2.FeedEntity objects, or None
+        The entities the index was built over. These are only read for their route ids, so they may be None if
+        `entity_route_ids` is set.
+    index, FeedIndex
+        The index being filtered.
+    route_ids, iterable or None
+        If set, only trips on these routes are kept. A vehicle update paired with a trip update is kept or dropped
+        along with it; an unpaired one is judged by its own trip descriptor.
+    trip_id_predicate, callable or None
+        If set, only trips whose trip id this returns True for are kept. It is called once per distinct trip id.
+    entity_route_ids, np.ndarray of object or None
+        The route id of each entity's trip descriptor, if these are already known (see
+        `wire_decoding.decode_feed_fields`).
+    """
+    kinds = index.kinds
+    trips = (kinds == ENTITY_TRIP_UPDATE) | (kinds == ENTITY_VEHICLE_UPDATE)
+    selected = trips.copy()
+
+    if trip_id_predicate is not None:
+        trip_ids = pd.unique(index.trip_ids[selected])
+        selected &= pd.Index(index.trip_ids).isin([trip_id for trip_id in trip_ids if trip_id_predicate(trip_id)])
+
+    if route_ids is not None:
+        paired = np.zeros(len(kinds), dtype=bool)
+        paired[index.vehicle_indices[index.vehicle_indices != -1]] = True
+        judged = np.flatnonzero(selected & ((kinds == ENTITY_TRIP_UPDATE) | ~paired))
+
+        if entity_route_ids is None:
+            entity_route_ids = np.empty(len(kinds), dtype=object)
+            for i in judged:
+                entity = entities[int(i)]
+                entity_route_ids[i] = entity.trip_update.trip.route_id if kinds[i] == ENTITY_TRIP_UPDATE else \
+                    entity.vehicle.trip.route_id
+
+        keep = np.zeros(len(kinds), dtype=bool)
+        keep[judged] = pd.Index(entity_route_ids[judged]).isin(list(route_ids))
+        selected[judged] = keep[judged]
+        trip_updates = judged[(kinds[judged] == ENTITY_TRIP_UPDATE) & (index.vehicle_indices[judged] != -1)]
+        selected[index.vehicle_indices[trip_updates]] &= keep[trip_updates]
+
+    kinds = kinds.copy()
+    kinds[trips & ~selected] = ENTITY_OTHER
+    return index._replace(kinds=kinds)
+
+
 def _is_vehicle_update(message):
     """Helper method that determines whether or not a message is a vehicle update."""
-    return str(message.trip_update.trip.route_id) == ''
+    return message.HasField('vehicle')
 
 
 def _is_alert(message):
     """Helper method that determines whether or not a message is an alert."""
-    return str(message.alert) != ''
+    return message.HasField('alert')
 
 
 def _is_trip_update(message):
     """Helper method that determines whether or not a message is a trip update."""
-    return not _is_vehicle_update(message) and not _is_alert(message)
+    return message.HasField('trip_update') and not message.HasField('alert')
 
 
-def _sort_feed_messages_by_trip_id(feed):
+def _sort_feed_messages_by_trip_id(feed, index=None, route_ids=None, trip_id_predicate=None):
     """
     Takes a feed. Returns a hash table of non-alert messages in that feed corresponding with particular trips.
 
     Alerts are excluded because the way things are, it's better to leave incorporating them in downstream of when
-    this method is used.
+    this method is used. If `route_ids` or `trip_id_predicate` are set, so are the messages of trips which they do
+    not select (see `filter_feed_index`).
     """
+    index = _filtered_feed_index(feed, index, route_ids, trip_id_predicate)
+
     message_table = collections.defaultdict(list)
-    for message in feed.entity:
-        if _is_alert(message):
-            continue
-        elif _is_trip_update(message):
-            trip_id = message.trip_update.trip.trip_id
-        else:  # is_vehicle_update
-            trip_id = message.vehicle.trip.trip_id
-        message_table[trip_id].append(message)
+    for i in np.flatnonzero((index.kinds == ENTITY_TRIP_UPDATE) | (index.kinds == ENTITY_VEHICLE_UPDATE)):
+        message_table[index.trip_ids[i]].append(feed.entity[int(i)])
     return message_table
 
 
+def _filtered_feed_index(feed, index, route_ids, trip_id_predicate):
+    """
+    Returns the index of a feed (building it, if it is None), filtered if any filters are set.
+    """
+    index = index if index is not None else index_feed_entities(feed.entity)
+    if route_ids is None and trip_id_predicate is None:
+        return index
+    return filter_feed_index(feed.entity, index, route_ids=route_ids, trip_id_predicate=trip_id_predicate)
+
+
+@_instrumented('finish', lambda trip_log, *args: {'trips_finished': 1})
 def _finish_trip(trip_log, information_date):
     """
     Finishes a trip. We know a trip is finished when its messages stops appearing in feed files, at which time we can
     "cross out" any stations still remaining.
     """
-    trip_log = (trip_log.replace('EN_ROUTE_TO', 'STOPPED_OR_SKIPPED')
-                        .replace('EXPECTED_TO_SKIP', 'STOPPED_OR_SKIPPED')
-                        .replace('nan', np.nan))
-    trip_log['maximum_time'] = trip_log['maximum_time'].fillna(information_date)
-    return trip_log
+    unfinished = trip_log['action'].isin(['EN_ROUTE_TO', 'EXPECTED_TO_SKIP'])
+    return trip_log.assign(action=trip_log['action'].where(~unfinished, 'STOPPED_OR_SKIPPED'),
+                           maximum_time=trip_log['maximum_time'].fillna(information_date))
+
+
+def _decode_feed(feed):
+    """
+    Returns a feed as a gtfs_realtime_pb2.FeedMessage object. Feeds may be passed around either already parsed, or as
+    the raw bytes of the GTFS-Realtime message.
+    """
+    if isinstance(feed, (bytes, bytearray, memoryview)):
+        from google.transit import gtfs_realtime_pb2
+
+        with _stage('decode') as stage:
+            message = gtfs_realtime_pb2.FeedMessage()
+            message.ParseFromString(feed)
+            stage.count(feeds=1, bytes=len(feed))
+        return message
+    return feed
+
+
+def _encode_feed(feed):
+    """
+    Returns the raw bytes of a feed. Shipping raw bytes to worker processes is much cheaper than pickling the
+    equivalent protobuf objects.
+    """
+    if isinstance(feed, memoryview):
+        return feed.tobytes()
+    elif isinstance(feed, (bytes, bytearray)):
+        return feed
+    return feed.SerializeToString()
+
+
+# The ways in which feeds may be decoded. See `parse_feeds_into_trip_logbook`.
+DECODERS = ('protobuf', 'wire')
+
+
+def _check_decoder(decoder):
+    if decoder not in DECODERS:
+        raise ValueError("Unknown decoder {0!r}; must be one of {1}.".format(decoder, ", ".join(DECODERS)))
+
+
+def _parse_feed_into_action_log(feed, information_time, route_ids=None, trip_id_predicate=None, decoder='protobuf'):
+    """
+    Parses a feed, either parsed or as raw GTFS-Realtime message bytes, into a single pandas.DataFrame.
+
+    If `decoder` is 'wire', raw feeds are decoded by `wire_decoding.decode_feed_fields`, falling back to the protobuf
+    bindings for any which it cannot read. Feeds which have already been parsed are always read through the protobuf
+    bindings.
+    """
+    if decoder == 'wire' and isinstance(feed, (bytes, bytearray, memoryview)):
+        import wire_decoding
+
+        try:
+            return wire_decoding.parse_wire_feed_into_action_log(feed, information_time, route_ids=route_ids,
+                                                                 trip_id_predicate=trip_id_predicate)
+        except wire_decoding.WireFormatError:
+            pass
+
+    feed = _decode_feed(feed)
+    index = _filtered_feed_index(feed, None, route_ids, trip_id_predicate)
+    return _parse_gtfs_into_action_log(feed, information_time, index=index)
+
+
+def _parse_feed_into_tripwise_action_logs(feed, information_time, index=None, route_ids=None,
+                                          trip_id_predicate=None, decoder='protobuf'):
+    """
+    Takes a feed. Returns a hash table of action logs corresponding with particular trips in that feed.
+
+    The action log for the entire feed is built at once, and then split up by trip id. Trips not selected by
+    `route_ids` or `trip_id_predicate` (see `filter_feed_index`) are never parsed. If the feed's `index` is given, it
+    is read through the protobuf bindings, whatever the `decoder`.
+    """
+    if index is None:
+        action_log = _parse_feed_into_action_log(feed, information_time, route_ids=route_ids,
+                                                 trip_id_predicate=trip_id_predicate, decoder=decoder)
+    else:
+        feed = _decode_feed(feed)
+        index = _filtered_feed_index(feed, index, route_ids, trip_id_predicate)
+        action_log = _parse_gtfs_into_action_log(feed, information_time, index=index)
+    return _split_action_log_by_trip_id(action_log)
+
+
+def _split_action_log_by_trip_id(action_log):
+    """
+    Splits a feed-wide action log into a hash table of action logs corresponding with particular trips.
+    """
+    return {trip_id: trip_action_log for trip_id, trip_action_log in action_log.groupby('trip_id', sort=False)}
+
+
+def _parse_raw_feed_into_action_log(job):
+    """
+    Process pool job. Takes a (raw feed bytes, information time, route ids, trip id predicate, decoder) tuple and
+    returns the feed-wide action log.
+    """
+    raw_feed, information_time, route_ids, trip_id_predicate, decoder = job
+    return _parse_feed_into_action_log(raw_feed, information_time, route_ids=route_ids,
+                                       trip_id_predicate=trip_id_predicate, decoder=decoder)
+
+
+def _parse_feed_into_action_columns(job):
+    """
+    Process pool job. Takes the same tuple as `_parse_raw_feed_into_action_log` (though the feed may also be parsed
+    already, if the job is run in this process), and returns just the parts of the feed-wide action log which trip
+    logs are built out of, as arrays which are much cheaper to send back than the action log itself: a (trip ids,
+    route ids, stop ids, trip indices, stopped) tuple. The trip ids are those of the trips in the feed, and the route
+    ids their routes. The stop ids are a categorical over the rows, the trip indices give each row's trip's position
+    in the trip ids, and stopped is whether or not each row's action is STOPPED_AT.
+    """
+    action_log = _parse_raw_feed_into_action_log(job)
+    trip_indices, trip_ids = pd.factorize(action_log['trip_id'].values)
+    first_rows = np.unique(trip_indices, return_index=True)[1]
+    route_ids = action_log['route_id'].values.take(first_rows).remove_unused_categories()
+    stop_ids = action_log['stop_id'].values.remove_unused_categories()
+    stopped = np.asarray(action_log['action'].values == 'STOPPED_AT', dtype=bool)
+    return np.asarray(trip_ids, dtype=object), route_ids, stop_ids, trip_indices.astype(np.int32), stopped
+
+
+def _split_action_columns_by_trip(action_columns, information_time):
+    """
+    Splits the action columns of a feed (see `_parse_feed_into_action_columns`) into a hash table of the
+    ActionLogColumns of the single action log each trip in the feed has, by trip id.
+    """
+    trip_ids, route_ids, stop_ids, trip_indices, stopped = action_columns
+    route_ids = np.asarray(route_ids, dtype=object)
+    order = np.argsort(trip_indices, kind='stable')
+    stop_codes, stopped = _code_tables.stop_ids.encode(stop_ids)[order], stopped[order]
+    information_times = np.full(len(order), information_time)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(trip_indices, minlength=len(trip_ids)))])
+    return {trip_id: ActionLogColumns(trip_id, route_ids[i], stop_codes[a:b], stopped[a:b], information_times[a:b],
+                                      np.array([b - a], dtype=np.int64))
+            for i, (trip_id, a, b) in enumerate(zip(trip_ids, offsets[:-1], offsets[1:]))}
+
+
+@contextlib.contextmanager
+def _process_pool(workers):
+    """
+    Context manager yielding a process pool of `workers` processes, or None if `workers` is None or one, in which case
+    work should be done serially in this process.
+    """
+    if workers is None or workers <= 1:
+        yield None
+    else:
+        import concurrent.futures
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            yield executor
 
 
-def parse_feeds_into_trip_logbook(feeds, information_dates):
+def _parse_feeds_into_action_log_tables(feeds, information_dates, executor=None, workers=None, route_ids=None,
+                                        trip_id_predicate=None, decoder='protobuf'):
+    """
+    Parses each of a list of feeds into a hash table of action logs by trip id, optionally fanning the work out over a
+    process pool of `workers` processes. The tables are returned in the same order as the feeds.
+    """
+    if executor is None:
+        return [_parse_feed_into_tripwise_action_logs(feed, information_date, route_ids=route_ids,
+                                                      trip_id_predicate=trip_id_predicate, decoder=decoder)
+                for feed, information_date in zip(feeds, information_dates)]
+
+    route_ids = None if route_ids is None else list(route_ids)
+    jobs = [(_encode_feed(feed), information_date, route_ids, trip_id_predicate, decoder)
+            for feed, information_date in zip(feeds, information_dates)]
+    chunksize = max(1, len(jobs) // (workers * 4))
+    action_logs = executor.map(_parse_raw_feed_into_action_log, jobs, chunksize=chunksize)
+    return [_split_action_log_by_trip_id(action_log) for action_log in action_logs]
+
+
+@_instrumented('parse_feeds', lambda logbook, feeds, *args, **kwargs: {'feeds': len(feeds), 'trips': len(logbook)})
+def parse_feeds_into_trip_logbook(feeds, information_dates, workers=None, route_ids=None, trip_id_predicate=None,
+                                  decoder='protobuf'):
     """
     Given a list of feeds and a list of information dates, returns a hash table of trip logs associated with each
     trip mentioned in those feeds.
 
     The ultimate method for which all of the above was developed.
+
+    Parameters
+    ----------
+    feeds, list of gtfs_realtime_pb2.FeedMessage objects or bytes
+        The feeds being processed, either parsed or as raw GTFS-Realtime message bytes (including the memoryviews
+        handed out by a FeedPack).
+    information_dates, list of int
+        The information time associated with each feed. Feeds are processed in information time order.
+    workers, int or None
+        If set to more than one, feed decoding and action log extraction, and afterwards trip log construction, are
+        spread over a pool of this many processes. Passing raw bytes in `feeds` is cheapest in this case, as it saves
+        having to reserialize them.
+    route_ids, iterable or None
+        If set, only trips on these routes are processed. The entities of every other trip are dropped as each feed
+        is indexed, before any action logs are built, so that the cost of a run scales with the share of the feeds
+        taken up by the selected trips.
+    trip_id_predicate, callable or None
+        If set, only trips whose trip id this returns True for are processed. It is called once per distinct trip id
+        per feed, and must be picklable if `workers` is set.
+    decoder, {'protobuf', 'wire'}
+        How raw feeds are decoded. 'protobuf' parses each into a gtfs_realtime_pb2.FeedMessage. 'wire' reads only the
+        fields the pipeline needs straight out of the bytes into arrays (see `wire_decoding.decode_feed_fields`),
+        which is much faster, falling back to the protobuf bindings for any feed it cannot read. Both give the same
+        trip logbook.
+
+    Since a trip is filtered the same way in every feed it appears in, filtering does not change which feeds the
+    retained trips are seen in, and these are terminated exactly as they would be without it.
     """
-    message_tables = [_sort_feed_messages_by_trip_id(feed) for feed in feeds]
-    trip_ids = set(itertools.chain(*[table.keys() for table in message_tables]))
+    _check_decoder(decoder)
 
-    ret = dict()
+    # Termination logic depends on seeing the feeds in the order in which they were observed.
+    order = sorted(range(len(feeds)), key=lambda i: information_dates[i])
+    feeds = [feeds[i] for i in order]
+    information_dates = [information_dates[i] for i in order]
 
-    for trip_id in trip_ids:
-        actions_logs = []
-        trip_began = False
-        trip_terminated = False
-        trip_terminated_time = None
-
-        for i, table in enumerate(message_tables):
-            # Is the trip present in this table at all?
-            if not table[trip_id]:
-                # If the trip hasn't been planned yet, and will simply appear in a later trip update, do nothing.
-                if not trip_began:
-                    pass
+    with _process_pool(workers) as executor:
+        action_columns = _parse_feeds_into_action_columns(feeds, information_dates, executor=executor, workers=workers,
+                                                          route_ids=route_ids, trip_id_predicate=trip_id_predicate,
+                                                          decoder=decoder)
+        return _build_trip_logs(action_columns, information_dates, executor=executor, workers=workers)
 
-                # If the trip has been planned already, and doesn't exist in the current table, then it must have
-                # been removed. This implies that this trip terminated in the interceding time. Store this
-                # information for later.
-                else:
-                    trip_terminated = True
-                    trip_terminated_time = information_dates[i]
 
-                continue
-            else:
-                trip_began = True
+def _parse_feeds_into_action_columns(feeds, information_dates, executor=None, workers=None, route_ids=None,
+                                     trip_id_predicate=None, decoder='protobuf'):
+    """
+    Parses each of a list of feeds into its action columns (see `_parse_feed_into_action_columns`), optionally fanning
+    the work out over a process pool of `workers` processes. The action columns are returned in the same order as the
+    feeds.
+    """
+    route_ids = None if route_ids is None else list(route_ids)
+    if executor is None:
+        return [_parse_feed_into_action_columns((feed, information_date, route_ids, trip_id_predicate, decoder))
+                for feed, information_date in zip(feeds, information_dates)]
+    jobs = [(_encode_feed(feed), information_date, route_ids, trip_id_predicate, decoder)
+            for feed, information_date in zip(feeds, information_dates)]
+    return list(executor.map(_parse_feed_into_action_columns, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+TripPresence = collections.namedtuple('TripPresence', ['first_seen', 'last_seen', 'last_absent'])
 
-            action_log = _parse_message_list_into_action_log(table[trip_id], information_dates[i])
-            actions_logs.append(action_log)
-        trip_log = parse_tripwise_action_logs_into_trip_log(actions_logs)
-        ret[trip_id] = trip_log
 
-        # If the trip was terminated sometime in the course of these feeds, update the trip log accordingly.
-        if trip_terminated:
-            ret[trip_id] = _finish_trip(ret[trip_id], trip_terminated_time)
+def index_trip_presence(trip_id_sets):
+    """
+    Given the sets of trip ids appearing in each of a list of feeds, in information time order, returns a hash table
+    of the presence of each trip across them: the positions of the first feed it appears in, the last feed it appears
+    in, and the last feed it is missing from after it first appears (or None, if it is in every feed from its first
+    on). A trip missing from the last feed is always missing from it last.
+
+    This takes time proportional to the number of appearances, not to the number of trips times the number of feeds.
 
+    Parameters
+    ----------
+    trip_id_sets, iterable of iterables of str
+        The trip ids appearing in each feed, e.g. the keys of each of a list of hash tables of action logs by trip id.
+    """
+    first_seen, last_seen, last_absent = dict(), dict(), dict()
+    position = -1
+    for position, trip_ids in enumerate(trip_id_sets):
+        for trip_id in trip_ids:
+            seen = last_seen.get(trip_id)
+            if seen is None:
+                first_seen[trip_id] = position
+            elif seen != position - 1:
+                last_absent[trip_id] = position - 1
+            last_seen[trip_id] = position
+
+    return {trip_id: TripPresence(first_seen[trip_id], seen, position if seen != position else last_absent.get(trip_id))
+            for trip_id, seen in last_seen.items()}
+
+
+@_instrumented('trip_log', lambda ret, job: {'rows': len(ret[1]), 'trip_logs': len(ret[0])})
+def _build_trip_log_columns(job):
+    """
+    Process pool job. Takes a (row offsets, termination times, stop codes, stopped, feed positions, information
+    dates) tuple holding the action logs of a chunk of trips back to back, as built by `_build_trip_logs`, and
+    returns a (lengths, action codes, minimum times, maximum times, stop codes, latest information times) tuple
+    holding their trip logs, likewise back to back. Trips with a termination time (NaN for those which did not
+    terminate) are finished off, as by `_finish_trip`.
+    """
+    offsets, termination_times, stop_codes, stopped, feed_positions, information_dates = job
+
+    lengths, columns = [], []
+    for i in range(len(offsets) - 1):
+        start, stop = offsets[i], offsets[i + 1]
+        trip_feed_positions = feed_positions[start:stop]
+        log_starts = np.concatenate([[0], np.flatnonzero(np.diff(trip_feed_positions)) + 1, [stop - start]])
+        action_codes, minimum_times, maximum_times, route, latest_information_times = _trip_log_arrays(
+            stop_codes[start:stop], stopped[start:stop], information_dates[trip_feed_positions], np.diff(log_starts)
+        )
+
+        if not np.isnan(termination_times[i]):
+            action_codes[action_codes == _TRIP_LOG_ACTION_CODES['EN_ROUTE_TO']] = \
+                _TRIP_LOG_ACTION_CODES['STOPPED_OR_SKIPPED']
+            maximum_times = np.where(np.isnan(maximum_times), termination_times[i], maximum_times)
+
+        lengths.append(len(action_codes))
+        columns.append((action_codes, minimum_times, maximum_times, np.asarray(route, dtype=np.int32),
+                        latest_information_times))
+
+    if not columns:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8), np.zeros(0), np.zeros(0),
+                np.zeros(0, dtype=np.int32), np.zeros(0))
+    return (np.array(lengths, dtype=np.int64),) + tuple(np.concatenate(column) for column in zip(*columns))
+
+
+def _build_trip_logs(action_columns, information_dates, executor=None, workers=None):
+    """
+    Builds a trip logbook out of the action columns of a list of feeds (see `_parse_feed_into_action_columns`), in
+    information time order. If a process pool of `workers` processes is provided, the trips are split into chunks and
+    spread over it.
+
+    Everything sent to and from the pool is a handful of flat arrays per chunk of trips, not a frame per action log or
+    trip log, so that the work left to this process is small next to that done in the pool. Trips are terminated as
+    `index_trip_presence` has it, and their trip logs are the same as `parse_tripwise_action_logs_into_trip_log`
+    builds out of each trip's action logs, finished off by `_finish_trip`.
+    """
+    route_table, stop_table = _code_tables.route_ids, _code_tables.stop_ids
+
+    # A trip which is missing from a feed after it began must have been removed from the record, implying that it
+    # terminated in the interceding time. It is deemed to have terminated at the last feed it is missing from.
+    with _stage('termination') as stage:
+        presence = index_trip_presence(trip_ids for trip_ids, _, _, _, _ in action_columns)
+        trip_ids = np.array(list(presence), dtype=object)
+        termination_times = np.array([np.nan if seen.last_absent is None else information_dates[seen.last_absent]
+                                      for seen in presence.values()], dtype=float)
+        stage.count(trips_opened=len(presence), trips_closed=int(np.count_nonzero(~np.isnan(termination_times))))
+    if not presence:
+        return dict()
+
+    # Bring every feed's identifiers into this process's code space, and gather up the rows of every feed. Trips are
+    # identified by their position in the logbook.
+    positions = pd.Index(trip_ids)
+
+    feed_trips, feed_routes, row_trips, row_stops, row_stopped, row_feeds = [], [], [], [], [], []
+    for k, (feed_trip_ids, route_ids, stop_ids, trip_indices, stopped) in enumerate(action_columns):
+        trips = positions.get_indexer(feed_trip_ids) if len(feed_trip_ids) else np.zeros(0, dtype=np.int64)
+        feed_trips.append(trips)
+        feed_routes.append(route_table.encode(route_ids))
+        row_trips.append(trips[trip_indices])
+        row_stops.append(stop_table.encode(stop_ids))
+        row_stopped.append(stopped)
+        row_feeds.append(np.full(len(trip_indices), k, dtype=np.int32))
+
+    # A trip's route is the one it has in the first feed it appears in.
+    _, first_appearances = np.unique(np.concatenate(feed_trips), return_index=True)
+    route_codes = np.concatenate(feed_routes)[first_appearances]
+
+    # Group the rows by trip, keeping them in feed order within each trip.
+    row_trips = np.concatenate(row_trips)
+    order = np.argsort(row_trips, kind='stable')
+    row_stops, row_stopped, row_feeds = [np.concatenate(rows)[order] for rows in [row_stops, row_stopped, row_feeds]]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(row_trips, minlength=len(trip_ids)))])
+    information_dates = np.asarray(information_dates)
+
+    chunk_size = len(trip_ids) if executor is None else max(1, -(-len(trip_ids) // (workers * 4)))
+    bounds = list(range(0, len(trip_ids), chunk_size)) + [len(trip_ids)]
+    jobs = [(offsets[a:b + 1] - offsets[a], termination_times[a:b], row_stops[offsets[a]:offsets[b]],
+             row_stopped[offsets[a]:offsets[b]], row_feeds[offsets[a]:offsets[b]], information_dates)
+            for a, b in zip(bounds[:-1], bounds[1:])]
+
+    # Each chunk's trip logs are built into a single frame, and then sliced up.
+    ret = dict()
+    chunks = map(_build_trip_log_columns, jobs) if executor is None else executor.map(_build_trip_log_columns, jobs)
+    for a, b, (lengths, *columns) in zip(bounds[:-1], bounds[1:], chunks):
+        frame = _build_trip_log_frame(np.repeat(trip_ids[a:b], lengths), np.repeat(route_codes[a:b], lengths),
+                                      *columns)
+        row_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        for i in range(b - a):
+            ret[trip_ids[a + i]] = frame.iloc[row_offsets[i]:row_offsets[i + 1]].reset_index(drop=True)
     return ret
 
 
-def merge_trip_logbooks(logbooks):
+class TripLogbookBuilder:
+    """
+    Builds a trip logbook from a stream of feeds, one feed at a time.
+
+    Where `parse_feeds_into_trip_logbook` needs every feed in memory up front, this builder only keeps the action logs
+    of trips which are still running. Once a trip has been absent from the feeds for longer than `horizon` it is
+    finished off and handed back, so memory use is bounded by the number of concurrently running trips, not by the
+    number of feeds ingested. A trip which is missing from a few feeds and then comes back within the horizon is
+    kept open throughout, and so is handed back only once, in one piece.
+
+    Note that a trip is finished off using the information time of the feed in which it has been absent for longer
+    than the horizon, where `parse_feeds_into_trip_logbook` would use that of the last feed it is missing from. The
+    two agree on every trip still held when the builder is closed.
+    """
+    def __init__(self, route_ids=None, trip_id_predicate=None, decoder='protobuf', horizon=300):
+        """
+        Parameters
+        ----------
+        route_ids, iterable or None
+            If set, only trips on these routes are built, as in `parse_feeds_into_trip_logbook`.
+        trip_id_predicate, callable or None
+            If set, only trips whose trip id this returns True for are built, as in `parse_feeds_into_trip_logbook`.
+        decoder, {'protobuf', 'wire'}
+            How raw feeds are decoded, as in `parse_feeds_into_trip_logbook`.
+        horizon, int
+            How long a trip must be absent from the feeds, in seconds, before it is taken to have terminated. A trip
+            which comes back after that is handed back a second time, as a new trip.
+        """
+        _check_decoder(decoder)
+        self._open_trips = dict()
+        self._last_seen = dict()  # trip id -> information time of the last feed the trip was in
+        self._last_absent = dict()  # trip id -> information time of the last feed the trip was missing from
+        self.latest_information_time = None
+        self.route_ids = None if route_ids is None else set(route_ids)
+        self.trip_id_predicate = trip_id_predicate
+        self.decoder = decoder
+        self.horizon = horizon
+
+    def __len__(self):
+        return len(self._open_trips)
+
+    @property
+    def open_trip_ids(self):
+        """The ids of the trips which have been observed, but have not terminated yet."""
+        return set(self._open_trips.keys())
+
+    @_instrumented('ingest', lambda finished, *args: {'feeds': 1})
+    def ingest(self, feed, information_time):
+        """
+        Ingests a single feed, either parsed or as raw GTFS-Realtime message bytes. Feeds must be ingested in
+        information time order.
+
+        Returns a trip logbook (a hash table of trip logs, keyed by trip id) containing the trips which, as of this
+        feed, have been absent from the feeds for longer than the horizon.
+        """
+        if self.latest_information_time is not None and information_time < self.latest_information_time:
+            raise ValueError("Feeds must be ingested in information time order.")
+        self.latest_information_time = information_time
+
+        action_log_table = _parse_feed_into_tripwise_action_logs(feed, information_time, route_ids=self.route_ids,
+                                                                 trip_id_predicate=self.trip_id_predicate,
+                                                                 decoder=self.decoder)
+
+        # Any trip which is missing from this feed, and has been for longer than the horizon, has terminated.
+        with _stage('termination') as stage:
+            finished = dict()
+            for trip_id in [trip_id for trip_id in self._open_trips if trip_id not in action_log_table]:
+                self._last_absent[trip_id] = information_time
+                if information_time - self._last_seen[trip_id] > self.horizon:
+                    finished[trip_id] = self._build(trip_id, information_time)
+
+            opened = 0
+            for trip_id, action_log in action_log_table.items():
+                opened += trip_id not in self._open_trips
+                self._open_trips.setdefault(trip_id, []).append(action_log)
+                self._last_seen[trip_id] = information_time
+            stage.count(trips_opened=opened, trips_closed=len(finished))
+
+        return finished
+
+    def _build(self, trip_id, termination_time=None):
+        """
+        Builds the trip log of an open trip, finishing it off as of the termination time if there is one, and
+        forgets about the trip.
+        """
+        trip_log = parse_tripwise_action_logs_into_trip_log(self._open_trips.pop(trip_id))
+        del self._last_seen[trip_id]
+        self._last_absent.pop(trip_id, None)
+        return trip_log if termination_time is None else _finish_trip(trip_log, termination_time)
+
+    def close(self):
+        """
+        Returns a trip logbook containing the trips which are still open, and resets the builder.
+
+        As in `parse_feeds_into_trip_logbook`, a trip which was missing from any of the feeds since it first appeared
+        is deemed to have terminated at the last feed it was missing from, and is finished off; the rest are still
+        running, and are not.
+        """
+        return {trip_id: self._build(trip_id, self._last_absent.get(trip_id)) for trip_id in list(self._open_trips)}
+
+
+@_instrumented('merge', lambda logbook, *args, **kwargs: {'trips': len(logbook)})
+def merge_trip_logbooks(logbooks, method='fold', workers=None):
     """
     Given a list of trip logbooks (as returned by `parse_feeds_into_trip_logbooks`), returns their merger.
+
+    Parameters
+    ----------
+    logbooks, list of dict or TripLogbook
+        The trip logbooks being merged, in information time order. If any of them is a TripLogbook, the merger is
+        done in long format and a TripLogbook is returned.
+    method: {'fold', 'tree'}
+        How to go about merging. 'fold' joins each logbook onto the accumulated merger of the ones before it, in turn.
+        'tree' merges adjacent pairs of logbooks, then adjacent pairs of the results, and so on, until only one is
+        left. The minimum and maximum time repairs made by each join depend on the order in which a trip's trip logs
+        are joined, so a trip is only joined within a pair which holds its first trip log; until then its trip logs
+        are just gathered up. Each trip's trip logs are therefore joined in the same order as with 'fold', and both
+        methods give the same merger.
+    workers, int or None
+        If set to more than one, and `method` is 'tree', the pairwise merges at each level of the tree are spread over
+        a pool of this many processes.
+    """
+    if method == 'fold':
+        # The accumulator is ours to update in place, so only the incoming logbook's keys need to be visited.
+        left = dict()
+        for right in logbooks:
+            left = _join_logbooks(left, right, inplace=True)
+        return left
+    elif method == 'tree':
+        if len(logbooks) == 0:
+            return dict()
+
+        long_format = any(isinstance(logbook, TripLogbook) for logbook in logbooks)
+        logbooks = [logbook.to_dict() if isinstance(logbook, TripLogbook) else logbook for logbook in logbooks]
+
+        # Each leaf of the tree is a (joined, unjoined) pair: the trip logs of the trips first seen in its logbook,
+        # and lists of the trip logs of the trips seen before it.
+        seen, level = dict(), []
+        for logbook in logbooks:
+            joined = {trip_id: trip_log for trip_id, trip_log in logbook.items() if trip_id not in seen}
+            level.append((joined, {trip_id: [trip_log] for trip_id, trip_log in logbook.items()
+                                   if trip_id not in joined}))
+            for trip_id in logbook:
+                seen[trip_id] = seen.get(trip_id, 0) + 1
+
+        leaves = level
+        with _process_pool(workers) as executor:
+            pooled = executor is not None and len(level) > 1
+            while len(level) > 1:
+                pairs = [(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+                merged = executor.map(_join_logbook_pair, pairs) if executor else map(_join_logbook_pair, pairs)
+                level = list(merged) + ([level[-1]] if len(level) % 2 else [])
+        result = level[0][0]
+
+        # Trip logs joined in the worker processes are encoded using their code tables, and need to be brought into
+        # ours. The trip logs of trips seen in just one logbook were never joined, and are handed back as they were.
+        if pooled:
+            originals = {trip_id: trip_log for joined, _ in leaves for trip_id, trip_log in joined.items()
+                         if seen[trip_id] == 1}
+            for trip_id, trip_log in result.items():
+                result[trip_id] = originals[trip_id] if trip_id in originals else _set_trip_log_dtypes(trip_log)
+        return TripLogbook.from_dict(result) if long_format else result
+    else:
+        raise ValueError("The 'method' parameter must be one of 'fold' or 'tree'.")
+
+
+def _join_logbook_pair(job):
+    """
+    Process pool job. Takes a pair of adjacent (joined, unjoined) nodes of a tree merge (see `merge_trip_logbooks`)
+    and returns their merger. The unjoined trip logs of the right node are joined onto the left node's trip logs of
+    the same trip, in order, if it has any, and otherwise are added to its own unjoined trip logs.
     """
-    left = dict()
-    for right in logbooks:
-        left = _join_logbooks(left, right)
-    return left
+    (joined, unjoined), (right_joined, right_unjoined) = job
+    joined.update(right_joined)
+
+    pending = dict()
+    for trip_id, trip_logs in right_unjoined.items():
+        if trip_id in joined:
+            pending[trip_id] = trip_logs
+        else:
+            unjoined[trip_id] = unjoined.get(trip_id, []) + trip_logs
+
+    # Join the pending trip logs onto the joined ones a round at a time, every trip with a trip log left at once.
+    depth = 0
+    while pending:
+        trip_ids = list(pending)
+        joins = _join_trip_logs_bulk([joined[trip_id] for trip_id in trip_ids],
+                                     [pending[trip_id][depth] for trip_id in trip_ids])
+        joined.update(zip(trip_ids, joins))
+        depth += 1
+        pending = {trip_id: trip_logs for trip_id, trip_logs in pending.items() if len(trip_logs) > depth}
+    return joined, unjoined
 
 
-def _join_logbooks(left, right):
+def _join_logbooks(left, right, inplace=False):
     """
     Given two trip logbooks (as returned by `parse_feeds_into_trip_logbooks`), returns the merger of the two.
+
+    If `inplace` is True, the left logbook is updated with the contents of the right one and returned, instead of a
+    new logbook being built.
+
+    If either logbook is a TripLogbook, the merger is a TripLogbook as well (and `inplace` has no effect).
     """
-    # Figure out what our jobs are by trip id key.
-    left_keys = set(left.keys())
-    right_keys = set(right.keys())
+    if isinstance(left, TripLogbook) or isinstance(right, TripLogbook):
+        return TripLogbook.from_dict(left).merge(right)
 
-    mutual_keys = left_keys.intersection(right_keys)
-    left_exclusive_keys = left_keys.difference(mutual_keys)
-    right_exclusive_keys = right_keys.difference(mutual_keys)
+    result = left if inplace else dict(left)
 
-    # Build out non-intersecting trips.
-    result = dict()
-    for key in left_exclusive_keys:
-        result[key] = left[key]
-    for key in right_exclusive_keys:
-        result[key] = right[key]
+    # Trips exclusive to the right logbook are carried over as-is; intersecting trips are joined, all at once.
+    mutual_keys = [key for key in right if key in result]
+    joins = _join_trip_logs_bulk([result[key] for key in mutual_keys], [right[key] for key in mutual_keys])
 
-    # Build out (join) intersecting trips.
-    for key in mutual_keys:
-        result[key] = _join_trip_logs(left[key], right[key])
+    result.update(right)
+    result.update(zip(mutual_keys, joins))
 
     return result
 
 
 # noinspection PyUnresolvedReferences
+@_instrumented('join', lambda join, *args: {'rows': len(join), 'trips_joined': 1})
 def _join_trip_logs(left, right):
     """
     Two trip logs may contain information based on action logs, and GTFS-Realtime feed updates, which are
@@ -620,17 +2222,19 @@ def _join_trip_logs(left, right):
     operation.
 
     This method, the core of merge_trip_logbooks, is an operational necessity, as a day's worth of raw GTFS-R
-    messages at minutely resolution eats up 12 GB of RAM or more.
+    messages at minutely resolution eats up 12 GB of RAM or more. When merging logbooks, `_join_trip_logs_bulk`
+    performs this same operation on every intersecting trip at once.
     """
     # Order the frames so that the earlier one is on the left.
     left_start, right_start = left['latest_information_time'].min(), right['latest_information_time'].min()
     if right_start < left_start:
         left, right = right, left
 
-    # Get the combined synthetic station list.
-    stations = _extract_synthetic_route_from_station_lists([list(left['stop_id'].values),
-                                                            list(right['stop_id'].values)])
-    right_stations = set(right['stop_id'].values)
+    # Get the combined synthetic station list, in terms of stop codes.
+    left_stops = _code_tables.stop_ids.encode(left['stop_id']).tolist()
+    right_stops = _code_tables.stop_ids.encode(right['stop_id']).tolist()
+    stations = _extract_synthetic_route_from_station_lists([left_stops, right_stops])
+    right_stations = set(right_stops)
 
     # Combine the station information in last-precedent order.
     l_i = r_i = 0
@@ -644,24 +2248,17 @@ def _join_trip_logs(left, right):
     # Combine records.
     join = pd.concat([left.iloc[left_indices], right]).reset_index(drop=True)
 
-    # Declaring an ordinal categorical column in the stop_id attribute makes `pandas` handle resorting internally and,
-    # hence, results in a significant speedup (over doing so ourselves).
-    join['stop_id'] = pd.Categorical(join['stop_id'], stations, ordered=True)
-
     # Update records for stations before the first station in the right trip log that the train is EN_ROUTE_TO or
     # STOPPED_OR_SKIPPED.
-    swap_station = right.iloc[0]['stop_id']
+    swap_station = right_stops[0]
     swap_index = next(i for i, station in enumerate(stations) if station == swap_station)
     swap_space = join[:swap_index]
     where_update = swap_space[swap_space['action'] == 'EN_ROUTE_TO'].index.values
 
     join.loc[where_update, 'action'] = 'STOPPED_OR_SKIPPED'
-    join.loc[where_update, 'maximum_time'] = right.loc[0, 'latest_information_time']
-    join.loc[swap_index, 'minimum_time'] = left.loc[0, 'minimum_time']
-
-    # Hard-case the columns to float so as to avoid weird typing issues that keep coming up.
-    # TODO: Hard-fix the typing issues and simplify the tests to reflect.
-    join.loc[:, ['minimum_time', 'maximum_time']] = join.loc[:, ['minimum_time', 'maximum_time']].astype(float)
+    join.loc[where_update, 'maximum_time'] = right['latest_information_time'].iloc[0]
+    if swap_index < len(join):
+        join.loc[swap_index, 'minimum_time'] = left['minimum_time'].iloc[0]
 
     # The second trip update may on the first index contain incomplete minimum time information due to not having a
     # reference to a previous trip update included in that trip log's generative action log set. There are a number
@@ -679,8 +2276,10 @@ def _join_trip_logs(left, right):
     join.loc[:, 'minimum_time'] = join.loc[:, 'minimum_time'].fillna(method='ffill')
     join.loc[1:, 'minimum_time'] = np.maximum.accumulate(join.loc[1:, 'minimum_time'].values)
 
-    join.loc[len(left) -1, 'minimum_time'] = np.maximum(np.nan_to_num(join.loc[len(left) - 2, 'maximum_time']),
-                                                        join.loc[len(left) - 1, 'minimum_time'])
+    boundary = len(left) - 1
+    if 1 <= boundary < len(join):
+        join.loc[boundary, 'minimum_time'] = np.maximum(np.nan_to_num(join.loc[boundary - 1, 'maximum_time']),
+                                                        join.loc[boundary, 'minimum_time'])
 
     # Again at the location of the join, we may also get an incomplete `maximum_time` entry, for the same reason. In
     # this case we will take the `maximum_time` of the following entry. However, note that we are *losing
@@ -691,4 +2290,858 @@ def _join_trip_logs(left, right):
 
     join.loc[:, 'maximum_time'] = join.loc[:, 'maximum_time'].fillna(method='bfill', limit=1)
 
+    # The two trip logs' route and stop ids come out of the concatenation above as plain objects if they were encoded
+    # with different code tables (for example, if one of them was built in another process).
+    for column, table in _TRIP_LOG_CODE_TABLES.items():
+        join[column] = table.categorical(join[column].values)
+
     return join
+
+
+def _concat_trip_logs(trip_logs):
+    """
+    Concatenates a list of trip logs into a single frame. Route and stop ids are concatenated as codes, and come
+    out encoded using this process's code tables whatever code tables the trip logs were encoded with; actions come
+    out as plain objects. This is much faster than `pd.concat`, which reconciles any differing categories pairwise.
+    """
+    columns = dict()
+    for column in trip_logs[0].columns:
+        table = _TRIP_LOG_CODE_TABLES.get(column)
+        if table is None:
+            columns[column] = np.concatenate([trip_log[column].to_numpy() for trip_log in trip_logs])
+        else:
+            codes = np.concatenate([table.encode(trip_log[column].values) for trip_log in trip_logs])
+            columns[column] = pd.Categorical.from_codes(codes, dtype=table.dtype)
+    return pd.DataFrame(columns)
+
+
+def _share_trip_log_dtypes(frames):
+    """
+    Re-encodes the route and stop ids of the given trip log frames, in place, so that every frame's ids are
+    categoricals of the same dtype.
+    """
+    for column, table in _TRIP_LOG_CODE_TABLES.items():
+        codes = [table.encode(frame[column].values) for frame in frames]
+        for frame, frame_codes in zip(frames, codes):
+            frame[column] = pd.Categorical.from_codes(frame_codes, dtype=table.dtype)
+
+
+def _join_trip_logs_bulk(lefts, rights):
+    """
+    Bulk counterpart to `_join_trip_logs`. Takes two equal-length lists of trip logs, the i-th entries of which are
+    two trip logs for the same trip, and returns a list of their joins.
+
+    Rather than doing a round of pandas operations for every pair of trip logs, the trip logs on each side are
+    concatenated into one long frame keyed by their position in the list, and the reordering, the EN_ROUTE_TO to
+    STOPPED_OR_SKIPPED rewrite, and the minimum and maximum time repairs are all performed on those frames at once.
+    Only the synthetic route construction, which works on short lists of stations, is done trip by trip.
+    """
+    if len(lefts) == 0:
+        return []
+
+    left_lengths = np.array([len(trip_log) for trip_log in lefts])
+    right_lengths = np.array([len(trip_log) for trip_log in rights])
+    join, join_lengths = _join_trip_log_frames(_concat_trip_logs(lefts), left_lengths, _concat_trip_logs(rights),
+                                               right_lengths)
+    join_starts = np.concatenate([[0], np.cumsum(join_lengths)[:-1]])
+    return [join.iloc[start:start + length].reset_index(drop=True) for start, length in zip(join_starts,
+                                                                                             join_lengths)]
+
+
+@_instrumented('join', lambda result, left_all, left_lengths, *args: {
+    'rows': len(result[0]), 'trips_joined': len(left_lengths)
+})
+def _join_trip_log_frames(left_all, left_lengths, right_all, right_lengths):
+    """
+    Long-format core of `_join_trip_logs_bulk`. Takes two frames of trip logs laid back to back, and the lengths of
+    the trip logs in each (the i-th trip logs of either side being for the same trip), and returns a frame of their
+    joins, laid back to back in the same order, along with the lengths of the joins.
+    """
+    n = len(left_lengths)
+    columns = list(left_all.columns)
+
+    # Both sides need their ids encoded with the same categorical dtypes, so that they may be concatenated.
+    _share_trip_log_dtypes([left_all, right_all])
+    left_codes = np.repeat(np.arange(n), left_lengths)
+    right_codes = np.repeat(np.arange(n), right_lengths)
+
+    # Order each pair of frames so that the earlier one is on the left.
+    left_starts = left_all.groupby(left_codes)['latest_information_time'].min().values
+    right_starts = right_all.groupby(right_codes)['latest_information_time'].min().values
+    swap = right_starts < left_starts
+
+    earlier = pd.concat([left_all[~swap[left_codes]], right_all[swap[right_codes]]], ignore_index=True)
+    earlier_codes = np.concatenate([left_codes[~swap[left_codes]], right_codes[swap[right_codes]]])
+    order = np.argsort(earlier_codes, kind='stable')
+    earlier, earlier_codes = earlier.iloc[order].reset_index(drop=True), earlier_codes[order]
+
+    later = pd.concat([right_all[~swap[right_codes]], left_all[swap[left_codes]]], ignore_index=True)
+    later_codes = np.concatenate([right_codes[~swap[right_codes]], left_codes[swap[left_codes]]])
+    order = np.argsort(later_codes, kind='stable')
+    later, later_codes = later.iloc[order].reset_index(drop=True), later_codes[order]
+
+    earlier_lengths = np.where(swap, right_lengths, left_lengths)
+    later_lengths = np.where(swap, left_lengths, right_lengths)
+    earlier_starts = np.concatenate([[0], np.cumsum(earlier_lengths)[:-1]])
+    later_starts = np.concatenate([[0], np.cumsum(later_lengths)[:-1]])
+
+    # Get the combined synthetic station lists. For each trip we need to know how many of the earlier trip log's
+    # entries to keep (those for stations the later trip log does not cover), and where the later trip log starts.
+    earlier_stops = np.split(earlier['stop_id'].cat.codes.values, earlier_starts[1:])
+    later_stops = np.split(later['stop_id'].cat.codes.values, later_starts[1:])
+    n_kept = np.empty(n, dtype=np.int64)
+    swap_indices = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        later_station_list = later_stops[i].tolist()
+        stations = _extract_synthetic_route_from_station_lists([earlier_stops[i].tolist(), later_station_list])
+        later_stations = set(later_station_list)
+        n_kept[i] = sum(1 for station in stations if station not in later_stations)
+        swap_indices[i] = stations.index(later_station_list[0])
+
+    # Combine records, keeping each trip's rows contiguous and the earlier trip log's rows first.
+    earlier_positions = np.arange(len(earlier)) - earlier_starts[earlier_codes]
+    kept = earlier_positions < n_kept[earlier_codes]
+    join = pd.concat([earlier[kept], later], ignore_index=True)
+    codes = np.concatenate([earlier_codes[kept], later_codes])
+    order = np.argsort(codes, kind='stable')
+    join, codes = join.iloc[order].reset_index(drop=True), codes[order]
+
+    join_lengths = n_kept + later_lengths
+    join_starts = np.concatenate([[0], np.cumsum(join_lengths)[:-1]])
+    positions = np.arange(len(join)) - join_starts[codes]
+
+    action = join['action'].values.copy()
+    minimum_time = join['minimum_time'].values.copy()
+    maximum_time = join['maximum_time'].values.copy()
+
+    # Update records for stations before the first station in the later trip log that the train is EN_ROUTE_TO or
+    # STOPPED_OR_SKIPPED.
+    where_update = (positions < swap_indices[codes]) & (action == 'EN_ROUTE_TO')
+    action[where_update] = 'STOPPED_OR_SKIPPED'
+    maximum_time[where_update] = later['latest_information_time'].values[later_starts][codes[where_update]]
+
+    where_swap = positions == swap_indices[codes]
+    minimum_time[where_swap] = earlier['minimum_time'].values[earlier_starts][codes[where_swap]]
+
+    join['action'] = action
+    join['minimum_time'] = minimum_time
+    join['maximum_time'] = maximum_time
+
+    # Repair the minimum times; see `_join_trip_logs` for the inconsistencies this addresses.
+    minimum_time = join['minimum_time'].groupby(codes).ffill().values
+    accumulated = pd.Series(np.where(positions == 0, -np.inf, minimum_time)).groupby(codes).cummax().values
+    nan_seen = pd.Series((positions > 0) & np.isnan(minimum_time)).groupby(codes).cumsum().values > 0
+    minimum_time = np.where(positions == 0, minimum_time, np.where(nan_seen, np.nan, accumulated))
+
+    boundaries = earlier_lengths - 1
+    repairable = (boundaries >= 1) & (boundaries < join_lengths)
+    at = join_starts[repairable] + boundaries[repairable]
+    minimum_time[at] = np.maximum(np.nan_to_num(join['maximum_time'].values[at - 1]), minimum_time[at])
+    join['minimum_time'] = minimum_time
+
+    # Repair the maximum times at the location of the join.
+    join['maximum_time'] = join['maximum_time'].groupby(codes).bfill(limit=1)
+
+    join['action'] = join['action'].astype(_TRIP_LOG_ACTION_DTYPE)
+
+    return join[columns], join_lengths
+
+
+def _gather_rows(starts, lengths):
+    """
+    Returns the indices of the rows in the runs of rows with the given starts and lengths, run after run.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    run_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    return np.repeat(np.asarray(starts, dtype=np.int64) - run_starts, lengths) + np.arange(lengths.sum())
+
+
+class TripLogbook(collections.abc.Mapping):
+    def __init__(self, frame, trip_ids, offsets):
+        """
+        A trip logbook held in long format: every trip log back to back in a single frame, in trip id order, with an
+        offsets index marking where each trip's rows begin.
+
+        A dict of thousands of small DataFrames spends much of its memory, and much of the time taken to work with it,
+        on per-object overhead. A TripLogbook is a read-only mapping with the same `logbook[trip_id]` interface
+        (trip logs are sliced out of the frame on access), but its merging, finishing, and filtering are done on the
+        whole frame at once.
+
+        Parameters
+        ----------
+        frame, pd.DataFrame
+            The trip logs, back to back in trip id order, with a RangeIndex.
+        trip_ids, np.ndarray of object
+            The trip ids, sorted.
+        offsets, np.ndarray of int64
+            The row at which each trip's trip log begins in `frame`, followed by the length of `frame`.
+        """
+        self.frame = frame
+        self.trip_ids = trip_ids
+        self.offsets = offsets
+
+    @classmethod
+    def from_dict(cls, logbook):
+        """
+        Builds a TripLogbook out of a trip logbook dict (or any other mapping of trip ids to trip logs). TripLogbooks
+        are returned as-is.
+        """
+        if isinstance(logbook, TripLogbook):
+            return logbook
+
+        trip_ids = sorted(logbook)
+        if len(trip_ids) == 0:
+            frame = _set_trip_log_dtypes(pd.DataFrame({column: [] for column in _TRIP_LOG_COLUMNS}))
+            return cls(frame, np.array([], dtype=object), np.zeros(1, dtype=np.int64))
+
+        trip_logs = [logbook[trip_id] for trip_id in trip_ids]
+        frame = _concat_trip_logs(trip_logs)
+        frame['action'] = frame['action'].astype(_TRIP_LOG_ACTION_DTYPE)
+        offsets = np.concatenate([[0], np.cumsum([len(trip_log) for trip_log in trip_logs])]).astype(np.int64)
+        return cls(frame, np.array(trip_ids, dtype=object), offsets)
+
+    def to_dict(self):
+        """
+        Returns the logbook as a trip logbook dict.
+        """
+        return {trip_id: self[trip_id] for trip_id in self}
+
+    @property
+    def lengths(self):
+        """The number of rows in each trip's trip log, in trip id order."""
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.trip_ids)
+
+    def __iter__(self):
+        return iter(self.trip_ids.tolist())
+
+    def __contains__(self, trip_id):
+        return self._position(trip_id) is not None
+
+    def __getitem__(self, trip_id):
+        i = self._position(trip_id)
+        if i is None:
+            raise KeyError(trip_id)
+        return self.frame.iloc[self.offsets[i]:self.offsets[i + 1]].reset_index(drop=True)
+
+    def _position(self, trip_id):
+        """
+        Returns the position of a trip in the logbook, or None if it is not in it.
+        """
+        try:
+            i = int(np.searchsorted(self.trip_ids, trip_id))
+        except TypeError:
+            return None
+        return i if i < len(self.trip_ids) and self.trip_ids[i] == trip_id else None
+
+    def _positions(self, trip_ids):
+        """
+        Returns the positions of a list of trips, all of which are in the logbook.
+        """
+        return np.searchsorted(self.trip_ids, np.asarray(trip_ids, dtype=object)).astype(np.int64)
+
+    def _take(self, positions):
+        """
+        Returns a new TripLogbook containing only the trips at the given (sorted) positions.
+        """
+        lengths = self.lengths[positions]
+        frame = self.frame.take(_gather_rows(self.offsets[:-1][positions], lengths)).reset_index(drop=True)
+        return TripLogbook(frame, self.trip_ids[positions],
+                           np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+
+    def filter(self, trip_ids=None, route_ids=None):
+        """
+        Returns a new TripLogbook containing only the given trips, or only the trips on the given routes, or (if both
+        are set) only the trips satisfying both.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if trip_ids is not None:
+            keep &= pd.Index(self.trip_ids).isin(list(trip_ids))
+        if route_ids is not None:
+            first_rows = np.minimum(self.offsets[:-1], max(len(self.frame) - 1, 0))
+            routes = pd.Series(self.frame['route_id'].values).take(first_rows) if len(self.frame) else pd.Series([])
+            keep &= (self.lengths > 0) & routes.isin(list(route_ids)).values
+        return self._take(np.flatnonzero(keep))
+
+    @_instrumented('finish', lambda logbook, self, termination_times: {
+        'trips_finished': sum(trip_id in self for trip_id in termination_times)
+    })
+    def finish(self, termination_times):
+        """
+        Returns a new TripLogbook in which the given trips are finished off, as `_finish_trip` would finish each of
+        them off.
+
+        Parameters
+        ----------
+        termination_times, dict
+            The information time at which each of the trips being finished off terminated, by trip id. Trips not in
+            the logbook are ignored.
+        """
+        trip_ids = [trip_id for trip_id in termination_times if trip_id in self]
+        finishing = np.zeros(len(self), dtype=bool)
+        times = np.full(len(self), np.nan)
+        positions = self._positions(trip_ids)
+        finishing[positions] = True
+        times[positions] = [termination_times[trip_id] for trip_id in trip_ids]
+
+        lengths = self.lengths
+        row_finishing, row_times = np.repeat(finishing, lengths), np.repeat(times, lengths)
+        action = self.frame['action']
+        unfinished = row_finishing & action.isin(['EN_ROUTE_TO', 'EXPECTED_TO_SKIP']).values
+        maximum_time = self.frame['maximum_time'].values
+        frame = self.frame.assign(
+            action=action.where(~unfinished, 'STOPPED_OR_SKIPPED'),
+            maximum_time=np.where(row_finishing & np.isnan(maximum_time), row_times, maximum_time)
+        )
+        return TripLogbook(frame, self.trip_ids, self.offsets)
+
+    def merge(self, other):
+        """
+        Returns the merger of this logbook with another one (a TripLogbook, or any trip logbook mapping), as
+        `merge_trip_logbooks` would merge them: trips in only one of the two are carried over as-is, and trips in both
+        are joined.
+        """
+        other = TripLogbook.from_dict(other)
+        mutual = np.intersect1d(self.trip_ids, other.trip_ids) if len(self) and len(other) else []
+        left_mutual, right_mutual = self._positions(mutual), other._positions(mutual)
+        left_only = np.setdiff1d(np.arange(len(self)), left_mutual)
+        right_only = np.setdiff1d(np.arange(len(other)), right_mutual)
+
+        pieces, trip_ids, lengths = [], [], []
+        for logbook, positions in [(self, left_only), (other, right_only)]:
+            if len(positions):
+                part = logbook._take(positions)
+                pieces.append(part.frame)
+                trip_ids.append(part.trip_ids)
+                lengths.append(part.lengths)
+        if len(mutual):
+            left, right = self._take(left_mutual), other._take(right_mutual)
+            join, join_lengths = _join_trip_log_frames(left.frame.copy(), left.lengths, right.frame.copy(),
+                                                       right.lengths)
+            join['action'] = join['action'].astype(_TRIP_LOG_ACTION_DTYPE)
+            pieces.append(join)
+            trip_ids.append(left.trip_ids)
+            lengths.append(join_lengths)
+        if len(pieces) == 0:
+            return TripLogbook.from_dict(dict())
+
+        # Lay the pieces out back to back, then put the trips back into trip id order.
+        _share_trip_log_dtypes(pieces)
+        frame = pd.concat(pieces, ignore_index=True)
+        trip_ids, lengths = np.concatenate(trip_ids), np.concatenate(lengths).astype(np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        order = np.argsort(trip_ids, kind='stable')
+        frame = frame.take(_gather_rows(starts[order], lengths[order])).reset_index(drop=True)
+        return TripLogbook(frame, trip_ids[order], np.concatenate([[0], np.cumsum(lengths[order])]).astype(np.int64))
+
+
+# Logbooks are persisted as Arrow IPC files: every trip log back to back in one table, in trip_id order, split into
+# record batches which never break up a trip. The schema metadata carries an index of the batch, offset, and length
+# of each trip log, so that particular trips can be read without decoding the rest of the file. Route and stop ids are
+# dictionary-encoded, using their codes in the code tables of the process which wrote the file.
+_TRIP_LOGBOOK_INDEX_KEY = b'trip_logbook_index'
+_TRIP_LOGBOOK_DICTIONARY_COLUMNS = ['route_id', 'stop_id']
+
+
+def _trip_logbook_schema(index):
+    """
+    Returns the Arrow schema of a trip logbook file, carrying the given trip index as metadata.
+    """
+    import json
+    import pyarrow as pa
+
+    fields = []
+    for column in _TRIP_LOG_COLUMNS:
+        if column in _TRIP_LOG_TIME_COLUMNS:
+            fields.append((column, pa.float64()))
+        elif column in _TRIP_LOGBOOK_DICTIONARY_COLUMNS:
+            fields.append((column, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append((column, pa.string()))
+    return pa.schema(fields, metadata={_TRIP_LOGBOOK_INDEX_KEY: json.dumps(index).encode('utf-8')})
+
+
+def save_trip_logbook(logbook, path, batch_size=65536, compression='lz4'):
+    """
+    Writes a trip logbook to a single columnar (Arrow IPC) file, which is much smaller, and much faster to write and
+    read back, than a pickle of the logbook. Requires `pyarrow`.
+
+    Times are stored as floats, route and stop ids as their codes (see `code_tables`) alongside a dictionary of the
+    ids those codes stand for, and everything else as strings. Reading the file back in another process translates
+    these codes into that process's own.
+
+    Parameters
+    ----------
+    logbook, dict
+        The trip logbook, as returned by `parse_feeds_into_trip_logbook` or `merge_trip_logbooks`.
+    path, str
+        The file to write to.
+    batch_size, int
+        The number of rows after which a new record batch is started. Reading a trip decodes the whole batch it is in,
+        so smaller batches make reading a few trips at a time cheaper, at the cost of a larger file.
+    compression: {'lz4', 'zstd', None}
+        The compression applied to each batch.
+    """
+    import pyarrow as pa
+
+    trip_ids = sorted(logbook)
+
+    # Lay out the batches ahead of time, as the index has to go into the schema, which is written first.
+    index = {'trip_ids': trip_ids, 'route_ids': [], 'batches': [], 'offsets': [], 'lengths': []}
+    batches, batch, rows = [], [], 0
+    for trip_id in trip_ids:
+        trip_log = logbook[trip_id]
+        if rows >= batch_size:
+            batches.append(batch)
+            batch, rows = [], 0
+        index['route_ids'].append(str(trip_log['route_id'].iloc[0]) if len(trip_log) > 0 else None)
+        index['batches'].append(len(batches))
+        index['offsets'].append(rows)
+        index['lengths'].append(len(trip_log))
+        batch.append(trip_log)
+        rows += len(trip_log)
+    if batch:
+        batches.append(batch)
+
+    # An IPC file has a single dictionary per column, so every id in the logbook is encoded before any is written out.
+    dictionaries = dict()
+    for column in _TRIP_LOGBOOK_DICTIONARY_COLUMNS:
+        table = _TRIP_LOG_CODE_TABLES[column]
+        for trip_log in logbook.values():
+            table.encode(trip_log[column].values)
+        dictionaries[column] = pa.array([str(value) for value in table.decode(np.arange(len(table)))], type=pa.string())
+
+    schema = _trip_logbook_schema(index)
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+        for batch in batches:
+            frame = _concat_trip_logs(batch)
+            arrays = []
+            for field in schema:
+                if field.name in _TRIP_LOG_TIME_COLUMNS:
+                    values = pd.to_numeric(frame[field.name], errors='coerce').astype(float).values
+                    arrays.append(pa.array(values, type=pa.float64()))
+                elif field.name in _TRIP_LOGBOOK_DICTIONARY_COLUMNS:
+                    codes = frame[field.name].cat.codes.values.astype(np.int32)
+                    indices = pa.array(codes, type=pa.int32(), mask=codes < 0)
+                    arrays.append(pa.DictionaryArray.from_arrays(indices, dictionaries[field.name]))
+                else:
+                    values = np.asarray(frame[field.name], dtype=object)
+                    arrays.append(pa.array(values, type=pa.string(), from_pandas=True))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+
+def load_trip_logbook(path, trip_ids=None, route_ids=None):
+    """
+    Reads a trip logbook written by `save_trip_logbook`. Requires `pyarrow`.
+
+    The file is memory-mapped, and only the record batches holding the trips asked for are decoded, so reading a
+    handful of trips (or all of the trips on one route) out of a day's logbook is cheap.
+
+    Parameters
+    ----------
+    path, str
+        The file to read from.
+    trip_ids, iterable of str or None
+        If set, only these trips are read. Trips not in the logbook are ignored.
+    route_ids, iterable of str or None
+        If set, only trips on these routes are read. May be combined with `trip_ids`, in which case only the trips
+        satisfying both are read.
+    """
+    import json
+    import pyarrow as pa
+
+    logbook = dict()
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        metadata = reader.schema.metadata or {}
+        if _TRIP_LOGBOOK_INDEX_KEY not in metadata:
+            raise ValueError("This is not a trip logbook file.")
+        index = json.loads(metadata[_TRIP_LOGBOOK_INDEX_KEY].decode('utf-8'))
+
+        selected = range(len(index['trip_ids']))
+        if trip_ids is not None:
+            trip_ids = set(trip_ids)
+            selected = [i for i in selected if index['trip_ids'][i] in trip_ids]
+        if route_ids is not None:
+            route_ids = set(route_ids)
+            selected = [i for i in selected if index['route_ids'][i] in route_ids]
+
+        # Trips are stored in batch order, so each batch needed is only decoded once.
+        for batch_number, positions in itertools.groupby(selected, key=lambda i: index['batches'][i]):
+            frame = _set_trip_log_dtypes(reader.get_batch(batch_number).to_pandas())
+            for i in positions:
+                offset, length = index['offsets'][i], index['lengths'][i]
+                logbook[index['trip_ids'][i]] = frame.iloc[offset:offset + length].reset_index(drop=True)
+
+    return logbook
+
+
+def _save_action_log_columns(action_log_columns, path, batch_size=65536):
+    """
+    Writes the ActionLogColumns of a number of trips, given as a dict by trip id, to an Arrow IPC file, which
+    `_load_action_log_columns` can read a trip's back out of. Stops are stored by id, rather than by code, times as
+    floats, and a new record batch is started after every `batch_size` rows. Requires `pyarrow`.
+    """
+    import pyarrow as pa
+
+    schema = pa.schema([('trip_id', pa.string()), ('route_id', pa.string()), ('stop_id', pa.string()),
+                        ('stopped', pa.bool_()), ('information_time', pa.float64()), ('log_number', pa.int32())])
+
+    def to_batch(trips):
+        lengths = [len(columns.stop_codes) for columns in trips]
+        return pa.RecordBatch.from_arrays([
+            pa.array(np.repeat([str(columns.trip_id) for columns in trips], lengths), type=pa.string()),
+            pa.array(np.repeat([str(columns.route_id) for columns in trips], lengths), type=pa.string()),
+            pa.array(_code_tables.stop_ids.decode(np.concatenate([columns.stop_codes for columns in trips])),
+                     type=pa.string()),
+            pa.array(np.concatenate([columns.stopped for columns in trips])),
+            pa.array(np.concatenate([columns.information_times for columns in trips]).astype(float)),
+            pa.array(np.concatenate([np.repeat(np.arange(len(columns.log_lengths), dtype=np.int32),
+                                               columns.log_lengths) for columns in trips]))
+        ], schema=schema)
+
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        trips, rows = [], 0
+        for columns in action_log_columns.values():
+            trips.append(columns)
+            rows += len(columns.stop_codes)
+            if rows >= batch_size:
+                writer.write_batch(to_batch(trips))
+                trips, rows = [], 0
+        if trips:
+            writer.write_batch(to_batch(trips))
+
+
+def _load_action_log_columns(path, trip_id):
+    """
+    Reads the ActionLogColumns of a trip back out of a file written by `_save_action_log_columns`.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+        rows = table.filter(pc.equal(table['trip_id'], trip_id))
+
+    return ActionLogColumns(
+        trip_id=trip_id,
+        route_id=rows['route_id'][0].as_py(),
+        stop_codes=_code_tables.stop_ids.encode(rows['stop_id'].to_numpy(zero_copy_only=False)),
+        stopped=rows['stopped'].to_numpy(zero_copy_only=False).astype(bool),
+        information_times=rows['information_time'].to_numpy(),
+        log_lengths=np.bincount(rows['log_number'].to_numpy()).astype(np.int64)
+    )
+
+
+class TripLogbookStore:
+    manifest_filename = "manifest.json"
+
+    def __init__(self, path):
+        """
+        An on-disk trip logbook, kept as a directory of trip logbook files (see `save_trip_logbook`), each holding the
+        trips spilled to disk at some point in the course of `parse_feeds_into_trip_logbook_store`, along with a JSON
+        manifest of the trips in each file and the times at which they terminated. Requires `pyarrow`.
+
+        Trips are stored as they were when spilled, and are only finished off (see `_finish_trip`) as they are read
+        back, as the time at which a trip is deemed to have terminated depends on feeds which come after it is
+        spilled. A part may also hold the action logs its trips were built out of (or rather, their ActionLogColumns),
+        so that a trip which turns out not to be over can be reopened (see `reopen`).
+
+        Parameters
+        ----------
+        path, str
+            The directory the store is kept in. It is created if it does not exist; if it holds a store already, that
+            store is opened.
+        """
+        import json
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        manifest_path = os.path.join(path, self.manifest_filename)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        else:
+            manifest = {'parts': [], 'termination_times': {}}
+        self.parts = manifest['parts']
+        self.termination_times = manifest['termination_times']
+
+    def __len__(self):
+        return len(self.trip_ids)
+
+    @property
+    def trip_ids(self):
+        """The ids of every trip in the store."""
+        return set(itertools.chain(*[part['trip_ids'] for part in self.parts]))
+
+    def append(self, logbook, action_log_columns=None):
+        """
+        Writes a trip logbook out to a new file in the store, along with the ActionLogColumns of those of its trips
+        which may yet be reopened, given as a dict by trip id, if any.
+        """
+        filename = "part-{0:06d}.arrow".format(len(self.parts))
+        save_trip_logbook(logbook, os.path.join(self.path, filename))
+        part = {'filename': filename, 'trip_ids': sorted(logbook)}
+        if action_log_columns:
+            part['action_logs'] = "part-{0:06d}.actions.arrow".format(len(self.parts))
+            part['reopenable_trip_ids'] = sorted(action_log_columns)
+            _save_action_log_columns(action_log_columns, os.path.join(self.path, part['action_logs']))
+        self.parts.append(part)
+        self.flush()
+
+    def reopen(self, trip_id):
+        """
+        Takes a trip back out of the store, returning the ActionLogColumns of the action logs it was built out of, so
+        that it may be rebuilt with more of them. The trip must have been appended along with these.
+        """
+        for part in reversed(self.parts):
+            if trip_id in part.get('reopenable_trip_ids', []):
+                part['trip_ids'].remove(trip_id)
+                part['reopenable_trip_ids'].remove(trip_id)
+                self.flush()
+                return _load_action_log_columns(os.path.join(self.path, part['action_logs']), trip_id)
+        raise KeyError("The {0} trip cannot be reopened.".format(trip_id))
+
+    def flush(self, termination_times=None):
+        """
+        Writes out the manifest, updating the termination times of the trips in the store if any are given.
+        """
+        import json
+
+        if termination_times is not None:
+            self.termination_times = {trip_id: float(termination_time) for trip_id, termination_time
+                                      in termination_times.items()}
+
+        # The manifest is replaced atomically, so that a reader never sees it half-written.
+        manifest_path = os.path.join(self.path, self.manifest_filename)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump({'parts': self.parts, 'termination_times': self.termination_times}, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def load(self, trip_ids=None, route_ids=None):
+        """
+        Reads the store back in as a single trip logbook, with every terminated trip finished off.
+
+        Parameters
+        ----------
+        trip_ids, iterable of str or None
+            If set, only these trips are read.
+        route_ids, iterable of str or None
+            If set, only trips on these routes are read.
+        """
+        trip_ids = set(trip_ids) if trip_ids is not None else None
+
+        # A part's file may still hold trips which have since been reopened, and are in a later part now.
+        logbook = dict()
+        for part in self.parts:
+            part_trip_ids = set(part['trip_ids']) if trip_ids is None else trip_ids.intersection(part['trip_ids'])
+            if part_trip_ids:
+                logbook.update(load_trip_logbook(os.path.join(self.path, part['filename']), trip_ids=part_trip_ids,
+                                                 route_ids=route_ids))
+
+        for trip_id, termination_time in self.termination_times.items():
+            if trip_id in logbook:
+                logbook[trip_id] = _finish_trip(logbook[trip_id], termination_time)
+        return logbook
+
+
+# The memory taken up by an ActionLogColumns over and above that of its rows: the tuple, and its four array objects.
+_ACTION_LOG_COLUMNS_OVERHEAD_BYTES = 512
+
+
+def _estimate_action_log_columns_bytes(columns):
+    """
+    Estimates the memory used by an ActionLogColumns, from the sizes of its arrays.
+    """
+    return _ACTION_LOG_COLUMNS_OVERHEAD_BYTES + sum(array.nbytes for array in columns[2:])
+
+
+# The memory taken up in spilling a trip to disk, over and above a few copies of its action logs: building its trip log
+# (a DataFrame) and converting it and its action logs to Arrow take a couple of dozen kilobytes a trip.
+_SPILL_OVERHEAD_BYTES = 20 * 1024
+
+
+@_instrumented('parse_feeds', lambda store, *args, **kwargs: {'trips': len(store)})
+def parse_feeds_into_trip_logbook_store(feeds, path, memory_budget=2 ** 30, horizon=300, workers=None,
+                                        max_window=240, decoder='protobuf'):
+    """
+    Parses a stream of feeds into a trip logbook kept on disk, keeping the memory used by the process within a budget.
+    The on-disk logbook, read back with `TripLogbookStore.load`, is the same as the one `parse_feeds_into_trip_logbook`
+    would build out of the same feeds in memory.
+
+    A day's worth of feeds is far too much to parse into a trip logbook all at once (see `_join_trip_logs`). Here feeds
+    are instead parsed a window at a time, with windows sized to fit in whatever part of the budget is not taken up by
+    the action logs of the trips still running. Trips which can no longer change (having been absent from the feeds
+    for longer than `horizon`) are built into trip logs and spilled to disk, along with what of the action logs they
+    were built out of is needed to build them (see `ActionLogColumns`). A trip which comes back after being spilled is
+    reopened: it is taken back out of the store, and rebuilt out of all of its action logs once it is spilled again.
+
+    The budget is a cap on the peak resident set size of the process. Whatever the process holds when this is called
+    (the interpreter, its libraries, pyarrow included, and the caller's own data) comes out of it first, and the rest
+    is left for parsing. Windows are sized against what is left, going by the resident set size measured after each
+    window. Where that cannot be measured (see `_current_rss`), the budget covers only the memory taken up by the
+    action logs and trip logs held, as estimated from their sizes. Either way, the action logs of the trips running
+    at any one time are held however small the budget is, so it cannot be smaller than that, and the processes of a
+    pool are not counted against it.
+
+    Parameters
+    ----------
+    feeds, iterable of (int, gtfs_realtime_pb2.FeedMessage or bytes) tuples
+        The information time and content of each feed, in information time order, e.g. as yielded by
+        `synthetic_feeds.generate_feeds`. Feeds are read from this lazily, a window at a time.
+    path, str
+        The directory the store is kept in; see `TripLogbookStore`.
+    memory_budget, int
+        The budget, in bytes.
+    horizon, int
+        How long a trip must be absent from the feeds, in seconds, before it is taken to be over and spilled to disk.
+        A trip which comes back after being spilled is still handled correctly, but reopening it is costly.
+    workers, int or None
+        If set to more than one, the feeds in each window are parsed by a pool of this many processes.
+    max_window, int
+        The largest number of feeds to parse at once.
+    decoder, {'protobuf', 'wire'}
+        How raw feeds are decoded, as in `parse_feeds_into_trip_logbook`.
+    """
+    # pyarrow is imported up front, so that its libraries are part of the baseline rather than of the budget.
+    import pyarrow  # noqa: F401
+
+    _check_decoder(decoder)
+    store = TripLogbookStore(path)
+    feeds = iter(feeds)
+
+    open_trips = dict()  # trip id -> list of ActionLogColumns of successive runs of the trip's action logs
+    open_bytes = dict()  # trip id -> estimated bytes of its action logs
+    last_seen = dict()  # trip id -> information time of the last feed the trip was in
+    last_absent = dict()  # trip id -> information time of the last feed the trip was missing from, after it began
+    spilled = set()
+    pending, pending_bytes = dict(), 0  # trip id -> ActionLogColumns of a trip set aside to be spilled
+
+    feed_bytes = None
+    latest_information_time = previous_information_time = None
+    previous_trip_ids = set()
+    window = 1
+
+    def spill(reopenable=True):
+        # Trip logs are only built as they are written out, as they take up more memory than the action logs they are
+        # built out of.
+        nonlocal pending, pending_bytes
+        if pending:
+            logbook = {trip_id: _build_trip_log_from_action_log_columns(columns)
+                       for trip_id, columns in pending.items()}
+            with _stage('spill') as stage:
+                store.append(logbook, pending if reopenable else None)
+                stage.count(trips_spilled=len(pending), bytes=pending_bytes)
+            pending, pending_bytes = dict(), 0
+
+    def resident():
+        rss = _current_rss()
+        return baseline + sum(open_bytes.values()) + pending_bytes if rss is None else rss
+
+    def spill_due():
+        # Trips set aside are written out before the memory it takes to write them out can take up more than a
+        # quarter of what is left of the budget.
+        return 3 * pending_bytes + len(pending) * _SPILL_OVERHEAD_BYTES > (memory_budget - resident()) / 4
+
+    with _process_pool(workers) as executor:
+        baseline = _current_rss() or 0
+        available = memory_budget - baseline
+
+        while True:
+            before = resident()
+            batch = list(itertools.islice(feeds, window))
+            if not batch:
+                break
+
+            information_times = [information_time for information_time, _ in batch]
+            if (latest_information_time is not None and information_times[0] < latest_information_time) or \
+                    np.any(np.diff(information_times) < 0):
+                raise ValueError("Feeds must be provided in information time order.")
+            latest_information_time = information_times[-1]
+
+            action_columns = _parse_feeds_into_action_columns([feed for _, feed in batch], information_times,
+                                                              executor=executor, workers=workers, decoder=decoder)
+            del batch
+            grown, window_bytes = resident() - before, 0
+
+            for i, information_time in enumerate(information_times):
+                # The window's action logs are let go of as they are handed over, so that those of trips which are
+                # built and set aside are not held onto until the end of the window.
+                table, action_columns[i] = _split_action_columns_by_trip(action_columns[i], information_time), None
+
+                for trip_id, columns in table.items():
+                    if trip_id in spilled:
+                        # The trip has come back after being spilled, so it is reopened, and picked up where it left
+                        # off.
+                        last_absent[trip_id] = previous_information_time
+                        spilled.remove(trip_id)
+                        if trip_id in pending:
+                            open_trips[trip_id] = [pending.pop(trip_id)]
+                            pending_bytes -= _estimate_action_log_columns_bytes(open_trips[trip_id][0])
+                        else:
+                            with _stage('reopen'):
+                                open_trips[trip_id] = [store.reopen(trip_id)]
+                        open_bytes[trip_id] = _estimate_action_log_columns_bytes(open_trips[trip_id][0])
+                    size = _estimate_action_log_columns_bytes(columns)
+                    open_trips.setdefault(trip_id, []).append(columns)
+                    open_bytes[trip_id] = open_bytes.get(trip_id, 0) + size
+                    last_seen[trip_id] = information_time
+                    window_bytes += size
+
+                # Trips which have been gone for longer than the horizon are set aside to be spilled.
+                for trip_id in [trip_id for trip_id in open_trips if trip_id not in table]:
+                    last_absent[trip_id] = information_time
+                    if information_time - last_seen[trip_id] > horizon:
+                        pending[trip_id] = _concatenate_action_log_columns(open_trips.pop(trip_id))
+                        pending_bytes += _estimate_action_log_columns_bytes(pending[trip_id])
+                        del open_bytes[trip_id]
+                        spilled.add(trip_id)
+
+                previous_trip_ids = table.keys()
+                previous_information_time = information_time
+
+                if spill_due():
+                    spill()
+
+            # The action logs of each trip still running are gathered up into a single set of arrays, as otherwise
+            # they would hold onto the whole of each feed's arrays, of which they are slices, and take up an object
+            # apiece besides.
+            for trip_id, pieces in open_trips.items():
+                if len(pieces) > 1 or pieces[0].stop_codes.base is not None:
+                    open_trips[trip_id] = [_concatenate_action_log_columns(pieces)]
+                    open_bytes[trip_id] = _estimate_action_log_columns_bytes(open_trips[trip_id][0])
+
+            if sum(open_bytes.values()) + pending_bytes > available / 2:
+                spill()
+
+            # The next window is sized to fit in half of whatever is left of the budget, going by what the process
+            # holds now rather than by what it is thought to hold, as memory which has been let go of is not always
+            # given back. A feed costs whatever the process grew by per feed parsed, or the size of its action logs,
+            # if more.
+            window_bytes = max(grown, window_bytes)
+            feed_bytes = window_bytes / len(information_times) if feed_bytes is None else \
+                0.5 * feed_bytes + 0.5 * window_bytes / len(information_times)
+            window = int(np.clip((memory_budget - resident()) / 2 / max(feed_bytes, 1), 1, max_window))
+
+        # Nothing spilled from here on can come back, so there is no need to keep the action logs of any of it.
+        for trip_id in list(open_trips):
+            pending[trip_id] = _concatenate_action_log_columns(open_trips.pop(trip_id))
+            pending_bytes += _estimate_action_log_columns_bytes(pending[trip_id])
+            if spill_due():
+                spill(reopenable=False)
+        spill(reopenable=False)
+
+    # A trip is deemed to have terminated at the last feed it was missing from, as `index_trip_presence` has it: which,
+    # for a trip missing from the final feed, is the final feed.
+    termination_times = dict()
+    for trip_id in last_seen:
+        if trip_id not in previous_trip_ids:
+            termination_times[trip_id] = latest_information_time
+        elif trip_id in last_absent:
+            termination_times[trip_id] = last_absent[trip_id]
+    store.flush(termination_times)
+    return store
@@ -0,0 +1,248 @@
+"""
+Synthetic GTFS-Realtime feeds, for load testing.
+
+The captured feeds in `tests/data` are far too few to exercise the multi-hour merge and trip termination paths. The
+generator here simulates any number of lines, each running trips at a fixed headway over a fixed list of stops, and
+emits the feeds an MTA-style GTFS-Realtime endpoint would have served while they ran, following the same conventions
+that `processing._ActionLogBuilder` expects of the real thing:
+
+* A trip first appears in the feed `lead_time` seconds before it is due to leave its origin. Until it gets there it has
+  no vehicle update, and its trip update lists every stop: a departure time at the origin, an arrival time at the
+  terminus, and both everywhere in between.
+* Once the train is at its origin it is in progress, and its trip update is immediately followed by a vehicle update
+  which has it either STOPPED_AT a stop or IN_TRANSIT_TO the next one. Its trip update lists that stop and every one
+  after it. Stops which the train is going to skip have only an arrival time.
+* Trains run late by a random amount which accumulates from stop to stop, so the predicted times of stops further
+  down the line are revised from one feed to the next.
+* A trip disappears from the feed once its train has sat at the terminus for a dwell time, or, if it is cancelled,
+  somewhere in the middle of its run.
+* Alerts about delayed trips come after every trip update and vehicle update.
+
+For example, a day of feeds at thirty second resolution, as raw bytes:
+
+    for information_time, feed in generate_feeds(lines=20, duration=86400, cadence=30, raw=True):
+        ...
+"""
+
+import bisect
+import collections
+
+import numpy as np
+
+
+# Vehicle statuses, as in gtfs_realtime_pb2.VehiclePosition.VehicleStopStatus.
+_STOPPED_AT = 1
+_IN_TRANSIT_TO = 2
+
+_SyntheticTrip = collections.namedtuple('_SyntheticTrip', [
+    'trip_id', 'route_id', 'start_date', 'stop_ids', 'scheduled_arrivals', 'scheduled_departures', 'arrivals',
+    'departures', 'skipped', 'appears', 'disappears', 'alert'
+])
+
+
+def generate_feeds(lines=10, trips_per_line=100, stops_per_trip=20, cadence=30, duration=3600, start_time=1411045200,
+                   stop_interval=90, dwell=30, lead_time=600, max_delay=60, skip_probability=0.05,
+                   cancel_probability=0.01, alert_probability=0.02, raw=False, seed=0):
+    """
+    Generates a sequence of synthetic GTFS-Realtime feeds.
+
+    This is a generator, yielding (information time, feed) tuples in information time order, one every `cadence`
+    seconds. Feeds are built as they are asked for, so memory use does not grow with `duration`.
+
+    Parameters
+    ----------
+    lines, int or list of str
+        The route ids of the lines being simulated, or how many lines to simulate (with route ids "1", "2", and so on).
+    trips_per_line, int
+        The number of trips each line dispatches over the course of `duration`, at an even headway. Trips dispatched
+        before `start_time` at the same headway are already running when the first feed is generated.
+    stops_per_trip, int
+        The number of stops on each line.
+    cadence, int
+        The number of seconds between successive feeds.
+    duration, int
+        The number of seconds of feeds to generate.
+    start_time, int
+        The information time of the first feed, as a Unix timestamp.
+    stop_interval, int
+        The scheduled running time between successive stops, in seconds.
+    dwell, int
+        The scheduled time a train spends at each stop, in seconds.
+    lead_time, int
+        How long before a trip leaves its origin it first appears in the feed, in seconds.
+    max_delay, int
+        The most a train may fall behind schedule between any two successive stops, in seconds.
+    skip_probability, float
+        The probability that a trip skips any given stop between its origin and terminus.
+    cancel_probability, float
+        The probability that a trip is cancelled partway through its run, disappearing from the feed early.
+    alert_probability, float
+        The probability that a trip has an alert issued about it.
+    raw, bool
+        Whether to yield the raw bytes of each feed, instead of a gtfs_realtime_pb2.FeedMessage.
+    seed, int
+        The seed for the random number generator. The same seed and parameters always generate the same feeds.
+    """
+    from google.transit import gtfs_realtime_pb2
+
+    if cadence <= 0 or duration < 0:
+        raise ValueError("The cadence must be positive, and the duration must not be negative.")
+    if stops_per_trip < 2 or trips_per_line < 1:
+        raise ValueError("Lines must run at least one trip, of at least two stops.")
+
+    route_ids = [str(i + 1) for i in range(lines)] if isinstance(lines, int) else list(lines)
+    random = np.random.RandomState(seed)
+
+    # Trips are generated in order of first appearance, line by line in turn, lazily: there is no need to hold the
+    # whole day's worth of them in memory.
+    headway = max(duration, 1) / trips_per_line
+    run_time = stops_per_trip * (stop_interval + dwell + max_delay)
+    first_dispatch = start_time - run_time
+    end_time = start_time + duration
+    n_dispatches = int((end_time + lead_time - first_dispatch) // headway) + 1
+    dispatches = (first_dispatch + i * headway for i in range(n_dispatches))
+
+    upcoming = collections.deque()
+    running = []
+
+    for information_time in range(start_time, end_time + 1, cadence):
+        # Bring in the trips which appear by this feed.
+        while not upcoming or upcoming[-1].appears <= information_time:
+            dispatch = next(dispatches, None)
+            if dispatch is None:
+                break
+            for route_id in route_ids:
+                upcoming.append(_make_trip(route_id, int(dispatch), start_time // 86400, stops_per_trip,
+                                           stop_interval, dwell, lead_time, max_delay, skip_probability,
+                                           cancel_probability, alert_probability, random))
+        while upcoming and upcoming[0].appears <= information_time:
+            running.append(upcoming.popleft())
+        running = [trip for trip in running if trip.disappears > information_time]
+
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.header.gtfs_realtime_version = "1.0"
+        feed.header.timestamp = information_time
+        for trip in running:
+            _add_trip_entities(feed, trip, information_time)
+        for trip in running:
+            if trip.alert:
+                _add_alert_entity(feed, trip)
+
+        yield information_time, (feed.SerializeToString() if raw else feed)
+
+
+def _make_trip(route_id, dispatch, service_day, stops_per_trip, stop_interval, dwell, lead_time, max_delay,
+               skip_probability, cancel_probability, alert_probability, random):
+    """
+    Plans out a single trip, scheduled to leave its origin at `dispatch`, delays and all.
+    """
+    # The train arrives at its origin a dwell time ahead of departure. Every leg of the trip then runs late by a random
+    # amount, which accumulates from stop to stop. Skipped stops are passed through without dwelling.
+    skipped = random.random_sample(stops_per_trip) < skip_probability
+    skipped[0] = skipped[-1] = False
+    dwells = np.where(skipped, 0, dwell)
+    dwells[0], dwells[-1] = dwell, 0
+
+    scheduled_departures = dispatch + np.arange(stops_per_trip) * stop_interval + \
+        np.concatenate([[0], np.cumsum(dwells[1:])])
+    scheduled_arrivals = scheduled_departures - dwells
+
+    delays = np.concatenate([[0], np.cumsum(random.randint(0, max_delay + 1, size=stops_per_trip - 1))])
+    arrivals, departures = scheduled_arrivals + delays, scheduled_departures + delays
+
+    disappears = arrivals[-1] + dwell
+    if random.random_sample() < cancel_probability:
+        disappears = random.randint(arrivals[0], arrivals[-1])
+
+    # Trip ids follow the MTA's: the dispatch time in hundredths of a minute past midnight (of the first service day,
+    # so that trip ids are not reused on the days after it), the line, and the direction and route pattern.
+    trip_id = "{0:06d}_{1}..S{2:02d}R".format((dispatch - service_day * 86400) * 100 // 60, route_id,
+                                               stops_per_trip % 100)
+    start_date = np.datetime64(dispatch // 86400, 'D').astype(str).replace("-", "")
+
+    stop_ids = ["{0}{1:02d}S".format(route_id, k) for k in range(stops_per_trip)]
+    return _SyntheticTrip(trip_id=trip_id, route_id=route_id, start_date=start_date, stop_ids=stop_ids,
+                          scheduled_arrivals=scheduled_arrivals.tolist(),
+                          scheduled_departures=scheduled_departures.tolist(), arrivals=arrivals.tolist(),
+                          departures=departures.tolist(), skipped=skipped.tolist(), appears=dispatch - lead_time,
+                          disappears=int(disappears), alert=random.random_sample() < alert_probability)
+
+
+def _set_trip_descriptor(descriptor, trip):
+    descriptor.trip_id = trip.trip_id
+    descriptor.start_date = trip.start_date
+    descriptor.route_id = trip.route_id
+
+
+def _add_stop_time_update(trip_update, stop_id, arrival, departure):
+    update = trip_update.stop_time_update.add()
+    if arrival is not None:
+        update.arrival.time = arrival
+    if departure is not None:
+        update.departure.time = departure
+    update.stop_id = stop_id
+
+
+def _add_trip_entities(feed, trip, information_time):
+    """
+    Adds the trip update for a trip, as of some information time, and the vehicle update following it if the trip is
+    in progress, to a feed.
+    """
+    arrivals, departures, skipped = trip.arrivals, trip.departures, trip.skipped
+    scheduled_arrivals, scheduled_departures = trip.scheduled_arrivals, trip.scheduled_departures
+    last = len(trip.stop_ids) - 1
+
+    entity = feed.entity.add()
+    entity.id = "{0:06d}".format(len(feed.entity))
+    trip_update = entity.trip_update
+    _set_trip_descriptor(trip_update.trip, trip)
+
+    if information_time < arrivals[0]:
+        # The trip has yet to begin, and every stop is given as scheduled.
+        for k, stop_id in enumerate(trip.stop_ids):
+            _add_stop_time_update(trip_update, stop_id, scheduled_arrivals[k] if k != 0 else None,
+                                  scheduled_departures[k] if k != last else None)
+        return
+
+    # Find the stop the train is at, or the next one it will stop at. The train is STOPPED_AT a stop from its arrival
+    # until its departure, and at the terminus until it disappears from the feed.
+    current = min(bisect.bisect_right(arrivals, information_time) - 1, last)
+    if information_time < departures[current] or current == last:
+        status = _STOPPED_AT
+        lateness = arrivals[current] - scheduled_arrivals[current]
+    else:
+        status = _IN_TRANSIT_TO
+        lateness = departures[current] - scheduled_departures[current]
+        current += 1
+        while skipped[current]:
+            current += 1
+
+    # Stops further down the line are predicted to be reached as far behind schedule as the train is running now, so
+    # these predictions are revised from one feed to the next as it falls further behind.
+    for k in range(current, last + 1):
+        if status == _STOPPED_AT and k == current:
+            arrival = arrivals[k]
+        else:
+            arrival = max(scheduled_arrivals[k] + lateness, information_time)
+        departure = None if k == last or (skipped[k] and k != current) else \
+            max(scheduled_departures[k] + lateness, arrival)
+        _add_stop_time_update(trip_update, trip.stop_ids[k], arrival, departure)
+
+    entity = feed.entity.add()
+    entity.id = "{0:06d}".format(len(feed.entity))
+    _set_trip_descriptor(entity.vehicle.trip, trip)
+    entity.vehicle.current_status = status
+    entity.vehicle.timestamp = information_time
+    entity.vehicle.stop_id = trip.stop_ids[current]
+
+
+def _add_alert_entity(feed, trip):
+    """
+    Adds an alert about a trip to a feed.
+    """
+    entity = feed.entity.add()
+    entity.id = "{0:06d}".format(len(feed.entity))
+    informed_entity = entity.alert.informed_entity.add()
+    informed_entity.trip.trip_id = trip.trip_id
+    informed_entity.trip.route_id = trip.route_id
+    entity.alert.header_text.translation.add().text = "Train delayed"
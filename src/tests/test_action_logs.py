@@ -166,3 +166,70 @@ class TestParsingMessagesIntoActionLog(unittest.TestCase):
         result = processing.parse_message_into_action_log(trip_update, vehicle_update, None)
         assert len(result) == 1
         assert result['action'].iloc[0] == 'EXPECTED_TO_ARRIVE_AT'
+
+
+class TestParsingFeedsIntoActionLog(unittest.TestCase):
+    """
+    The feed-wide action log builder writes every trip in a feed into a single action log. Its contents should match
+    the per-trip action logs exactly.
+    """
+    def setUp(self):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            self.gtfs_r0 = gtfs_realtime_pb2.FeedMessage()
+            self.gtfs_r0.ParseFromString(f.read())
+
+    def test_feed_matches_tripwise(self):
+        import pandas as pd
+
+        result = processing._parse_gtfs_into_action_log(self.gtfs_r0, 0)
+
+        tripwise = []
+        for trip_messages in processing._sort_feed_messages_by_trip_id(self.gtfs_r0).values():
+            vehicle_update = trip_messages[1] if len(trip_messages) > 1 else None
+            tripwise.append(processing.parse_message_into_action_log(trip_messages[0], vehicle_update, 0))
+        expected = pd.concat(tripwise).reset_index(drop=True)
+
+        # The per-trip action logs' categories differ, so they are concatenated into plain object columns.
+        assert len(result) == len(expected)
+        assert list(result.columns) == list(expected.columns)
+        assert result.astype(object).equals(expected.astype(object))
+
+    def test_time_assigned_is_integral(self):
+        result = processing._parse_gtfs_into_action_log(self.gtfs_r0, 0)
+        assert result['time_assigned'].dtype.kind == 'i'
+        assert result['information_time'].dtype.kind == 'i'
+
+    def test_categorical_columns(self):
+        result = processing._parse_gtfs_into_action_log(self.gtfs_r0, 0)
+        for column in ['action', 'route_id', 'stop_id']:
+            assert result[column].dtype.name == 'category'
+
+
+class TestIndexingFeedEntities(unittest.TestCase):
+    """
+    The feed entity index classifies each entity in a feed once. Make sure that it agrees with what the feed contains.
+    """
+    def setUp(self):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            self.gtfs_r0 = gtfs_realtime_pb2.FeedMessage()
+            self.gtfs_r0.ParseFromString(f.read())
+
+    def test_kinds(self):
+        index = processing.index_feed_entities(self.gtfs_r0.entity)
+        assert index.kinds[0] == processing.ENTITY_TRIP_UPDATE
+        assert index.kinds[1] == processing.ENTITY_VEHICLE_UPDATE
+        assert index.kinds[-1] == processing.ENTITY_ALERT
+        assert index.trip_ids[0] == index.trip_ids[1] == self.gtfs_r0.entity[0].trip_update.trip.trip_id
+
+    def test_vehicle_pairing(self):
+        index = processing.index_feed_entities(self.gtfs_r0.entity)
+        assert index.vehicle_indices[0] == 1
+        assert index.vehicle_indices[1] == -1  # vehicle updates are not themselves paired
+        assert index.vehicle_indices[108] == -1  # a trip that has not yet begun
+
+    def test_alert_range(self):
+        index = processing.index_feed_entities(self.gtfs_r0.entity)
+        start, stop = index.alert_range
+        assert stop == len(self.gtfs_r0.entity)
+        assert all(entity.HasField('alert') for entity in self.gtfs_r0.entity[start:stop])
+        assert not self.gtfs_r0.entity[start - 1].HasField('alert')
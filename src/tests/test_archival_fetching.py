@@ -0,0 +1,172 @@
+"""
+Tests the routines for fetching archival GTFS-Realtime data.
+
+The MTA provides archives of its GTFS-Realtime feeds at five-minute resolution. These archives are immutable, so we
+keep the ones we have already downloaded in an on-disk cache.
+
+Rather than hitting the real archive, this test suite serves the test data from a local HTTP server.
+"""
+
+import http.server
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+
+
+class ArchiveRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in for the archive server. Serves the contents of `archives`, keyed by request path, and counts requests.
+    """
+    archives = dict()
+    requests_made = []
+
+    def do_GET(self):
+        self.requests_made.append(self.path)
+        content = self.archives.get(self.path.lstrip("/"))
+        if content is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class ArchiveServerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            cls.raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            cls.raw_r1 = f.read()
+        with open("../../data/gtfs-realtime/failed-request_truncated-message.pkl", "rb") as f:
+            cls.raw_truncated = pickle.load(f)
+        ArchiveRequestHandler.archives = {
+            "gtfs-2014-09-18-09-01": cls.raw_r0,
+            "gtfs-2014-09-18-09-06": cls.raw_r1,
+            "gtfs-2014-09-18-09-11": b"Permission denied",
+            "gtfs-2014-09-18-09-16": cls.raw_truncated
+        }
+
+        cls.server = http.server.HTTPServer(("127.0.0.1", 0), ArchiveRequestHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.archive_url = "http://127.0.0.1:{0}/{{0}}-{{1}}".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        ArchiveRequestHandler.requests_made = []
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class TestArchiveCache(ArchiveServerTestCase):
+    def test_uncached(self):
+        result = processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-01", raw=True,
+                                                              archive_url=self.archive_url)
+        assert result == self.raw_r0
+        assert len(ArchiveRequestHandler.requests_made) == 1
+
+    def test_hit_and_miss(self):
+        cache = processing.ArchiveCache(self.directory)
+        first = processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-01", cache=cache,
+                                                             archive_url=self.archive_url)
+        second = processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-01", cache=cache,
+                                                              archive_url=self.archive_url)
+
+        assert first == second
+        assert len(ArchiveRequestHandler.requests_made) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_failures_are_not_cached(self):
+        cache = processing.ArchiveCache(self.directory)
+        for timestamp in ["2014-09-18-09-11", "2014-09-18-09-16", "2014-09-18-09-21"]:
+            processing.fetch_archival_gtfs_realtime_data(timestamp=timestamp, raw=True, cache=cache,
+                                                         archive_url=self.archive_url)
+        assert cache.size == 0
+
+    def test_offline(self):
+        processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-01", cache=processing.ArchiveCache(
+            self.directory), archive_url=self.archive_url)
+
+        cache = processing.ArchiveCache(self.directory, offline=True)
+        result = processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-01", raw=True, cache=cache,
+                                                              archive_url=self.archive_url)
+        assert result == self.raw_r0
+        with self.assertRaises(LookupError):
+            processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-06", cache=cache,
+                                                         archive_url=self.archive_url)
+        assert len(ArchiveRequestHandler.requests_made) == 1
+
+    def test_eviction(self):
+        """
+        With room for only one of the two archives, the least recently used one ought to be evicted.
+        """
+        cache = processing.ArchiveCache(self.directory, max_bytes=max(len(self.raw_r0), len(self.raw_r1)))
+        processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-01", raw=True, cache=cache,
+                                                     archive_url=self.archive_url)
+        processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-06", raw=True, cache=cache,
+                                                     archive_url=self.archive_url)
+
+        assert os.listdir(self.directory) == ["gtfs-2014-09-18-09-06"]
+        assert cache.size <= cache.max_bytes
+        assert cache.get("gtfs", "2014-09-18-09-01") is None
+
+
+class TestArchiveRangeFetching(ArchiveServerTestCase):
+    def test_timestamps(self):
+        assert processing.archival_timestamps("2014-09-18-09-00", "2014-09-18-09-16") == [
+            "2014-09-18-09-01", "2014-09-18-09-06", "2014-09-18-09-11", "2014-09-18-09-16"
+        ]
+        assert processing.archival_timestamps("2014-09-18-09-57", "2014-09-18-10-01") == ["2014-09-18-10-01"]
+        assert processing.archival_timestamps("2014-09-18-09-02", "2014-09-18-09-05") == []
+
+    def test_range(self):
+        """
+        Archives ought to come back in order, with the failures described in data/README.md classified.
+        """
+        result = list(processing.fetch_archival_gtfs_realtime_data_range(
+            start="2014-09-18-09-00", end="2014-09-18-09-21", max_concurrency=2, archive_url=self.archive_url
+        ))
+
+        assert [timestamp for timestamp, _ in result] == processing.archival_timestamps("2014-09-18-09-00",
+                                                                                        "2014-09-18-09-21")
+        assert result[0][1] == self.raw_r0
+        assert result[1][1] == self.raw_r1
+        assert [content.reason for _, content in result[2:]] == ['permission-denied', 'truncated', 'missing']
+        assert all(isinstance(content, processing.ArchiveFetchError) for _, content in result[2:])
+
+    def test_range_cache(self):
+        cache = processing.ArchiveCache(self.directory)
+        list(processing.fetch_archival_gtfs_realtime_data_range(
+            start="2014-09-18-09-00", end="2014-09-18-09-16", cache=cache, archive_url=self.archive_url
+        ))
+
+        # Failed archives should not have made their way into the cache.
+        assert sorted(os.listdir(self.directory)) == ["gtfs-2014-09-18-09-01", "gtfs-2014-09-18-09-06"]
+
+        ArchiveRequestHandler.requests_made = []
+        cache.offline = True
+        result = list(processing.fetch_archival_gtfs_realtime_data_range(
+            start="2014-09-18-09-00", end="2014-09-18-09-11", cache=cache, archive_url=self.archive_url
+        ))
+        assert [content for _, content in result[:2]] == [self.raw_r0, self.raw_r1]
+        assert result[2][1].reason == 'offline'
+        assert ArchiveRequestHandler.requests_made == []
@@ -0,0 +1,54 @@
+"""
+Tests the pipeline benchmark suite.
+
+The benchmarks themselves are too slow to run as part of the test suite at any but the smallest scale. This test suite
+ascertains that the scaled-up feed sequences are built correctly, and that the report is machine-readable.
+"""
+
+import json
+import unittest
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import benchmarks
+# noinspection PyUnresolvedReferences
+import processing
+
+
+class TestScaleFeeds(unittest.TestCase):
+    def test_trip_turnover(self):
+        """
+        Trips ought to run for `trip_lifetime` seconds, and then be replaced by new ones.
+        """
+        fixtures = benchmarks.load_feed_fixtures("./data")
+        feeds, information_times = benchmarks.scale_feeds(fixtures, 600, cadence=60, trip_lifetime=300)
+        assert len(feeds) == 10
+        assert information_times == sorted(information_times)
+
+        trip_ids = [set(processing._sort_feed_messages_by_trip_id(processing._decode_feed(feed))) for feed in feeds]
+        assert all(trip_id.endswith("_0") for trip_id in trip_ids[0] | trip_ids[4])
+        assert not trip_ids[0].intersection(trip_ids[5])
+        assert all(trip_id.endswith("_1") for trip_id in trip_ids[5])
+
+
+class TestReport(unittest.TestCase):
+    def test_report(self):
+        report = benchmarks.run_benchmarks(scales=['feed'], repeat=1, stages=['decode', 'action_log', 'trip_log'],
+                                           data_directory="./data")
+        report = json.loads(json.dumps(report))
+
+        assert [result['stage'] for result in report['results']] == ['decode', 'action_log', 'trip_log']
+        for result in report['results']:
+            assert result['scale'] == 'feed' and result['feeds'] == 1
+            assert result['items'] > 0 and result['seconds'] > 0 and result['throughput'] > 0
+            assert result['peak_memory_bytes'] >= 0
+
+    def test_synthetic_source(self):
+        report = benchmarks.run_benchmarks(scales=['feed'], repeat=1, stages=['action_log'], source='synthetic',
+                                           data_directory="./data")
+        assert report['source'] == 'synthetic'
+        assert report['results'][0]['feeds'] == 1 and report['results'][0]['throughput'] > 0
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            benchmarks.run_benchmarks(scales=['feed'], stages=['not-a-stage'], data_directory="./data")
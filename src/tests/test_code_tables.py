@@ -0,0 +1,114 @@
+"""
+Tests the identifier code tables.
+
+Route and stop ids are stored in action logs and trip logs as small integer codes, handed out by append-only code
+tables shared by the whole process; trip ids are kept as plain strings. This test suite ascertains that codes are
+stable, that identifiers encoded elsewhere are translated into the process's codes, and that trip logs built at
+different times share a code space.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+
+
+class TestCodeTable(unittest.TestCase):
+    def test_encode(self):
+        table = processing.CodeTable(['A', 'B'])
+        assert list(table.encode(['B', 'C', 'A', 'C'])) == [1, 2, 0, 2]
+        assert len(table) == 3
+        assert 'C' in table and 'D' not in table
+        assert list(table.decode([2, 0])) == ['C', 'A']
+
+    def test_missing_values(self):
+        table = processing.CodeTable()
+        assert list(table.encode(['A', None, np.nan])) == [0, -1, -1]
+        assert len(table) == 1
+
+    def test_append_only(self):
+        """
+        Categoricals built before the table grows ought to keep their codes under its later dtypes.
+        """
+        table = processing.CodeTable()
+        before = table.categorical(['A', 'B'])
+        table.encode(['C'])
+        after = pd.Categorical.from_codes(before.codes, dtype=table.dtype)
+        assert list(after) == ['A', 'B']
+        assert list(table.encode(before)) == [0, 1]
+
+    def test_foreign_categorical(self):
+        """
+        Categoricals encoded by some other table (as in another process) ought to be translated into this one's codes.
+        """
+        table, other = processing.CodeTable(['A', 'B', 'C']), processing.CodeTable(['C', 'A'])
+        foreign = other.categorical(['A', 'C', None, 'D'])
+        assert list(table.encode(foreign)) == [0, 2, -1, 3]
+        assert list(pd.Series(table.categorical(foreign)).astype(object).fillna('-')) == ['A', 'C', '-', 'D']
+
+
+class TestProcessCodeTables(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            cls.raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            cls.raw_r1 = f.read()
+
+    def test_shared_code_space(self):
+        """
+        Trip logs in different logbooks ought to share their stop codes, so that they can be compared directly.
+        """
+        left = processing.parse_feeds_into_trip_logbook([self.raw_r0], [0])
+        right = processing.parse_feeds_into_trip_logbook([self.raw_r1], [1])
+        stops = processing.code_tables().stop_ids
+
+        for logbook in [left, right]:
+            for trip_log in logbook.values():
+                codes = trip_log['stop_id'].cat.codes.values
+                assert list(stops.decode(codes)) == list(trip_log['stop_id'])
+
+    def test_plain_trip_ids(self):
+        """
+        Trip ids ought to be plain strings, and not categoricals over every trip seen so far, so that trip logs from
+        different logbooks concatenate without their trip ids being reconciled.
+        """
+        left = processing.parse_feeds_into_trip_logbook([self.raw_r0], [0])
+        right = processing.parse_feeds_into_trip_logbook([self.raw_r1], [1])
+
+        for logbook in [left, right]:
+            for trip_id, trip_log in logbook.items():
+                assert trip_log['trip_id'].dtype == object
+                assert set(trip_log['trip_id']) == {trip_id}
+
+        concatenation = pd.concat(list(left.values()) + list(right.values()))
+        assert concatenation['trip_id'].dtype == object
+        assert concatenation['stop_id'].dtype.name == 'category'
+        assert len(concatenation) == sum(len(trip_log) for trip_log in list(left.values()) + list(right.values()))
+
+    def test_seeding(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, "stops.txt"), "w") as f:
+                f.write("stop_id,stop_name\n140S,South Ferry\nSEED_STOP,Nowhere\n")
+            with open(os.path.join(directory, "routes.txt"), "w") as f:
+                f.write("route_id,route_short_name\n1,1\nSEED_ROUTE,S\n")
+            processing.seed_code_tables(directory)
+        finally:
+            shutil.rmtree(directory)
+
+        tables = processing.code_tables()
+        assert 'SEED_STOP' in tables.stop_ids and 'SEED_ROUTE' in tables.route_ids
+
+        # Encoding identifiers which are already in the table ought not to change any codes.
+        code = tables.stop_ids.encode(['SEED_STOP'])[0]
+        n = len(tables.stop_ids)
+        tables.stop_ids.encode(['140S', 'SEED_STOP'])
+        assert tables.stop_ids.encode(['SEED_STOP'])[0] == code
+        assert len(tables.stop_ids) == n
@@ -0,0 +1,128 @@
+"""
+Tests the feed pack format.
+
+A feed pack keeps many raw GTFS-Realtime archives in a single file, alongside an index of where each of them is. This
+test suite ascertains that feeds make it into and back out of packs intact, and that packs can be used as inputs to
+the rest of the pipeline.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from google.transit import gtfs_realtime_pb2
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+
+
+class TestFeedPacks(unittest.TestCase):
+    def setUp(self):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            self.raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            self.raw_r1 = f.read()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "2014-09-18.pack")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-06", self.raw_r1),
+                                                           ("2014-09-18-09-01", self.raw_r0)])
+
+        with processing.FeedPack(self.path) as pack:
+            assert len(pack) == 2
+            assert pack.keys() == [('gtfs', "2014-09-18-09-01"), ('gtfs', "2014-09-18-09-06")]
+            assert bytes(pack.get('gtfs', "2014-09-18-09-01")) == self.raw_r0
+            assert pack.get('gtfs', "2014-09-18-09-11") is None
+
+            feed = gtfs_realtime_pb2.FeedMessage()
+            view = pack.get('gtfs', "2014-09-18-09-06")
+            feed.ParseFromString(view)
+            assert len(feed.entity) == 454
+            view.release()
+
+    def test_append(self):
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-01", self.raw_r0)])
+        processing.append_to_feed_pack(self.path, 'gtfs-l', [("2014-09-18-09-01", self.raw_r1)])
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-06", self.raw_r1)])
+
+        with processing.FeedPack(self.path) as pack:
+            assert len(pack) == 3
+            timestamps, feeds = pack.feeds('gtfs')
+            assert timestamps == ["2014-09-18-09-01", "2014-09-18-09-06"]
+            assert [bytes(feed) for feed in feeds] == [self.raw_r0, self.raw_r1]
+            assert bytes(pack.get('gtfs-l', "2014-09-18-09-01")) == self.raw_r1
+            for feed in feeds:
+                feed.release()
+
+    def test_not_a_pack(self):
+        with self.assertRaises(ValueError):
+            processing.FeedPack("./data/gtfs_realtime_pull_1.dat")
+
+    def test_fetch(self):
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-01", self.raw_r0)])
+
+        # An unreachable archive URL ensures that the feed could only have come out of the pack.
+        with processing.FeedPack(self.path) as pack:
+            feed = processing.fetch_archival_gtfs_realtime_data(timestamp="2014-09-18-09-01", pack=pack,
+                                                                archive_url="http://127.0.0.1:9/{0}-{1}")
+            assert len(feed.entity) == 493
+
+    def test_logbook(self):
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-01", self.raw_r0),
+                                                           ("2014-09-18-09-06", self.raw_r1)])
+
+        expected = processing.parse_feeds_into_trip_logbook([self.raw_r0, self.raw_r1], [0, 1])
+        with processing.FeedPack(self.path) as pack:
+            timestamps, feeds = pack.feeds()
+            result = processing.parse_feeds_into_trip_logbook(feeds, list(range(len(timestamps))))
+
+        assert set(result.keys()) == set(expected.keys())
+        for trip_id in expected:
+            assert result[trip_id].equals(expected[trip_id])
+
+    def test_close_with_feeds_in_use(self):
+        """
+        Feeds handed out by a pack outlive it, rather than keeping it from being closed.
+        """
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-01", self.raw_r0)])
+
+        with processing.FeedPack(self.path) as pack:
+            _, feeds = pack.feeds()
+        assert bytes(feeds[0]) == self.raw_r0
+
+    def test_replace(self):
+        """
+        Replaced feeds do not leave dead bytes behind in the pack.
+        """
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-01", self.raw_r0),
+                                                           ("2014-09-18-09-06", self.raw_r1)])
+        size = os.path.getsize(self.path)
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-06", self.raw_r1)])
+        assert os.path.getsize(self.path) == size
+
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-06", self.raw_r0)])
+        with processing.FeedPack(self.path) as pack:
+            assert [bytes(feed) for feed in pack.feeds()[1]] == [self.raw_r0, self.raw_r0]
+
+    def test_failed_append(self):
+        """
+        An append which fails partway through leaves the pack as it was.
+        """
+        processing.append_to_feed_pack(self.path, 'gtfs', [("2014-09-18-09-01", self.raw_r0)])
+        with open(self.path, 'rb') as f:
+            before = f.read()
+
+        def feeds():
+            yield "2014-09-18-09-06", self.raw_r1
+            raise IOError("The archive could not be fetched.")
+
+        with self.assertRaises(IOError):
+            processing.append_to_feed_pack(self.path, 'gtfs', feeds())
+        with open(self.path, 'rb') as f:
+            assert f.read() == before
+        assert os.listdir(self.directory) == [os.path.basename(self.path)]
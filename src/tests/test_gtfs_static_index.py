@@ -0,0 +1,129 @@
+"""
+Tests the static GTFS lookup index.
+
+GTFS-Realtime messages only refer to routes, stops, and trips by their ids. The names, coordinates, and schedules
+associated with those ids live in the static GTFS export, which `tripset.GTFSStaticIndex` loads (once) and looks up.
+
+This test suite ascertains that lookups and the on-disk cache work as expected, using a tiny stand-in GTFS export.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import tripset
+
+
+class TestGTFSStaticIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.gtfs_directory = os.path.join(self.directory, "gtfs")
+        os.makedirs(self.gtfs_directory)
+
+        self.write("routes.txt", "agency_id,route_id,route_short_name,route_long_name\n"
+                                 "MTA NYCT,1,1,Broadway - 7 Avenue Local\n"
+                                 "MTA NYCT,GS,S,42 St Shuttle\n")
+        self.write("stops.txt", "stop_id,stop_code,stop_name,stop_desc,stop_lat,stop_lon\n"
+                                "140S,,South Ferry,,40.702068,-74.013664\n"
+                                "139S,,Rector St,,40.707513,-74.013783\n")
+        self.write("trips.txt", "route_id,service_id,trip_id,trip_headsign\n"
+                                "1,A20140608WKD,A20140608WKD_051600_1..S02R,SOUTH FERRY\n")
+        self.write("stop_times.txt", "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+                                     "A20140608WKD_051600_1..S02R,08:36:00,08:36:00,140S,2\n"
+                                     "A20140608WKD_051600_1..S02R,08:35:00,08:35:00,139S,1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        with open(os.path.join(self.gtfs_directory, name), "w") as f:
+            f.write(content)
+
+    def test_lookups(self):
+        index = tripset.GTFSStaticIndex(self.gtfs_directory)
+
+        assert index.route_short_name('GS') == 'S'
+        assert index.route_short_name(1) == '1'
+        assert index.stop_name('140S') == 'South Ferry'
+        assert index.stop_coordinates('140S') == (40.702068, -74.013664)
+        assert index.stop_name('999X') is None
+        assert index.trip_route_id('A20140608WKD_051600_1..S02R') == '1'
+
+        stop_times = index.trip_stop_times('A20140608WKD_051600_1..S02R')
+        assert list(stop_times['stop_id']) == ['139S', '140S']
+        assert list(stop_times['arrival_time']) == ['08:35:00', '08:36:00']
+
+    def test_lazy_loading(self):
+        index = tripset.GTFSStaticIndex(self.gtfs_directory)
+        index.route_short_name('1')
+
+        # Only the table actually used has been loaded, and it is not re-read.
+        os.remove(os.path.join(self.gtfs_directory, "routes.txt"))
+        os.remove(os.path.join(self.gtfs_directory, "stops.txt"))
+        assert index.route_short_name('GS') == 'S'
+        with self.assertRaises(FileNotFoundError):
+            index.stop_name('140S')
+
+    def test_cache(self):
+        cache_directory = os.path.join(self.directory, "cache")
+        tripset.GTFSStaticIndex(self.gtfs_directory, cache_directory=cache_directory).route_short_name('1')
+        assert os.path.exists(os.path.join(cache_directory, "routes.pkl"))
+
+        # A cached table is used so long as its source file is unchanged...
+        from unittest import mock
+        with mock.patch.object(tripset.GTFSStaticIndex, '_build_routes', side_effect=AssertionError):
+            index = tripset.GTFSStaticIndex(self.gtfs_directory, cache_directory=cache_directory)
+            assert index.route_short_name('GS') == 'S'
+
+        # ...and rebuilt once the source file changes.
+        self.write("routes.txt", "agency_id,route_id,route_short_name,route_long_name\n"
+                                 "MTA NYCT,GS,GS,42 St Shuttle\n")
+        os.utime(os.path.join(self.gtfs_directory, "routes.txt"), (0, 0))
+        index = tripset.GTFSStaticIndex(self.gtfs_directory, cache_directory=cache_directory)
+        assert index.route_short_name('GS') == 'GS'
+
+    def test_process_wide_index(self):
+        index = tripset.gtfs_static_index(self.gtfs_directory)
+        assert tripset.gtfs_static_index(self.gtfs_directory) is index
+
+
+class TestToTripsets(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, "routes.txt"), "w") as f:
+            f.write("agency_id,route_id,route_short_name,route_long_name\nMTA NYCT,1,1,Broadway - 7 Avenue Local\n")
+        with open(os.path.join(self.directory, "stops.txt"), "w") as f:
+            f.write("stop_id,stop_code,stop_name,stop_desc,stop_lat,stop_lon\n"
+                    "140S,,South Ferry,,40.702068,-74.013664\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_vehicle_updates(self):
+        """
+        Vehicle updates ought to be attached to their trip update whether or not they immediately follow it.
+        """
+        from unittest import mock
+        from google.transit import gtfs_realtime_pb2
+
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.header.gtfs_realtime_version = "1.0"
+        for trip_id in ['A', 'B', 'C']:
+            entity = feed.entity.add(id=trip_id)
+            entity.trip_update.trip.trip_id, entity.trip_update.trip.route_id = trip_id, '1'
+            entity.trip_update.stop_time_update.add(stop_id='140S').arrival.time = 1
+        # B's vehicle update immediately follows C's trip update; A's comes last.
+        for trip_id in ['B', 'A']:
+            entity = feed.entity.add(id=trip_id + 'V')
+            entity.vehicle.trip.trip_id, entity.vehicle.stop_id = trip_id, '140S'
+
+        index = tripset.GTFSStaticIndex(self.directory)
+        with mock.patch.object(tripset, 'gtfs_static_index', return_value=index):
+            tripsets = tripset.to_tripsets(feed)
+
+        assert [t.trip_planned.id for t in tripsets] == ['A', 'B', 'C']
+        assert [t.current_vehicle_update.vehicle.trip.trip_id if t.current_vehicle_update else None
+                for t in tripsets] == ['A', 'B', None]
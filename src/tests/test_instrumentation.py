@@ -0,0 +1,81 @@
+"""
+Tests the pipeline's stage-level instrumentation.
+
+Instrumentation is opt-in: while an `instrument` block is active, each stage of the pipeline records its wall time,
+call count, memory use, and counts of what it produced. This test suite ascertains that these are recorded, reported
+to callbacks, and not recorded at all outside of such a block.
+"""
+
+import json
+import unittest
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+
+
+class TestInstrumentation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            cls.raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            cls.raw_r1 = f.read()
+
+    def test_stages(self):
+        with processing.instrument() as stats:
+            left = processing.parse_feeds_into_trip_logbook([self.raw_r0], [0])
+            right = processing.parse_feeds_into_trip_logbook([self.raw_r1], [1])
+            result = processing.merge_trip_logbooks([left, right])
+
+        for stage in ['decode', 'index', 'action_log', 'termination', 'trip_log', 'parse_feeds', 'join', 'merge']:
+            assert stage in stats
+            assert stats[stage].calls > 0 and stats[stage].seconds >= 0
+
+        assert stats['decode'].counts['feeds'] == 2
+        assert stats['parse_feeds'].calls == 2
+        assert stats['trip_log'].counts['trip_logs'] == len(left) + len(right)
+        assert stats['termination'].counts['trips_opened'] == len(left) + len(right)
+        assert stats['join'].counts['trips_joined'] == len(set(left).intersection(right))
+        assert stats['merge'].counts['trips'] == len(result)
+        assert json.loads(json.dumps(stats.as_dict()))['merge']['calls'] == 1
+        assert len(stats.summary().splitlines()) == len(stats.stages)
+
+    def test_disabled(self):
+        with processing.instrument() as stats:
+            pass
+        processing.parse_feeds_into_trip_logbook([self.raw_r0], [0])
+        assert len(stats.stages) == 0
+        assert processing._instrumentation is None
+
+    def test_callback(self):
+        records = []
+        with processing.instrument(callback=lambda stage, record: records.append((stage, record))) as stats:
+            builder = processing.TripLogbookBuilder(horizon=0)
+            builder.ingest(self.raw_r0, 0)
+            finished = builder.ingest(self.raw_r1, 1)
+
+        assert sum(stage == 'ingest' for stage, _ in records) == 2
+        assert sum(record.get('trips_closed', 0) for stage, record in records if stage == 'termination') == \
+            len(finished)
+        assert stats['finish'].counts['trips_finished'] == len(finished)
+        for stage, record in records:
+            assert record['stage'] == stage and record['seconds'] >= 0
+
+    def test_trace_memory(self):
+        with processing.instrument(trace_memory=True) as stats:
+            processing.parse_feeds_into_trip_logbook([self.raw_r0], [0])
+
+        # Every stage nested in parsing the feeds allocated less at its peak than parsing the feeds did as a whole.
+        assert stats['parse_feeds'].peak_memory > 0
+        for stage in ['action_log', 'trip_log']:
+            assert 0 < stats[stage].peak_memory <= stats['parse_feeds'].peak_memory
+
+    def test_nesting(self):
+        with processing.instrument() as outer:
+            with processing.instrument() as inner:
+                processing.parse_feeds_into_trip_logbook([self.raw_r0], [0])
+            processing.merge_trip_logbooks([dict(), dict()])
+
+        assert 'parse_feeds' in inner and 'parse_feeds' not in outer
+        assert 'merge' in outer and 'merge' not in inner
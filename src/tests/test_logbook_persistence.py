@@ -0,0 +1,78 @@
+"""
+Tests the columnar trip logbook file format.
+
+Trip logbooks are saved as a single Arrow IPC file, indexed by trip, rather than pickled. This test suite ascertains
+that logbooks make it into and back out of these files intact, and that selected trips and routes can be read back on
+their own.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestLogbookPersistence(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            raw_r1 = f.read()
+        cls.logbook = processing.parse_feeds_into_trip_logbook([raw_r0, raw_r1], [0, 1])
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "2014-09-18.arrow")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_trip_logs_equal(self, result, expected):
+        assert list(result.columns) == list(expected.columns)
+        for column in ['trip_id', 'route_id', 'action', 'stop_id']:
+            assert list(result[column]) == list(expected[column])
+        for column in ['minimum_time', 'maximum_time', 'latest_information_time']:
+            pd.testing.assert_series_equal(result[column], expected[column].astype(float))
+
+    def test_round_trip(self):
+        # A small batch size ensures that the logbook is spread out over many batches.
+        processing.save_trip_logbook(self.logbook, self.path, batch_size=100)
+        result = processing.load_trip_logbook(self.path)
+
+        assert list(result.keys()) == sorted(self.logbook.keys())
+        for trip_id in self.logbook:
+            self.assert_trip_logs_equal(result[trip_id], self.logbook[trip_id])
+
+    def test_trip_selection(self):
+        processing.save_trip_logbook(self.logbook, self.path, batch_size=100)
+        trip_ids = sorted(self.logbook.keys())[::50]
+        result = processing.load_trip_logbook(self.path, trip_ids=trip_ids + ['not_a_trip'])
+
+        assert list(result.keys()) == trip_ids
+        for trip_id in trip_ids:
+            self.assert_trip_logs_equal(result[trip_id], self.logbook[trip_id])
+
+    def test_route_selection(self):
+        processing.save_trip_logbook(self.logbook, self.path, compression=None)
+        result = processing.load_trip_logbook(self.path, route_ids=['1', '6'])
+
+        expected = {trip_id for trip_id, trip_log in self.logbook.items() if trip_log['route_id'].iloc[0] in {'1', '6'}}
+        assert len(expected) > 0
+        assert set(result.keys()) == expected
+
+    def test_not_a_logbook(self):
+        pd.DataFrame({'a': [1]}).to_feather(self.path)
+        with self.assertRaises(ValueError):
+            processing.load_trip_logbook(self.path)
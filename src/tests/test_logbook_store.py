@@ -0,0 +1,165 @@
+"""
+Tests memory-budgeted parsing of feeds into an on-disk trip logbook store.
+
+`parse_feeds_into_trip_logbook_store` parses feeds a window at a time, spilling trips which have been over for a while
+to disk. This test suite ascertains that the logbook read back out of the store is the same as the one built in memory
+by `parse_feeds_into_trip_logbook`, however small the budget, and that the budget is kept to.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+import numpy as np
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+# noinspection PyUnresolvedReferences
+import synthetic_feeds
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestLogbookStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.feeds = list(synthetic_feeds.generate_feeds(lines=3, trips_per_line=8, stops_per_trip=8, cadence=60,
+                                                        duration=5400, skip_probability=0.1, cancel_probability=0.2,
+                                                        raw=True))
+        cls.expected = processing.parse_feeds_into_trip_logbook(*cls.unzip(cls.feeds))
+
+    @staticmethod
+    def unzip(feeds):
+        return [feed for _, feed in feeds], [information_time for information_time, _ in feeds]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_logbooks_match(self, result, expected):
+        assert set(result.keys()) == set(expected.keys())
+        for trip_id in expected:
+            assert list(result[trip_id]['stop_id']) == list(expected[trip_id]['stop_id'])
+            assert list(result[trip_id]['action']) == list(expected[trip_id]['action'])
+            for column in ['minimum_time', 'maximum_time', 'latest_information_time']:
+                np.testing.assert_array_equal(result[trip_id][column].values.astype(float),
+                                              expected[trip_id][column].values.astype(float))
+
+    def test_matches_in_memory(self):
+        store = processing.parse_feeds_into_trip_logbook_store(iter(self.feeds), self.directory)
+        self.assert_logbooks_match(store.load(), self.expected)
+
+    def test_small_budget(self):
+        """
+        A budget too small to hold more than a few trips at once ought to spill trips in many parts, to no effect on
+        the result.
+        """
+        store = processing.parse_feeds_into_trip_logbook_store(iter(self.feeds), self.directory,
+                                                               memory_budget=64 * 1024, horizon=0)
+        assert len(store.parts) > 1
+        self.assert_logbooks_match(store.load(), self.expected)
+
+        # The store can be reopened, and read selectively.
+        reopened = processing.TripLogbookStore(self.directory)
+        assert reopened.trip_ids == set(self.expected)
+        trip_ids = sorted(self.expected)[:3]
+        self.assert_logbooks_match(reopened.load(trip_ids=trip_ids), {k: self.expected[k] for k in trip_ids})
+
+    def gapped_feeds(self, trip_ids, gap_length=3):
+        """
+        Returns the feeds with each of the given trips left out of a few feeds midway through its run.
+        """
+        from google.transit import gtfs_realtime_pb2
+
+        gaps = dict()
+        for trip_id in trip_ids:
+            present = [i for i, (_, raw) in enumerate(self.feeds) if trip_id.encode('utf-8') in raw]
+            for i in present[len(present) // 2:len(present) // 2 + gap_length]:
+                gaps.setdefault(i, set()).add(trip_id)
+
+        feeds = []
+        for i, (information_time, raw) in enumerate(self.feeds):
+            if i in gaps:
+                feed = gtfs_realtime_pb2.FeedMessage()
+                feed.ParseFromString(raw)
+                entities = [entity for entity in feed.entity if not (
+                    entity.trip_update.trip.trip_id in gaps[i] or entity.vehicle.trip.trip_id in gaps[i]
+                )]
+                del feed.entity[:]
+                feed.entity.extend(entities)
+                raw = feed.SerializeToString()
+            feeds.append((information_time, raw))
+        return feeds
+
+    def test_reappearance_within_horizon(self):
+        """
+        A trip which vanishes from the feeds for a while, then comes back, is one trip. So long as it comes back
+        within the horizon, it ought to be exactly as it would be in memory.
+        """
+        feeds = self.gapped_feeds([sorted(self.expected)[len(self.expected) // 2]])
+        expected = processing.parse_feeds_into_trip_logbook(*self.unzip(feeds))
+        store = processing.parse_feeds_into_trip_logbook_store(iter(feeds), self.directory, horizon=600)
+        self.assert_logbooks_match(store.load(), expected)
+
+    def test_reappearance_after_spill(self):
+        """
+        A trip which comes back after the horizon has passed has been spilled already, and is reopened. Whether it was
+        still waiting to be written out, or was written out already, it ought to be exactly as it would be in memory.
+        """
+        trip_ids = sorted(self.expected)[::len(self.expected) // 5][:5]
+        feeds = self.gapped_feeds(trip_ids)
+        expected = processing.parse_feeds_into_trip_logbook(*self.unzip(feeds))
+
+        for memory_budget in [2 ** 30, 64 * 1024]:
+            shutil.rmtree(self.directory)
+            with processing.instrument() as stats:
+                store = processing.parse_feeds_into_trip_logbook_store(iter(feeds), self.directory,
+                                                                       memory_budget=memory_budget, horizon=60)
+            assert ('reopen' in stats) == (memory_budget < 2 ** 30)
+            result = store.load()
+            self.assert_logbooks_match(result, expected)
+            for trip_id in trip_ids:
+                assert result[trip_id].equals(expected[trip_id])
+
+    @unittest.skipIf(not os.path.exists("/proc/self/status"), "the peak resident set size cannot be measured")
+    def test_peak_memory(self):
+        """
+        The peak resident set size of the process ought to stay within the budget, where without one it would not.
+        Each run is made in a process of its own, as a process's peak cannot be reset, with a budget set some way
+        above what the process holds before it starts parsing. The peak is read from VmHWM rather than ru_maxrss, as
+        Linux carries the latter over from the parent process (here, the test runner) through fork and exec.
+        """
+        script = "\n".join([
+            "import sys, tempfile",
+            "sys.path.insert(0, {path!r})",
+            "import processing, synthetic_feeds, pyarrow",
+            "memory_budget = processing._current_rss() + {headroom}",
+            "feeds = synthetic_feeds.generate_feeds(lines=6, trips_per_line=60, duration=3600, raw=True)",
+            "processing.parse_feeds_into_trip_logbook_store(feeds, tempfile.mkdtemp(dir={directory!r}), "
+            "memory_budget=memory_budget)",
+            "with open('/proc/self/status') as f:",
+            "    peak = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))",
+            "print(memory_budget, peak)"
+        ])
+        path = os.path.dirname(os.path.abspath(processing.__file__))
+
+        runs = []
+        for headroom in [2 ** 40, 40 * 2 ** 20]:
+            output = subprocess.run([sys.executable, "-c", script.format(path=path, headroom=headroom,
+                                                                           directory=self.directory)],
+                                    check=True, capture_output=True, text=True).stdout
+            runs.append([int(value) for value in output.split()])
+        (_, unbudgeted_peak), (memory_budget, peak) = runs
+        assert peak <= memory_budget < unbudgeted_peak
+
+    def test_out_of_order(self):
+        with self.assertRaises(ValueError):
+            processing.parse_feeds_into_trip_logbook_store(iter(self.feeds[::-1]), self.directory)
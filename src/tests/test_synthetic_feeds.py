@@ -0,0 +1,85 @@
+"""
+Tests the synthetic GTFS-Realtime feed generator.
+
+Synthetic feeds stand in for the real thing in load tests, so they have to follow the same conventions as the MTA's
+feeds do. This test suite ascertains that they parse cleanly, and that trips in them start, run, skip stops, and
+terminate the way real ones do.
+"""
+
+import collections
+import unittest
+import numpy as np
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+# noinspection PyUnresolvedReferences
+import synthetic_feeds
+
+
+class TestGenerateFeeds(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.feeds = list(synthetic_feeds.generate_feeds(lines=['1', '2'], trips_per_line=6, stops_per_trip=8,
+                                                        cadence=60, duration=3600, skip_probability=0.2,
+                                                        cancel_probability=0.2, alert_probability=0.5))
+        cls.logbook = processing.parse_feeds_into_trip_logbook([feed for _, feed in cls.feeds],
+                                                               [information_time for information_time, _ in cls.feeds])
+
+    def test_cadence(self):
+        information_times = [information_time for information_time, _ in self.feeds]
+        assert len(information_times) == 61
+        assert np.all(np.diff(information_times) == 60)
+        assert all(feed.header.timestamp == information_time for information_time, feed in self.feeds)
+
+    def test_entity_layout(self):
+        """
+        Vehicle updates ought to follow their trip updates, and alerts ought to come at the end of the feed.
+        """
+        for _, feed in self.feeds:
+            index = processing.index_feed_entities(feed.entity)
+            assert index.alert_range[1] == len(feed.entity)
+            assert np.all(index.kinds[:index.alert_range[0]] != processing.ENTITY_ALERT)
+
+            vehicles = np.flatnonzero(index.kinds == processing.ENTITY_VEHICLE_UPDATE)
+            assert np.all(index.vehicle_indices[vehicles - 1] == vehicles)
+
+    def test_vehicle_statuses(self):
+        statuses = collections.Counter(entity.vehicle.current_status for _, feed in self.feeds for entity in feed.entity
+                                       if entity.HasField('vehicle'))
+        assert set(statuses) == {synthetic_feeds._STOPPED_AT, synthetic_feeds._IN_TRANSIT_TO}
+
+    def test_trip_logs(self):
+        """
+        Every trip ought to parse, and the trips which ran their course within the feeds ought to be finished off.
+        """
+        assert {trip_log['route_id'].iloc[0] for trip_log in self.logbook.values()} == {'1', '2'}
+
+        actions = collections.Counter(action for trip_log in self.logbook.values() for action in trip_log['action'])
+        assert actions['STOPPED_AT'] > 0 and actions['STOPPED_OR_SKIPPED'] > 0 and actions['EN_ROUTE_TO'] > 0
+
+        # Trips which disappeared before the final feed have terminated.
+        last_trip_ids = set(processing._sort_feed_messages_by_trip_id(self.feeds[-1][1]))
+        terminated = [trip_id for trip_id in self.logbook if trip_id not in last_trip_ids]
+        assert len(terminated) > 0
+        for trip_id in terminated:
+            assert 'EN_ROUTE_TO' not in set(self.logbook[trip_id]['action'])
+
+    def test_skipped_stops(self):
+        """
+        Stops which a train in progress is going to skip ought to come out as EXPECTED_TO_SKIP.
+        """
+        skips = sum((processing._parse_gtfs_into_action_log(feed, information_time)['action'] == 'EXPECTED_TO_SKIP')
+                    .sum() for information_time, feed in self.feeds)
+        assert skips > 0
+
+    def test_determinism(self):
+        left = synthetic_feeds.generate_feeds(lines=2, trips_per_line=3, duration=600, raw=True, seed=1)
+        right = synthetic_feeds.generate_feeds(lines=2, trips_per_line=3, duration=600, raw=True, seed=1)
+        assert list(left) == list(right)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            next(synthetic_feeds.generate_feeds(cadence=0))
+        with self.assertRaises(ValueError):
+            next(synthetic_feeds.generate_feeds(stops_per_trip=1))
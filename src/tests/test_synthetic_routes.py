@@ -59,3 +59,28 @@ class TestTripWiseExtract(unittest.TestCase):
         tripwise_2 = pd.read_csv("./data/S02R_tripwise_action_log_2.csv")
         result = processing._extract_synthetic_route_from_tripwise_action_logs([tripwise_1, tripwise_2])
         assert result == ['137S', '138S', '139S', '140S']
+
+
+class TestSynthesisPivotSelection(unittest.TestCase):
+    def test_multiple_pivots(self):
+        """
+        When more than one station is shared between the lists, the last shared station in the first list is the pivot.
+        """
+        result = processing._synthesize_station_lists(['A', 'B', 'C', 'D'], ['B', 'D', 'E'])
+        assert result == ['A', 'B', 'C', 'D', 'E']
+
+    def test_repeated_station(self):
+        result = processing._synthesize_station_lists(['A', 'B'], ['C', 'B', 'B', 'D'])
+        assert result == ['A', 'C', 'B', 'B', 'D']
+
+
+class TestSyntheticRouteMemoization(unittest.TestCase):
+    def test_memoized_results_are_independent(self):
+        """
+        Repeated calls with the same station lists are served from the cache, but callers must still each get their
+        own list back.
+        """
+        first = processing._extract_synthetic_route_from_station_lists([['A', 'B'], ['B', 'C']])
+        first.append('Z')
+        second = processing._extract_synthetic_route_from_station_lists([['A', 'B'], ['B', 'C']])
+        assert second == ['A', 'B', 'C']
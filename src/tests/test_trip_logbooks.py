@@ -19,6 +19,8 @@ import numpy as np
 import sys; sys.path.append("../")
 # noinspection PyUnresolvedReferences
 import processing
+# noinspection PyUnresolvedReferences
+import synthetic_feeds
 
 
 class SmokeTest(unittest.TestCase):
@@ -39,3 +41,411 @@ class SmokeTest(unittest.TestCase):
         right_logbook = processing.parse_feeds_into_trip_logbook([self.gtfs_r1], [1])
         result = processing.merge_trip_logbooks([left_logbook, right_logbook])
         assert len(result.keys()) == 421
+
+
+class StreamingTest(unittest.TestCase):
+    """
+    Tests for building trip logbooks one feed at a time, using `TripLogbookBuilder`.
+    """
+    def setUp(self):
+        from google.transit import gtfs_realtime_pb2
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            self.gtfs_r0 = gtfs_realtime_pb2.FeedMessage()
+            self.gtfs_r0.ParseFromString(f.read())
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            self.gtfs_r1 = gtfs_realtime_pb2.FeedMessage()
+            self.gtfs_r1.ParseFromString(f.read())
+
+    def test_termination(self):
+        """
+        Trips which disappear between two feeds ought to be handed back, finished, as soon as the second feed is
+        ingested, if there is no horizon to wait out.
+        """
+        builder = processing.TripLogbookBuilder(horizon=0)
+        assert builder.ingest(self.gtfs_r0, 0) == dict()
+        assert len(builder) == len(processing._sort_feed_messages_by_trip_id(self.gtfs_r0))
+
+        finished = builder.ingest(self.gtfs_r1, 1)
+        assert len(finished) > 0
+        assert not builder.open_trip_ids.intersection(finished.keys())
+        for trip_log in finished.values():
+            assert 'EN_ROUTE_TO' not in trip_log['action'].values
+
+    def test_matches_batch(self):
+        """
+        The streamed logbook ought to be the same as the one built all at once.
+        """
+        from google.transit import gtfs_realtime_pb2
+
+        builder = processing.TripLogbookBuilder()
+        result = builder.ingest(self.gtfs_r0, 0)
+        result.update(builder.ingest(self.gtfs_r1, 1))
+        result.update(builder.close())
+        assert len(builder) == 0
+
+        expected = processing.parse_feeds_into_trip_logbook([self.gtfs_r0, self.gtfs_r1], [0, 1])
+        assert set(result.keys()) == set(expected.keys())
+        for trip_id in expected:
+            assert result[trip_id].equals(expected[trip_id])
+
+        # Trips which are missing from a few feeds and then come back ought to be handed back once, in one piece. To
+        # check, take a handful of the trips running in both feeds out of a stretch of copies of the first.
+        running = sorted(set(processing._sort_feed_messages_by_trip_id(self.gtfs_r0)) &
+                         set(processing._sort_feed_messages_by_trip_id(self.gtfs_r1)))
+        gapped = set(running[::40])
+        gap = gtfs_realtime_pb2.FeedMessage()
+        gap.CopyFrom(self.gtfs_r0)
+        del gap.entity[:]
+        gap.entity.extend(entity for entity in self.gtfs_r0.entity
+                          if entity.trip_update.trip.trip_id not in gapped and
+                          entity.vehicle.trip.trip_id not in gapped)
+
+        feeds, information_times = [self.gtfs_r0, gap, gap, gap, self.gtfs_r1], [0, 60, 120, 180, 240]
+        builder = processing.TripLogbookBuilder(horizon=300)
+        handed_back = [builder.ingest(feed, information_time)
+                       for feed, information_time in zip(feeds, information_times)]
+        handed_back.append(builder.close())
+
+        trip_ids = [trip_id for logbook in handed_back for trip_id in logbook]
+        assert len(trip_ids) == len(set(trip_ids))
+        result = {trip_id: trip_log for logbook in handed_back for trip_id, trip_log in logbook.items()}
+
+        expected = processing.parse_feeds_into_trip_logbook(feeds, information_times)
+        assert set(result.keys()) == set(expected.keys())
+        for trip_id in expected:
+            pd.testing.assert_frame_equal(result[trip_id], expected[trip_id])
+        assert all(result[trip_id]['maximum_time'].notnull().all() for trip_id in gapped)
+
+    def test_out_of_order(self):
+        builder = processing.TripLogbookBuilder()
+        builder.ingest(self.gtfs_r0, 1)
+        with self.assertRaises(ValueError):
+            builder.ingest(self.gtfs_r1, 0)
+
+
+class ParallelTest(unittest.TestCase):
+    """
+    Tests for building trip logbooks with the per-feed work spread over a process pool.
+    """
+    def setUp(self):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            self.raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            self.raw_r1 = f.read()
+
+    def test_matches_serial(self):
+        expected = processing.parse_feeds_into_trip_logbook([self.raw_r0, self.raw_r1], [0, 1])
+        result = processing.parse_feeds_into_trip_logbook([self.raw_r0, self.raw_r1], [0, 1], workers=2)
+
+        assert set(result.keys()) == set(expected.keys())
+        for trip_id in expected:
+            assert result[trip_id].equals(expected[trip_id])
+
+    def test_trip_logs_match_serial(self):
+        """
+        Trip logs built over the process pool, finished trips included, ought to be the same as those built serially,
+        and as those built one at a time out of each trip's action logs.
+        """
+        feeds = list(synthetic_feeds.generate_feeds(lines=3, trips_per_line=20, duration=1800, cadence=60,
+                                                    cancel_probability=0.2, raw=True))
+        information_times, feeds = [t for t, _ in feeds], [feed for _, feed in feeds]
+
+        expected = processing.parse_feeds_into_trip_logbook(feeds, information_times)
+        result = processing.parse_feeds_into_trip_logbook(feeds, information_times, workers=2)
+        tables = processing._parse_feeds_into_action_log_tables(feeds, information_times)
+        presence = processing.index_trip_presence(table.keys() for table in tables)
+
+        assert list(result.keys()) == list(expected.keys()) == list(presence)
+        assert sum(seen.last_absent is not None for seen in presence.values()) > 0
+        for trip_id, seen in presence.items():
+            action_logs = [table[trip_id] for table in tables[seen.first_seen:seen.last_seen + 1] if trip_id in table]
+            trip_log = processing.parse_tripwise_action_logs_into_trip_log(action_logs)
+            if seen.last_absent is not None:
+                trip_log = processing._finish_trip(trip_log, information_times[seen.last_absent])
+            pd.testing.assert_frame_equal(expected[trip_id], trip_log)
+            pd.testing.assert_frame_equal(result[trip_id], trip_log)
+
+    def test_information_time_order(self):
+        """
+        Feeds passed out of order should be processed in information time order.
+        """
+        expected = processing.parse_feeds_into_trip_logbook([self.raw_r0, self.raw_r1], [0, 1])
+        result = processing.parse_feeds_into_trip_logbook([self.raw_r1, self.raw_r0], [1, 0], workers=2)
+
+        assert set(result.keys()) == set(expected.keys())
+        for trip_id in expected:
+            assert result[trip_id].equals(expected[trip_id])
+
+
+class PresenceTest(unittest.TestCase):
+    """
+    Tests for the index of which feeds each trip is present in, from which trips' termination times are taken.
+    """
+    def test_presence(self):
+        presence = processing.index_trip_presence([{'A'}, {'A', 'B'}, {'B', 'C'}, {'A', 'B', 'C'}, {'C'}])
+        assert presence['A'] == processing.TripPresence(0, 3, 4)
+        assert presence['B'] == processing.TripPresence(1, 3, 4)
+        assert presence['C'] == processing.TripPresence(2, 4, None)
+
+    def test_matches_scan(self):
+        """
+        The last feed each trip is missing from ought to be the same as that found by checking every feed in turn.
+        """
+        random = np.random.RandomState(0)
+        trip_id_sets = [set(np.flatnonzero(random.random_sample(50) < 0.3)) for _ in range(40)]
+        presence = processing.index_trip_presence(trip_id_sets)
+
+        for trip_id in set().union(*trip_id_sets):
+            positions = [i for i, trip_ids in enumerate(trip_id_sets) if trip_id in trip_ids]
+            absences = [i for i in range(positions[0], len(trip_id_sets)) if i not in positions]
+            assert presence[trip_id] == (positions[0], positions[-1], absences[-1] if absences else None)
+
+    def test_empty(self):
+        assert processing.index_trip_presence([]) == dict()
+        assert processing.index_trip_presence([set(), set()]) == dict()
+
+
+class FilterTest(unittest.TestCase):
+    """
+    Tests for building trip logbooks for only some of the trips in the feeds.
+    """
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            cls.raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            cls.raw_r1 = f.read()
+        cls.expected = processing.parse_feeds_into_trip_logbook([cls.raw_r0, cls.raw_r1], [0, 1])
+
+    def assert_subset_matches(self, result, trip_ids):
+        assert len(trip_ids) > 0
+        assert set(result.keys()) == set(trip_ids)
+        for trip_id in trip_ids:
+            expected = self.expected[trip_id]
+            assert list(result[trip_id]['stop_id']) == list(expected['stop_id'])
+            assert list(result[trip_id]['action']) == list(expected['action'])
+            np.testing.assert_array_equal(result[trip_id]['maximum_time'].values, expected['maximum_time'].values)
+
+    def test_route_ids(self):
+        """
+        Filtering by route ought to keep every trip on the route, terminated just as it would be otherwise.
+        """
+        result = processing.parse_feeds_into_trip_logbook([self.raw_r0, self.raw_r1], [0, 1], route_ids=['1'])
+        trip_ids = [trip_id for trip_id, trip_log in self.expected.items() if trip_log['route_id'].iloc[0] == '1']
+        self.assert_subset_matches(result, trip_ids)
+
+    def test_trip_id_predicate(self):
+        trip_ids = sorted(self.expected)[::4]
+        result = processing.parse_feeds_into_trip_logbook([self.raw_r0, self.raw_r1], [0, 1],
+                                                          trip_id_predicate=set(trip_ids).__contains__)
+        self.assert_subset_matches(result, trip_ids)
+
+    def test_parallel(self):
+        result = processing.parse_feeds_into_trip_logbook([self.raw_r0, self.raw_r1], [0, 1], workers=2,
+                                                          route_ids=['6', '6X'])
+        trip_ids = [trip_id for trip_id, trip_log in self.expected.items()
+                    if trip_log['route_id'].iloc[0] in ('6', '6X')]
+        self.assert_subset_matches(result, trip_ids)
+
+    def test_streaming(self):
+        builder = processing.TripLogbookBuilder(route_ids=['1'])
+        result = builder.ingest(self.raw_r0, 0)
+        result.update(builder.ingest(self.raw_r1, 1))
+        result.update(builder.close())
+        trip_ids = [trip_id for trip_id, trip_log in self.expected.items() if trip_log['route_id'].iloc[0] == '1']
+        self.assert_subset_matches(result, trip_ids)
+
+    def test_sort_feed_messages(self):
+        from google.transit import gtfs_realtime_pb2
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(self.raw_r0)
+        table = processing._sort_feed_messages_by_trip_id(feed, route_ids=['1'])
+        assert len(table) > 0
+        for messages in table.values():
+            assert messages[0].trip_update.trip.route_id == '1'
+
+
+class MergeTest(unittest.TestCase):
+    """
+    Tests for the different trip logbook merge methods.
+    """
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            raw_r1 = f.read()
+
+        # Trip logs with just one entry trip up _join_trip_logs, so leave them out here.
+        logbooks = [processing.parse_feeds_into_trip_logbook([raw], [i]) for i, raw in
+                    enumerate([raw_r0, raw_r1, raw_r0, raw_r1])]
+        cls.logbooks = [{k: v for k, v in logbook.items() if len(v) > 2} for logbook in logbooks]
+
+    def test_tree_pair(self):
+        """
+        With only two logbooks there is only one join to make, so both methods ought to agree exactly.
+        """
+        expected = processing.merge_trip_logbooks(self.logbooks[:2])
+        result = processing.merge_trip_logbooks(self.logbooks[:2], method='tree')
+
+        assert set(result.keys()) == set(expected.keys())
+        for trip_id in expected:
+            assert result[trip_id].equals(expected[trip_id])
+
+    def test_tree(self):
+        inputs = [set(logbook.keys()) for logbook in self.logbooks]
+
+        expected = processing.merge_trip_logbooks(self.logbooks)
+        result = processing.merge_trip_logbooks(self.logbooks, method='tree')
+        parallel_result = processing.merge_trip_logbooks(self.logbooks, method='tree', workers=2)
+
+        assert list(result.keys()) == list(expected.keys()) == list(parallel_result.keys())
+        for trip_id in expected:
+            pd.testing.assert_frame_equal(result[trip_id], expected[trip_id])
+            pd.testing.assert_frame_equal(parallel_result[trip_id], expected[trip_id])
+
+        # The logbooks passed in should not have been modified.
+        assert [set(logbook.keys()) for logbook in self.logbooks] == inputs
+
+    def test_tree_synthetic(self):
+        """
+        Trips that run across many logbooks are joined many times over, and the repairs each join makes depend on
+        the order in which they are made; the tree merge has to make them in the same order as the fold.
+        """
+        feeds = list(synthetic_feeds.generate_feeds(lines=3, trips_per_line=20, duration=3600, cadence=60, raw=True))
+        times, raws = [t for t, _ in feeds], [raw for _, raw in feeds]
+        logbooks = [processing.parse_feeds_into_trip_logbook(raws[i:i + 10], times[i:i + 10])
+                    for i in range(0, len(raws), 10)]
+
+        expected = processing.merge_trip_logbooks(logbooks)
+        for workers in [None, 2]:
+            result = processing.merge_trip_logbooks(logbooks, method='tree', workers=workers)
+            assert list(result.keys()) == list(expected.keys())
+            for trip_id in expected:
+                pd.testing.assert_frame_equal(result[trip_id], expected[trip_id])
+
+    def test_empty(self):
+        assert processing.merge_trip_logbooks([], method='tree') == dict()
+        assert processing.merge_trip_logbooks([]) == dict()
+
+    def test_invalid_method(self):
+        with self.assertRaises(ValueError):
+            processing.merge_trip_logbooks(self.logbooks, method='sideways')
+
+
+class BulkJoinTest(unittest.TestCase):
+    """
+    Tests that joining every mutual trip of two logbooks at once, using `_join_trip_logs_bulk`, gets the same results
+    as joining them one at a time, using `_join_trip_logs`.
+    """
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            raw_r1 = f.read()
+        cls.left = processing.parse_feeds_into_trip_logbook([raw_r0], [0])
+        cls.right = processing.parse_feeds_into_trip_logbook([raw_r1], [1])
+
+    def assert_bulk_matches(self, left, right):
+        keys = sorted(set(left.keys()).intersection(right.keys()))
+        result = processing._join_trip_logs_bulk([left[key] for key in keys], [right[key] for key in keys])
+
+        assert len(result) == len(keys)
+        for key, bulk_join in zip(keys, result):
+            expected = processing._join_trip_logs(left[key], right[key])
+            assert list(bulk_join.columns) == list(expected.columns)
+            assert list(bulk_join['stop_id']) == list(expected['stop_id'])
+            assert list(bulk_join['action']) == list(expected['action'])
+            np.testing.assert_array_equal(bulk_join['minimum_time'].values.astype(float),
+                                          expected['minimum_time'].values.astype(float))
+            np.testing.assert_array_equal(bulk_join['maximum_time'].values.astype(float),
+                                          expected['maximum_time'].values.astype(float))
+
+    def test_in_order(self):
+        self.assert_bulk_matches(self.left, self.right)
+
+    def test_out_of_order(self):
+        self.assert_bulk_matches(self.right, self.left)
+
+    def test_empty(self):
+        assert processing._join_trip_logs_bulk([], []) == []
+
+    def test_unary_left(self):
+        """
+        Trip logs with only a single entry have no previous entry to repair the join against.
+        """
+        trip_id = next(key for key in self.left if key in self.right and len(self.left[key]) > 1)
+        left = {trip_id: self.left[trip_id].tail(1).reset_index(drop=True)}
+        right = {trip_id: self.right[trip_id]}
+        self.assert_bulk_matches(left, right)
+
+
+class LongFormatTest(unittest.TestCase):
+    """
+    Tests that long-format TripLogbooks behave like the trip logbook dicts they are built out of.
+    """
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            raw_r0 = f.read()
+        with open("./data/gtfs_realtime_pull_2.dat", "rb") as f:
+            raw_r1 = f.read()
+        cls.left = processing.parse_feeds_into_trip_logbook([raw_r0], [0])
+        cls.right = processing.parse_feeds_into_trip_logbook([raw_r1], [1])
+
+    def assert_logbooks_match(self, result, expected):
+        assert sorted(result.keys()) == sorted(expected.keys())
+        for trip_id in expected:
+            assert list(result[trip_id]['stop_id']) == list(expected[trip_id]['stop_id'])
+            assert list(result[trip_id]['action']) == list(expected[trip_id]['action'])
+            for column in ['minimum_time', 'maximum_time', 'latest_information_time']:
+                np.testing.assert_array_equal(result[trip_id][column].values.astype(float),
+                                              expected[trip_id][column].values.astype(float))
+
+    def test_mapping(self):
+        logbook = processing.TripLogbook.from_dict(self.left)
+        assert len(logbook) == len(self.left)
+        assert list(logbook) == sorted(self.left)
+        assert 'not-a-trip' not in logbook
+        with self.assertRaises(KeyError):
+            logbook['not-a-trip']
+        self.assert_logbooks_match(logbook, self.left)
+        self.assert_logbooks_match(logbook.to_dict(), self.left)
+        assert list(logbook[next(iter(logbook))].index) == list(range(len(logbook[next(iter(logbook))])))
+
+    def test_empty(self):
+        logbook = processing.TripLogbook.from_dict(dict())
+        assert len(logbook) == 0 and len(logbook.frame) == 0
+        self.assert_logbooks_match(logbook.merge(self.left), self.left)
+
+    def test_merge(self):
+        expected = processing.merge_trip_logbooks([self.left, self.right])
+        result = processing.TripLogbook.from_dict(self.left).merge(self.right)
+        assert isinstance(result, processing.TripLogbook)
+        self.assert_logbooks_match(result, expected)
+
+    def test_merge_trip_logbooks(self):
+        logbooks = [processing.TripLogbook.from_dict(self.left), processing.TripLogbook.from_dict(self.right)]
+        expected = processing.merge_trip_logbooks([self.left, self.right])
+        for method in ['fold', 'tree']:
+            result = processing.merge_trip_logbooks(logbooks, method=method)
+            assert isinstance(result, processing.TripLogbook)
+            self.assert_logbooks_match(result, expected)
+
+    def test_filter(self):
+        logbook = processing.TripLogbook.from_dict(self.left)
+        trip_ids = sorted(self.left)[::3]
+        self.assert_logbooks_match(logbook.filter(trip_ids=trip_ids), {k: self.left[k] for k in trip_ids})
+
+        expected = {k: v for k, v in self.left.items() if v['route_id'].iloc[0] in ('1', '6')}
+        assert len(expected) > 0
+        self.assert_logbooks_match(logbook.filter(route_ids=['1', '6']), expected)
+
+    def test_finish(self):
+        logbook = processing.TripLogbook.from_dict(self.left)
+        trip_ids = sorted(self.left)[::2]
+        result = logbook.finish({trip_id: 100 for trip_id in trip_ids + ['not-a-trip']})
+        expected = dict(self.left)
+        expected.update({trip_id: processing._finish_trip(self.left[trip_id], 100) for trip_id in trip_ids})
+        self.assert_logbooks_match(result, expected)
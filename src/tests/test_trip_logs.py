@@ -9,8 +9,6 @@ The next step thereafter in our processing pipeline is to concatenate those acti
 which contain the entire known state for that train trip.
 
 This test suite ascertains that we correctly construct trip logs for all of our possible trip construct cases.
-
-Note: the use assertions like e.g. str(value) == "nan" is due to some odd type casting behavior in `pandas`.
 """
 
 import unittest
@@ -34,6 +32,19 @@ def create_mock_action_log(actions=None, stops=None, information_time=0):
     })
 
 
+def create_mock_long_trip():
+    """
+    The action logs of a train which is EN_ROUTE to its first station, then STOPPED_AT it, then EN_ROUTE to the third
+    station twice over, then STOPPED_AT the fourth.
+    """
+    stops = ['999X', '998X', '997X', '996X', '995X']
+    observations = [('EXPECTED_TO_ARRIVE_AT', stops), ('STOPPED_AT', stops), ('EXPECTED_TO_ARRIVE_AT', stops[2:]),
+                    ('EXPECTED_TO_ARRIVE_AT', stops[2:]), ('STOPPED_AT', stops[3:])]
+    return [create_mock_action_log(actions=[action] + ['EXPECTED_TO_ARRIVE_AT'] * (len(remaining) - 1),
+                                   stops=remaining, information_time=i)
+            for i, (action, remaining) in enumerate(observations)]
+
+
 class UnaryTests(unittest.TestCase):
     """
     Tests for simpler cases which can be processed in a single action log.
@@ -48,7 +59,7 @@ class UnaryTests(unittest.TestCase):
 
         assert len(result) == 1
         assert result.iloc[0].action == 'STOPPED_AT'
-        assert all([str(result.iloc[0]['maximum_time']) == 'nan', str(result.iloc[0]['minimum_time']) == 'nan',
+        assert all([np.isnan(result.iloc[0]['maximum_time']), np.isnan(result.iloc[0]['minimum_time']),
                     int(result.iloc[0]['latest_information_time']) == 0])
 
     def test_unary_en_route(self):
@@ -62,7 +73,7 @@ class UnaryTests(unittest.TestCase):
 
         assert len(result) == 1
         assert result.iloc[0].action == 'EN_ROUTE_TO'
-        assert all([result.iloc[0]['maximum_time'] in [np.nan, 'nan'],
+        assert all([np.isnan(result.iloc[0]['maximum_time']),
                     int(result.iloc[0]['minimum_time']) == 0,
                     int(result.iloc[0]['latest_information_time']) == 0])
 
@@ -75,7 +86,7 @@ class UnaryTests(unittest.TestCase):
         ])
         assert len(result) == 1
         assert result.iloc[0].action == 'EN_ROUTE_TO'
-        assert all([result.iloc[0]['maximum_time'] in [np.nan, 'nan'],
+        assert all([np.isnan(result.iloc[0]['maximum_time']),
                     int(result.iloc[0]['minimum_time']) == 0,
                     int(result.iloc[0]['latest_information_time']) == 0])
 
@@ -97,7 +108,7 @@ class UnaryTests(unittest.TestCase):
         assert len(result) == 3
         assert list(result['action'].values) == ['EN_ROUTE_TO', 'EN_ROUTE_TO', 'EN_ROUTE_TO']
         assert list(result['minimum_time'].values.astype(int)) == [0] * 3
-        assert list(result['maximum_time'].values.astype(str)) == ['nan'] * 3
+        np.testing.assert_array_equal(result['maximum_time'].values, [np.nan] * 3)
 
     def test_unary_departing_skip(self):
         """
@@ -115,9 +126,9 @@ class UnaryTests(unittest.TestCase):
 
         assert len(result) == 3
         assert list(result['action'].values) == ['EN_ROUTE_TO', 'EN_ROUTE_TO', 'EN_ROUTE_TO']
-        assert result['action'].values.all() == 'EN_ROUTE_TO'
+        assert (result['action'] == 'EN_ROUTE_TO').all()
         assert list(result['minimum_time'].values.astype(int)) == [0] * 3
-        assert list(result['maximum_time'].values.astype(str)) == ['nan'] * 3
+        np.testing.assert_array_equal(result['maximum_time'].values, [np.nan] * 3)
 
     def test_unary_en_route_trip(self):
         """
@@ -132,9 +143,9 @@ class UnaryTests(unittest.TestCase):
 
         assert len(result) == 2
         assert list(result['action'].values) == ['EN_ROUTE_TO', 'EN_ROUTE_TO']
-        assert result['action'].values.all() == 'EN_ROUTE_TO'
+        assert (result['action'] == 'EN_ROUTE_TO').all()
         assert list(result['minimum_time'].values.astype(int)) == [0] * 2
-        assert list(result['maximum_time'].values.astype(str)) == ['nan'] * 2
+        np.testing.assert_array_equal(result['maximum_time'].values, [np.nan] * 2)
 
     def test_unary_ordinary_stopped_trip(self):
         """
@@ -148,8 +159,8 @@ class UnaryTests(unittest.TestCase):
 
         assert len(result) == 2
         assert list(result['action'].values) == ['STOPPED_AT', 'EN_ROUTE_TO']
-        assert list(result['minimum_time'].values.astype(str)) == ['nan', '0']
-        assert list(result['maximum_time'].values.astype(str)) == ['nan', 'nan']
+        np.testing.assert_array_equal(result['minimum_time'].values, [np.nan, 0])
+        np.testing.assert_array_equal(result['maximum_time'].values, [np.nan, np.nan])
 
 
 class BinaryTests(unittest.TestCase):
@@ -170,7 +181,8 @@ class BinaryTests(unittest.TestCase):
         base = create_mock_action_log(actions=['EXPECTED_TO_ARRIVE_AT', 'EXPECTED_TO_ARRIVE_AT'],
                                       stops=['999X', '999X'])
         first = base.head(1)
-        second = base.tail(1).set_value(1, 'information_time', 1)
+        second = base.tail(1).copy()
+        second.loc[1, 'information_time'] = 1
         actions = [first, second]
 
         result = processing.parse_tripwise_action_logs_into_trip_log(actions)
@@ -178,7 +190,7 @@ class BinaryTests(unittest.TestCase):
         assert len(result) == 1
         assert list(result['action'].values) == ['EN_ROUTE_TO']
         assert list(result['minimum_time'].values.astype(int)) == [1]
-        assert list(result['maximum_time'].values.astype(str)) == ['nan']
+        np.testing.assert_array_equal(result['maximum_time'].values, [np.nan])
 
     def test_binary_en_route_stop(self):
         """
@@ -190,7 +202,8 @@ class BinaryTests(unittest.TestCase):
         base = create_mock_action_log(actions=['EXPECTED_TO_ARRIVE_AT', 'STOPPED_AT'],
                                       stops=['999X', '999X'])
         first = base.head(1)
-        second = base.tail(1).set_value(1, 'information_time', 1)
+        second = base.tail(1).copy()
+        second.loc[1, 'information_time'] = 1
         actions = [first, second]
 
         result = processing.parse_tripwise_action_logs_into_trip_log(actions)
@@ -198,7 +211,7 @@ class BinaryTests(unittest.TestCase):
         assert len(result) == 1
         assert list(result['action'].values) == ['STOPPED_AT']
         assert list(result['minimum_time'].values.astype(int)) == [0]
-        assert list(result['maximum_time'].values.astype(str)) == ['nan']
+        np.testing.assert_array_equal(result['maximum_time'].values, [np.nan])
 
     def test_binary_stop_or_skip_en_route(self):
         """
@@ -213,7 +226,8 @@ class BinaryTests(unittest.TestCase):
                                                'EXPECTED_TO_ARRIVE_AT'],
                                       stops=['999X', '999X', '998X', '998X'])
         first = base.head(3)
-        second = base.tail(1).set_value(3, 'information_time', 1)
+        second = base.tail(1).copy()
+        second.loc[3, 'information_time'] = 1
         actions = [first, second]
 
         result = processing.parse_tripwise_action_logs_into_trip_log(actions)
@@ -221,7 +235,7 @@ class BinaryTests(unittest.TestCase):
         assert len(result) == 2
         assert list(result['action'].values) == ['STOPPED_OR_SKIPPED', 'EN_ROUTE_TO']
         assert list(result['minimum_time'].values.astype(int)) == [0, 1]
-        assert list(result['maximum_time'].values.astype(str)) == ['1', 'nan']
+        np.testing.assert_array_equal(result['maximum_time'].values, [1, np.nan])
 
     def test_binary_skip_en_route(self):
         """
@@ -235,7 +249,8 @@ class BinaryTests(unittest.TestCase):
                                                'EXPECTED_TO_ARRIVE_AT'],
                                       stops=['999X', '998X', '998X'])
         first = base.head(2)
-        second = base.tail(1).set_value(2, 'information_time', 1)
+        second = base.tail(1).copy()
+        second.loc[2, 'information_time'] = 1
         actions = [first, second]
 
         result = processing.parse_tripwise_action_logs_into_trip_log(actions)
@@ -243,7 +258,7 @@ class BinaryTests(unittest.TestCase):
         assert len(result) == 2
         assert list(result['action'].values) == ['STOPPED_OR_SKIPPED', 'EN_ROUTE_TO']
         assert list(result['minimum_time'].values.astype(int)) == [0, 1]
-        assert list(result['maximum_time'].values.astype(str)) == ['1', 'nan']
+        np.testing.assert_array_equal(result['maximum_time'].values, [1, np.nan])
 
     def test_binary_skip_stop(self):
         """
@@ -257,7 +272,8 @@ class BinaryTests(unittest.TestCase):
                                                'STOPPED_AT'],
                                       stops=['999X', '998X', '998X'])
         first = base.head(2)
-        second = base.tail(1).set_value(2, 'information_time', 1)
+        second = base.tail(1).copy()
+        second.loc[2, 'information_time'] = 1
         actions = [first, second]
 
         result = processing.parse_tripwise_action_logs_into_trip_log(actions)
@@ -265,7 +281,7 @@ class BinaryTests(unittest.TestCase):
         assert len(result) == 2
         assert list(result['action'].values) == ['STOPPED_OR_SKIPPED', 'STOPPED_AT']
         assert list(result['minimum_time'].values.astype(int)) == [0, 0]
-        assert list(result['maximum_time'].values.astype(str)) == ['1', 'nan']
+        np.testing.assert_array_equal(result['maximum_time'].values, [1, np.nan])
 
 
 class FinalizationTests(unittest.TestCase):
@@ -333,7 +349,8 @@ class ReroutingTests(unittest.TestCase):
         base = create_mock_action_log(actions=['EXPECTED_TO_ARRIVE_AT', 'EXPECTED_TO_ARRIVE_AT'],
                                       stops=['999X', '998X'])
         first = base.head(1)
-        second = base.tail(1).set_value(1, 'information_time', 1)
+        second = base.tail(1).copy()
+        second.loc[1, 'information_time'] = 1
 
         result = processing.parse_tripwise_action_logs_into_trip_log([first, second])
 
@@ -341,6 +358,77 @@ class ReroutingTests(unittest.TestCase):
         assert list(result['action'].values) == ['STOPPED_OR_SKIPPED', 'EN_ROUTE_TO']
 
 
+class LongTripTests(unittest.TestCase):
+    """
+    Tests for trips observed many times over, in which each observation settles a different stretch of the route.
+    """
+    def test_long_trip(self):
+        """
+        Each station ought to be bracketed by the observations which settled it, and the last station ought to be
+        EN_ROUTE_TO as of the latest observation.
+        """
+        actions = create_mock_long_trip()
+        result = processing.parse_tripwise_action_logs_into_trip_log(actions)
+
+        assert list(result['stop_id']) == ['999X', '998X', '997X', '996X', '995X']
+        assert list(result['action']) == ['STOPPED_AT', 'STOPPED_OR_SKIPPED', 'STOPPED_OR_SKIPPED', 'STOPPED_AT',
+                                          'EN_ROUTE_TO']
+        np.testing.assert_array_equal(result['minimum_time'].values, [0, 1, 3, 3, 4])
+        np.testing.assert_array_equal(result['maximum_time'].values, [2, 2, 4, np.nan, np.nan])
+        np.testing.assert_array_equal(result['latest_information_time'].values, [1, 2, 4, 4, 4])
+
+
+class UpdateTests(unittest.TestCase):
+    """
+    Tests for advancing trip logs one observation at a time, which ought to give the same trip log as building it
+    from every action log at once.
+    """
+    def test_update_long_trip(self):
+        actions = create_mock_long_trip()
+        result = processing.parse_tripwise_action_logs_into_trip_log(actions[:1])
+        for k in range(1, len(actions)):
+            result = processing.update_trip_log(result, actions[k])
+            expected = processing.parse_tripwise_action_logs_into_trip_log(actions[:k + 1])
+            pd.testing.assert_frame_equal(result, expected)
+
+    def test_update_reroute(self):
+        base = create_mock_action_log(actions=['EXPECTED_TO_ARRIVE_AT', 'EXPECTED_TO_ARRIVE_AT'],
+                                      stops=['999X', '998X'])
+        first = base.head(1)
+        second = base.tail(1).copy()
+        second.loc[1, 'information_time'] = 1
+
+        result = processing.update_trip_log(processing.parse_tripwise_action_logs_into_trip_log([first]), second)
+        expected = processing.parse_tripwise_action_logs_into_trip_log([first, second])
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_update_stale(self):
+        """
+        Observations no later than the latest one already in the trip log ought to be refused.
+        """
+        actions = create_mock_long_trip()
+        result = processing.parse_tripwise_action_logs_into_trip_log(actions[:3])
+        with self.assertRaises(ValueError):
+            processing.update_trip_log(result, actions[1])
+
+    def test_update_smoke(self):
+        from google.transit import gtfs_realtime_pb2
+
+        feeds = []
+        for pull in [1, 2]:
+            with open("./data/gtfs_realtime_pull_{0}.dat".format(pull), "rb") as f:
+                feed = gtfs_realtime_pb2.FeedMessage()
+                feed.ParseFromString(f.read())
+                feeds.append(feed)
+        tables = [processing._parse_feed_into_tripwise_action_logs(feed, i) for i, feed in enumerate(feeds)]
+
+        for trip_id in set(tables[0]) & set(tables[1]):
+            actions = [tables[0][trip_id], tables[1][trip_id]]
+            result = processing.update_trip_log(processing.parse_tripwise_action_logs_into_trip_log(actions[:1]),
+                                                actions[1])
+            pd.testing.assert_frame_equal(result, processing.parse_tripwise_action_logs_into_trip_log(actions))
+
+
 class SmokeTests(unittest.TestCase):
     """
     Make sure that the user-facing wrapper method over all of the above works correctly. We only need to smoke test
@@ -370,6 +458,18 @@ class SmokeTests(unittest.TestCase):
         assert len(result) == 4
         assert list(result['action']) == ['STOPPED_AT', 'STOPPED_OR_SKIPPED', 'EN_ROUTE_TO', 'EN_ROUTE_TO']
 
+    def test_dtypes(self):
+        """
+        Times ought to be floats, and actions, routes, and stops categorical, including after finalization.
+        """
+        actions = [processing.parse_message_into_action_log(self.gtfs_r0.entity[0], self.gtfs_r0.entity[1], 0)]
+        for result in [processing.parse_tripwise_action_logs_into_trip_log(actions),
+                       processing._finish_trip(processing.parse_tripwise_action_logs_into_trip_log(actions), 1)]:
+            for column in ['minimum_time', 'maximum_time', 'latest_information_time']:
+                assert result[column].dtype == np.float64
+            for column in ['action', 'route_id', 'stop_id']:
+                assert result[column].dtype.name == 'category'
+
 
 class TripLogJoinTests(unittest.TestCase):
     """
@@ -0,0 +1,124 @@
+"""
+Tests the wire decoder.
+
+`wire_decoding.decode_feed_fields` reads the handful of fields that action logs are built from straight out of the
+GTFS-Realtime wire format, without going through the protobuf bindings. This test suite ascertains that it reads the
+same fields as the bindings do, that action logs and trip logbooks built with it are the same as ones built with the
+bindings, and that feeds it cannot read fall back to the bindings.
+"""
+
+import unittest
+import numpy as np
+import pandas as pd
+from google.transit import gtfs_realtime_pb2
+
+import sys; sys.path.append("../")
+# noinspection PyUnresolvedReferences
+import processing
+# noinspection PyUnresolvedReferences
+import synthetic_feeds
+# noinspection PyUnresolvedReferences
+import wire_decoding
+
+
+class TestDecodingFeedFields(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("./data/gtfs_realtime_pull_1.dat", "rb") as f:
+            cls.raw_r0 = f.read()
+
+    def test_fields(self):
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(self.raw_r0)
+        fields = wire_decoding.decode_feed_fields(self.raw_r0)
+
+        assert fields.timestamp == feed.header.timestamp
+        assert list(fields.kinds) == list(processing.index_feed_entities(feed.entity).kinds)
+
+        updates = [entity.trip_update for entity in feed.entity if entity.HasField('trip_update')]
+        stop_time_updates = [stu for update in updates for stu in update.stop_time_update]
+        assert list(np.diff(fields.stop_offsets)) == \
+            [len(entity.trip_update.stop_time_update) for entity in feed.entity]
+        assert [stop_id.decode() for stop_id in fields.stop_ids] == [stu.stop_id for stu in stop_time_updates]
+        assert list(fields.arrival_times[fields.has_arrivals]) == \
+            [stu.arrival.time for stu in stop_time_updates if stu.HasField('arrival')]
+        assert list(fields.departure_times[fields.has_departures]) == \
+            [stu.departure.time for stu in stop_time_updates if stu.HasField('departure')]
+
+        for i, entity in enumerate(feed.entity):
+            if entity.HasField('vehicle'):
+                assert fields.trip_ids[i].decode() == entity.vehicle.trip.trip_id
+                assert fields.vehicle_statuses[i] == entity.vehicle.current_status
+                assert fields.vehicle_stop_ids[i].decode() == entity.vehicle.stop_id
+            elif entity.HasField('trip_update'):
+                assert fields.trip_ids[i].decode() == entity.trip_update.trip.trip_id
+                assert fields.route_ids[i].decode() == entity.trip_update.trip.route_id
+
+    def test_malformed(self):
+        """
+        Truncated messages and unsupported wire types are errors of the wire format, not of the feed's contents.
+        """
+        with self.assertRaises(wire_decoding.WireFormatError):
+            wire_decoding.decode_feed_fields(self.raw_r0[:-5])
+        with self.assertRaises(wire_decoding.WireFormatError):
+            wire_decoding.decode_feed_fields(self.raw_r0 + b'\x7b\x7c')
+
+
+class TestWireActionLogs(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.raws = []
+        for i in [1, 2]:
+            with open("./data/gtfs_realtime_pull_{0}.dat".format(i), "rb") as f:
+                cls.raws.append(f.read())
+
+    def assert_same_action_logs(self, raw, **kwargs):
+        expected = processing._parse_feed_into_action_log(raw, 5, **kwargs)
+        result = processing._parse_feed_into_action_log(raw, 5, decoder='wire', **kwargs)
+        pd.testing.assert_frame_equal(expected, result)
+
+    def test_fixtures(self):
+        for raw in self.raws:
+            self.assert_same_action_logs(raw)
+
+    def test_filters(self):
+        for raw in self.raws:
+            self.assert_same_action_logs(raw, route_ids=['1', '4'])
+            self.assert_same_action_logs(raw, trip_id_predicate=lambda trip_id: trip_id.endswith('S'))
+
+    def test_synthetic(self):
+        """
+        Synthetic feeds skip many more stops, and have many more trips per feed, than the captured ones.
+        """
+        feeds = synthetic_feeds.generate_feeds(lines=4, trips_per_line=40, duration=1200, cadence=300,
+                                               skip_probability=0.2, raw=True)
+        for _, raw in feeds:
+            self.assert_same_action_logs(raw)
+
+    def test_fallback(self):
+        """
+        Feeds the wire decoder cannot read, such as ones with (deprecated) groups in them, are read by the bindings.
+        """
+        raw = self.raws[0] + b'\x7b\x7c'
+        self.assert_same_action_logs(raw)
+
+    def test_invalid_trip(self):
+        """
+        A trip update lacking the times its case requires is an error, whichever the decoder.
+        """
+        with open("./data/gtfs_realtime_pull_8.dat", "rb") as f:
+            raw = f.read()
+        for decoder in processing.DECODERS:
+            with self.assertRaises(AssertionError):
+                processing._parse_feed_into_action_log(raw, 5, decoder=decoder)
+
+    def test_trip_logbook(self):
+        expected = processing.parse_feeds_into_trip_logbook(self.raws, [0, 1])
+        result = processing.parse_feeds_into_trip_logbook(self.raws, [0, 1], decoder='wire')
+        assert expected.keys() == result.keys()
+        for trip_id in expected:
+            pd.testing.assert_frame_equal(expected[trip_id], result[trip_id])
+
+    def test_unknown_decoder(self):
+        with self.assertRaises(ValueError):
+            processing.parse_feeds_into_trip_logbook(self.raws, [0, 1], decoder='json')
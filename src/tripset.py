@@ -113,11 +113,141 @@ class Alert():
 
 # Methods looking up data for routes.
 
+class GTFSStaticIndex:
+    def __init__(self, gtfs_directory="../data/gtfs", cache_directory=None):
+        """
+        Lookup tables over the static GTFS schedule data: routes, stops, trips, and stop times.
+
+        Each table is read from its source file the first time it is needed, and then kept in memory. If a cache
+        directory is provided, each table is additionally pickled there, alongside the modification time of the file
+        it was built from, and read back from there on subsequent loads for so long as the source file is unchanged.
+
+        Parameters
+        ----------
+        gtfs_directory, str
+            The directory containing the unzipped GTFS files (routes.txt, stops.txt, and so on).
+        cache_directory, str or None
+            The directory in which to keep the binary cache, if any.
+        """
+        self.gtfs_directory = gtfs_directory
+        self.cache_directory = cache_directory
+        self._tables = dict()
+
+    def _table(self, name):
+        if name not in self._tables:
+            self._tables[name] = self._load_table(name)
+        return self._tables[name]
+
+    def _load_table(self, name):
+        import os
+        import pickle
+
+        source = os.path.join(self.gtfs_directory, "{0}.txt".format(name))
+        source_stat = os.stat(source)
+        source_key = (source_stat.st_mtime_ns, source_stat.st_size)
+
+        cache = os.path.join(self.cache_directory, "{0}.pkl".format(name)) if self.cache_directory else None
+        if cache and os.path.exists(cache):
+            with open(cache, "rb") as f:
+                cached = pickle.load(f)
+            if cached['source_key'] == source_key:
+                return cached['table']
+
+        table = getattr(self, "_build_{0}".format(name))(source)
+
+        if cache:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            with open(cache, "wb") as f:
+                pickle.dump({'source_key': source_key, 'table': table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return table
+
+    @staticmethod
+    def _build_routes(source):
+        import pandas as pd
+        routes = pd.read_csv(source, dtype=str, usecols=['route_id', 'route_short_name'])
+        return dict(zip(routes['route_id'], routes['route_short_name']))
+
+    @staticmethod
+    def _build_stops(source):
+        import pandas as pd
+        stops = pd.read_csv(source, dtype={'stop_id': str, 'stop_name': str},
+                            usecols=['stop_id', 'stop_name', 'stop_lat', 'stop_lon'])
+        return {stop_id: (name, (lat, lon)) for stop_id, name, lat, lon in
+                zip(stops['stop_id'], stops['stop_name'], stops['stop_lat'], stops['stop_lon'])}
+
+    @staticmethod
+    def _build_trips(source):
+        import pandas as pd
+        trips = pd.read_csv(source, dtype=str, usecols=['trip_id', 'route_id'])
+        return dict(zip(trips['trip_id'], trips['route_id']))
+
+    @staticmethod
+    def _build_stop_times(source):
+        import pandas as pd
+        import numpy as np
+
+        stop_times = pd.read_csv(source, dtype={'trip_id': str, 'stop_id': str, 'arrival_time': str,
+                                                'departure_time': str},
+                                 usecols=['trip_id', 'stop_id', 'stop_sequence', 'arrival_time', 'departure_time'])
+        stop_times = stop_times.sort_values(['trip_id', 'stop_sequence'], kind='mergesort')
+
+        # Stop times are kept as flat arrays sorted by trip, with an index of each trip's offsets into them.
+        trip_ids = stop_times['trip_id'].values
+        boundaries = np.flatnonzero(trip_ids[1:] != trip_ids[:-1]) + 1
+        starts = np.concatenate([[0], boundaries]) if len(trip_ids) else np.array([], dtype=int)
+        stops = np.concatenate([boundaries, [len(trip_ids)]]) if len(trip_ids) else np.array([], dtype=int)
+        return {
+            'offsets': {trip_ids[start]: (int(start), int(stop)) for start, stop in zip(starts, stops)},
+            'stop_id': stop_times['stop_id'].values,
+            'arrival_time': stop_times['arrival_time'].values,
+            'departure_time': stop_times['departure_time'].values
+        }
+
+    def route_short_name(self, route_id):
+        """Returns the short name (the line: "1", "A", "7", so on) of a route."""
+        return self._table('routes')[str(route_id)]
+
+    def stop_name(self, stop_id):
+        """Returns the name of a stop, or None if the stop is not known."""
+        stop = self._table('stops').get(stop_id)
+        return stop[0] if stop else None
+
+    def stop_coordinates(self, stop_id):
+        """Returns the (latitude, longitude) of a stop, or None if the stop is not known."""
+        stop = self._table('stops').get(stop_id)
+        return stop[1] if stop else None
+
+    def trip_route_id(self, trip_id):
+        """Returns the id of the route a scheduled trip runs on."""
+        return self._table('trips')[trip_id]
+
+    def trip_stop_times(self, trip_id):
+        """
+        Returns the scheduled stops of a trip, as a dict of arrays (stop_id, arrival_time, and departure_time) in stop
+        sequence order.
+        """
+        stop_times = self._table('stop_times')
+        start, stop = stop_times['offsets'][trip_id]
+        return {column: stop_times[column][start:stop] for column in ['stop_id', 'arrival_time', 'departure_time']}
+
+
+_gtfs_static_indices = dict()
+
+
+def gtfs_static_index(gtfs_directory="../data/gtfs", cache_directory=None):
+    """
+    Returns the process-wide GTFSStaticIndex over the given GTFS directory, creating it on first use.
+    """
+    import os
+    key = (os.path.abspath(gtfs_directory), cache_directory)
+    if key not in _gtfs_static_indices:
+        _gtfs_static_indices[key] = GTFSStaticIndex(gtfs_directory, cache_directory=cache_directory)
+    return _gtfs_static_indices[key]
+
+
 def map_route_id_to_line(route_id):
     """FYI: What I'm calling a 'route' is a route_short_name in the GTFS-Realtime lexicon."""
-    import pandas as pd
-    route_id = str(route_id)
-    return pd.read_csv("../data/gtfs/routes.txt").query('route_id == @route_id').iloc[0]['route_short_name']
+    return gtfs_static_index().route_short_name(route_id)
 
 
 def to_tripsets(feed):
@@ -130,43 +260,47 @@ def to_tripsets(feed):
         The FeedMessage parsed out of the GTFS-Realtime stream.
     """
 
-    # In the MTA case, alerts are provided at the end of the feed. Isolate those from the rest of the entries by
-    # finding the breakpoint at which they appear. This is a harder process than one would expect due to the way that
-    # the library is designed, hence the weirdness here.
-    alert_breakpoint = None
+    from processing import index_feed_entities, ENTITY_TRIP_UPDATE, ENTITY_VEHICLE_UPDATE
 
-    for i, entity in enumerate(reversed(feed.entity)):
-        if str(entity.alert) == '':
-            alert_breakpoint = len(feed.entity) - i
-            break
-
-    alerts = feed.entity[alert_breakpoint:] if alert_breakpoint else []
+    # Classify each of the entities in the feed once up front. In the MTA case alerts are provided at the end of the
+    # feed, and vehicle updates usually immediately follow the trip update they belong to; the index records both.
+    index = index_feed_entities(feed.entity)
+    alert_start, alert_stop = index.alert_range
+    alerts = feed.entity[alert_start:alert_stop]
 
     # The rest of the entries are Trip Alert and Train Station entities.
-    trips_breakpoint = alert_breakpoint if alert_breakpoint else len(feed.entity)
     tripsets = []
+    tripsets_by_trip_id = {}
+    paired = set()
 
-    for i in range(0, trips_breakpoint):
-        message = feed.entity[i]
-
-        if message.trip_update.trip.route_id == '':
-            # This is a vehicle update message.
-            # This message contains a position and a projected arrival time.
-            for tripset in tripsets:
-                if message.vehicle.trip.trip_id == tripset.trip_planned.id:
-                    tripset.current_vehicle_update = message
+    for i in range(0, alert_start):
+        if index.kinds[i] != ENTITY_TRIP_UPDATE:
+            # Vehicle update messages are attached to the trip update they are paired with, below.
+            continue
 
-            # TODO: What happens when you don't find an exact match this way?
+        # This is a trip update message.
+        message = feed.entity[i]
+        vehicle_index = int(index.vehicle_indices[i])
+        if vehicle_index != -1 and index.trip_ids[vehicle_index] == index.trip_ids[i]:
+            paired.add(vehicle_index)
         else:
-            # This is a trip update message.
-            realtime_tripset = TripSet(
-                line=map_route_id_to_line(message.trip_update.trip.route_id),
-                service=None,  # knowing the service requires performing a match.
-                trip_planned=map_trip_update_message_to_trip(message),
-                trip_executed=None,
-                alerts=None  # will be populated shortly
-            )
-            tripsets.append(realtime_tripset)
+            vehicle_index = -1
+        realtime_tripset = TripSet(
+            line=map_route_id_to_line(message.trip_update.trip.route_id),
+            service=None,  # knowing the service requires performing a match.
+            trip_planned=map_trip_update_message_to_trip(message),
+            trip_executed=None,
+            alerts=None,  # will be populated shortly
+            current_vehicle_update=feed.entity[vehicle_index] if vehicle_index != -1 else None
+        )
+        tripsets.append(realtime_tripset)
+        tripsets_by_trip_id.setdefault(index.trip_ids[i], []).append(realtime_tripset)
+
+    # Vehicle update messages which do not immediately follow their trip update are matched up with it by trip id.
+    for i in range(0, alert_start):
+        if index.kinds[i] == ENTITY_VEHICLE_UPDATE and i not in paired:
+            for tripset in tripsets_by_trip_id.get(index.trip_ids[i], []):
+                tripset.current_vehicle_update = feed.entity[i]
 
     return tripsets
 
@@ -176,9 +310,10 @@ def map_trip_update_message_to_trip(message):
     Load a trip update message from GTFS-Realtime into a Trip.
     """
     trip_id = message.trip_update.trip.trip_id
+    index = gtfs_static_index()
     stops = []
     for stop in message.trip_update.stop_time_update:
         stops.append(Stop(id=stop.stop_id,
-                          # name=[...], coordinates=[...],
+                          name=index.stop_name(stop.stop_id), coordinates=index.stop_coordinates(stop.stop_id),
                           arrival_time=stop.arrival.time, departure_time=stop.departure.time))
     return Trip(id=trip_id, stops=stops, alerts=[])
@@ -0,0 +1,495 @@
+"""
+A decoder for the handful of GTFS-Realtime fields that the pipeline reads, straight out of the protocol buffer wire
+format.
+
+Parsing a feed with the protobuf bindings builds a Python object for every entity, and for every field of those, only
+for `processing` to read a few of them back out. `decode_feed_fields` instead reads just those fields into flat numpy
+arrays, a level of nesting at a time, and `parse_wire_feed_into_action_log` builds the same action log out of them as
+`processing` builds out of the parsed feed. It is used by passing `decoder='wire'` to
+`processing.parse_feeds_into_trip_logbook` and friends, which fall back to the bindings for any feed it cannot read.
+"""
+
+import collections
+
+import numpy as np
+import pandas as pd
+
+from processing import (ENTITY_ALERT, ENTITY_OTHER, ENTITY_TRIP_UPDATE, ENTITY_VEHICLE_UPDATE, _ActionLogBuilder,
+                        _build_feed_index, _code_tables, _instrumented, _stage, filter_feed_index)
+
+
+class WireFormatError(ValueError):
+    """
+    Raised by `decode_feed_fields` for feeds which it cannot read: malformed or truncated ones, and ones using the
+    deprecated group encoding. These are read using the protobuf bindings instead.
+    """
+
+
+FeedFields = collections.namedtuple('FeedFields', [
+    'timestamp', 'kinds', 'trip_ids', 'route_ids', 'vehicle_statuses', 'vehicle_stop_ids', 'stop_offsets', 'stop_ids',
+    'has_arrivals', 'arrival_times', 'has_departures', 'departure_times'
+])
+FeedFields.__doc__ = """
+The fields of a GTFS-Realtime feed which the pipeline reads, as flat arrays. Identifiers are numpy byte strings.
+
+timestamp, int or None
+    The timestamp in the feed header, if there is one.
+kinds, np.ndarray of int8
+    The kind of each entity, as in a FeedIndex.
+trip_ids, route_ids, np.ndarray of bytes
+    The trip and route id of each entity's trip descriptor: that of its trip update if it has one, and otherwise that
+    of its vehicle update. Empty for entities with neither.
+vehicle_statuses, np.ndarray of int8
+    The current status of each entity's vehicle update (see `processing._ActionLogBuilder.vehicle_status_dict`), or
+    -1 for entities without one.
+vehicle_stop_ids, np.ndarray of bytes
+    The stop id of each entity's vehicle update.
+stop_offsets, np.ndarray of int64
+    The stop time updates of the trip update of entity i are those from stop_offsets[i] to stop_offsets[i + 1].
+stop_ids, has_arrivals, arrival_times, has_departures, departure_times, np.ndarray
+    The stop id, arrival, and departure of each stop time update. Times which are not given are zero.
+"""
+
+# The most bytes a varint may take up.
+_MAX_VARINT_BYTES = 10
+
+# Wire types, as in the protocol buffer encoding. Groups (wire types 3 and 4) are not supported.
+_WIRE_VARINT, _WIRE_FIXED64, _WIRE_DELIMITED, _WIRE_FIXED32 = 0, 1, 2, 5
+_SUPPORTED_WIRE_TYPES = np.isin(np.arange(8), [_WIRE_VARINT, _WIRE_FIXED64, _WIRE_DELIMITED, _WIRE_FIXED32])
+
+# The fewest messages worth reading a field of in a single pass.
+_SCAN_PASS_MINIMUM = 16
+
+
+def _read_varint(data, pos):
+    """
+    Reads a single varint from a bytes-like object, returning its value and the position after it.
+    """
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _read_wire_field(data, pos):
+    """
+    Reads a single field from a bytes-like object, returning its field number, wire type, value, and end position, as
+    in `_scan_wire_fields`.
+    """
+    tag, pos = _read_varint(data, pos)
+    wire_type = tag & 7
+    if wire_type == _WIRE_VARINT:
+        value, pos = _read_varint(data, pos)
+        value &= 0xffffffffffffffff
+    elif wire_type == _WIRE_DELIMITED:
+        length, value = _read_varint(data, pos)
+        pos = value + length
+    elif wire_type == _WIRE_FIXED64:
+        value, pos = 0, pos + 8
+    elif wire_type == _WIRE_FIXED32:
+        value, pos = 0, pos + 4
+    else:
+        raise WireFormatError("Unsupported wire type {0}.".format(wire_type))
+    return tag >> 3, wire_type, value, pos
+
+
+def _walk_wire_fields(data, pos, end):
+    """
+    Reads the fields of a single message one at a time, returning a list of (field number, wire type, value, end
+    position) tuples.
+    """
+    ret = []
+    try:
+        while pos < end:
+            ret.append(_read_wire_field(data, pos))
+            pos = ret[-1][3]
+    except IndexError:
+        raise WireFormatError("The feed is truncated.")
+    if pos > end:
+        raise WireFormatError("The feed is truncated.")
+    return ret
+
+
+def _walk_feed_message(data):
+    """
+    Walks the top level of a serialized FeedMessage, returning the span of its header and the start and end positions
+    of each of its entities. There being only one feed message, its entities are read one at a time.
+    """
+    header = (0, 0)
+    starts, ends = [], []
+    pos, end = 0, len(data)
+    try:
+        while pos < end:
+            # Entities (field 2, length-delimited) make up nearly all of the feed, and are read inline.
+            if data[pos] == 0x12:
+                length, pos = _read_varint(data, pos + 1)
+                starts.append(pos)
+                pos += length
+                ends.append(pos)
+                continue
+
+            field, wire_type, value, pos = _read_wire_field(data, pos)
+            if field == 1 and wire_type == _WIRE_DELIMITED:
+                header = (value, pos)
+    except IndexError:
+        raise WireFormatError("The feed is truncated.")
+    if pos != end:
+        raise WireFormatError("The feed is truncated.")
+    return header, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+
+def _read_varints(buf, pos):
+    """
+    Reads a varint at each of the given positions of a buffer, returning their values (as uint64) and the positions
+    after them. The buffer must be padded with `_MAX_VARINT_BYTES` zeroes.
+    """
+    first = buf[pos]
+    values, after = first.astype(np.uint64), pos + 1
+
+    # Most varints are a single byte. The rest are read all at once, continuation bits and all.
+    multibyte = np.flatnonzero(first >= 0x80)
+    if len(multibyte):
+        offsets = np.arange(_MAX_VARINT_BYTES)
+        data = buf[pos[multibyte, None] + offsets]
+        continued = data >= 0x80
+        if continued.all(axis=1).any():
+            raise WireFormatError("Malformed varint.")
+        lengths = continued.argmin(axis=1) + 1
+        data = np.where(offsets < lengths[:, None], data & 0x7f, 0).astype(np.uint64)
+        values[multibyte] = (data << (7 * offsets).astype(np.uint64)).sum(axis=1)
+        after[multibyte] += lengths - 1
+    return values, after
+
+
+def _scan_wire_fields(data, buf, starts, ends):
+    """
+    Reads the fields of many messages at once, returning the owner (the message's position in `starts`), field
+    number, wire type, value, and end position of each field, ordered by owner and then by position in the message.
+
+    The value of a varint field is the varint; that of a length-delimited field is the position its payload starts
+    at, its end position being the position it ends at. Each pass reads one field of every message with fields left
+    to read. Once only a few messages are left (the longest trip updates have dozens of stop time updates) the rest
+    of their fields are read one at a time instead, as a pass costs the same however few messages it reads.
+
+    Parameters
+    ----------
+    data, bytes-like
+        The feed.
+    buf, np.ndarray of uint8
+        The feed, padded with `_MAX_VARINT_BYTES` zeroes.
+    starts, ends, np.ndarray of int64
+        The start and end positions of each message.
+    """
+    owners = np.flatnonzero(starts < ends)
+    pos, stop = starts[owners], ends[owners]
+    scanned = []
+
+    # Every message left to read in a pass has had a field read in every pass before it, so the pass number is the
+    # position of the field in the message.
+    while len(owners):
+        tags, pos = _read_varints(buf, pos)
+        fields, wire_types = (tags >> np.uint64(3)).astype(np.int64), (tags & np.uint64(7)).astype(np.int8)
+        if not _SUPPORTED_WIRE_TYPES[wire_types].all():
+            raise WireFormatError("Unsupported wire type.")
+        values = np.zeros(len(owners), dtype=np.uint64)
+
+        varints = np.flatnonzero(wire_types == _WIRE_VARINT)
+        values[varints], pos[varints] = _read_varints(buf, pos[varints])
+        delimited = np.flatnonzero(wire_types == _WIRE_DELIMITED)
+        lengths, payload_starts = _read_varints(buf, pos[delimited])
+        if (lengths > (stop[delimited] - payload_starts).astype(np.uint64)).any():
+            raise WireFormatError("The feed is truncated.")
+        values[delimited], pos[delimited] = payload_starts, payload_starts + lengths.astype(np.int64)
+        pos[wire_types == _WIRE_FIXED64] += 8
+        pos[wire_types == _WIRE_FIXED32] += 4
+
+        if (pos > stop).any():
+            raise WireFormatError("The feed is truncated.")
+
+        scanned.append((owners, np.full(len(owners), len(scanned)), fields, wire_types, values, pos.copy()))
+        remaining = pos < stop
+        owners, pos, stop = owners[remaining], pos[remaining], stop[remaining]
+
+        if 0 < len(owners) <= _SCAN_PASS_MINIMUM:
+            passes = len(scanned)
+            for owner, start, end in zip(owners.tolist(), pos.tolist(), stop.tolist()):
+                walked = _walk_wire_fields(data, start, end)
+                fields, wire_types, values, positions = zip(*walked)
+                scanned.append((np.full(len(walked), owner), np.arange(passes, passes + len(walked)),
+                                np.array(fields, dtype=np.int64), np.array(wire_types, dtype=np.int8),
+                                np.array(values, dtype=np.uint64), np.array(positions, dtype=np.int64)))
+            break
+
+    if not scanned:
+        return [np.empty(0, dtype=dtype) for dtype in [np.int64, np.int64, np.int8, np.uint64, np.int64]]
+    owners, field_positions, *columns = [np.concatenate(column) for column in zip(*scanned)]
+    counts = np.bincount(owners, minlength=len(starts))
+    destinations = (np.cumsum(counts) - counts)[owners] + field_positions
+    ret = [np.empty_like(column) for column in [owners] + columns]
+    for column, values in zip(ret, [owners] + columns):
+        column[destinations] = values
+    return ret
+
+
+def _wire_field(scan, n, field, wire_type):
+    """
+    Returns, for each of the `n` messages scanned, the position in the scan of the last occurrence of a field (which
+    is the one that counts, for a singular field), or -1 if it does not occur.
+    """
+    owners, fields, wire_types = scan[0], scan[1], scan[2]
+    hits = np.flatnonzero((fields == field) & (wire_types == wire_type))
+    last = np.append(owners[hits][1:] != owners[hits][:-1], True) if len(hits) else np.empty(0, dtype=bool)
+    ret = np.full(n, -1, dtype=np.int64)
+    ret[owners[hits[last]]] = hits[last]
+    return ret
+
+
+def _wire_values(scan, positions, default=0):
+    """
+    Returns the values of the given fields of a scan, as int64, or `default` for fields which did not occur (position
+    -1). Varints are read as uint64, so negative int64 values come out right.
+    """
+    present = positions != -1
+    values = np.full(len(positions), default, dtype=np.int64)
+    values[present] = scan[3][positions[present]].view(np.int64)
+    return values
+
+
+def _wire_spans(scan, positions):
+    """
+    Returns the start and end positions of the payloads of the given length-delimited fields of a scan. Fields which
+    did not occur (position -1) are given an empty span, which reads as an empty message or string.
+    """
+    present = positions != -1
+    ends = np.zeros(len(positions), dtype=np.int64)
+    ends[present] = scan[4][positions[present]]
+    return _wire_values(scan, positions), ends
+
+
+def _wire_strings(buf, starts, ends):
+    """
+    Returns the strings spanning the given positions of a buffer, as a numpy array of byte strings.
+    """
+    lengths = ends - starts
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+    offsets = np.arange(width)
+    data = np.where(offsets < lengths[:, None], buf[starts[:, None] + np.minimum(offsets, lengths[:, None])], 0)
+    return np.ascontiguousarray(data, dtype=np.uint8).view('S{0}'.format(width)).ravel()
+
+
+def _decode_wire_strings(values):
+    """
+    Decodes an array of byte strings, returning the distinct strings (as str objects, in order of first appearance) and
+    the position of each value among them. Only the distinct strings are decoded.
+
+    Strings are told apart by hashing them eight bytes at a time, as integers, which is much faster than sorting them.
+    """
+    n, width = len(values), values.dtype.itemsize
+    words = np.zeros((n, -(-width // 8) * 8), dtype=np.uint8)
+    words[:, :width] = np.ascontiguousarray(values).view(np.uint8).reshape(n, width)
+    words = words.view(np.uint64)
+
+    positions = np.zeros(n, dtype=np.int64)
+    for word in words.T:
+        word_positions, word_uniques = pd.factorize(word)
+        positions = pd.factorize(positions * len(word_uniques) + word_positions)[0]
+
+    # Positions are handed out in order of first appearance, so each distinct string first appears where the running
+    # maximum of the positions goes up.
+    firsts = np.flatnonzero(np.diff(np.maximum.accumulate(positions), prepend=-1) > 0)
+    try:
+        return np.array([value.decode('utf-8') for value in values[firsts]] + [None], dtype=object)[:-1], positions
+    except UnicodeDecodeError:
+        raise WireFormatError("Malformed string.")
+
+
+def decode_feed_fields(raw_feed):
+    """
+    Decodes the fields of a raw GTFS-Realtime feed which the pipeline reads straight into flat arrays, returning a
+    FeedFields. This skips building a gtfs_realtime_pb2.FeedMessage, and the Python objects for each of its entities
+    and their fields that reading it entails.
+
+    Messages are read a level of nesting at a time: every entity, then every trip update, then every stop time update,
+    and so on, each level with one pass per field. Unknown fields (including extensions) are skipped. Raises a
+    WireFormatError for feeds which cannot be read this way.
+
+    Parameters
+    ----------
+    raw_feed, bytes, bytearray, or memoryview
+        The raw bytes of the GTFS-Realtime message.
+    """
+    with _stage('decode') as stage:
+        data = bytes(raw_feed)
+        header, entity_starts, entity_ends = _walk_feed_message(data)
+        buf = np.frombuffer(data + bytes(_MAX_VARINT_BYTES), dtype=np.uint8)
+        n = len(entity_starts)
+
+        header = _scan_wire_fields(data, buf, np.array([header[0]]), np.array([header[1]]))
+        timestamp = _wire_field(header, 1, 3, _WIRE_VARINT)
+        timestamp = int(_wire_values(header, timestamp)[0]) if timestamp[0] != -1 else None
+
+        # Entities are classified as in `processing.index_feed_entities`.
+        entities = _scan_wire_fields(data, buf, entity_starts, entity_ends)
+        trip_update_fields = _wire_field(entities, n, 3, _WIRE_DELIMITED)
+        vehicle_fields = _wire_field(entities, n, 4, _WIRE_DELIMITED)
+        kinds = np.full(n, ENTITY_OTHER, dtype=np.int8)
+        kinds[vehicle_fields != -1] = ENTITY_VEHICLE_UPDATE
+        kinds[trip_update_fields != -1] = ENTITY_TRIP_UPDATE
+        kinds[_wire_field(entities, n, 5, _WIRE_DELIMITED) != -1] = ENTITY_ALERT
+
+        trip_updates = _scan_wire_fields(data, buf, *_wire_spans(entities, trip_update_fields))
+        vehicles = _scan_wire_fields(data, buf, *_wire_spans(entities, vehicle_fields))
+
+        # Trip descriptors, of trip updates where there are any, and of vehicle updates otherwise.
+        has_trip_update = trip_update_fields != -1
+        trip_update_descriptors = _wire_spans(trip_updates, _wire_field(trip_updates, n, 1, _WIRE_DELIMITED))
+        vehicle_descriptors = _wire_spans(vehicles, _wire_field(vehicles, n, 1, _WIRE_DELIMITED))
+        descriptors = _scan_wire_fields(data, buf, *[np.where(has_trip_update, trip_update_span, vehicle_span)
+                                                     for trip_update_span, vehicle_span
+                                                     in zip(trip_update_descriptors, vehicle_descriptors)])
+        trip_ids = _wire_strings(buf, *_wire_spans(descriptors, _wire_field(descriptors, n, 1, _WIRE_DELIMITED)))
+        route_ids = _wire_strings(buf, *_wire_spans(descriptors, _wire_field(descriptors, n, 5, _WIRE_DELIMITED)))
+
+        # Vehicle updates. Statuses outside of the enumeration are unknown fields, and read as the default, as they are
+        # by the protobuf bindings.
+        vehicle_statuses = _wire_values(vehicles, _wire_field(vehicles, n, 4, _WIRE_VARINT), default=2)
+        vehicle_statuses[(vehicle_statuses < 0) | (vehicle_statuses > 2)] = 2
+        vehicle_statuses[vehicle_fields == -1] = -1
+        vehicle_statuses = vehicle_statuses.astype(np.int8)
+        vehicle_stop_ids = _wire_strings(buf, *_wire_spans(vehicles, _wire_field(vehicles, n, 7, _WIRE_DELIMITED)))
+
+        # Stop time updates, and the arrival and departure times within them.
+        stop_time_updates = np.flatnonzero((trip_updates[1] == 2) & (trip_updates[2] == _WIRE_DELIMITED))
+        stop_offsets = np.concatenate([[0], np.cumsum(np.bincount(trip_updates[0][stop_time_updates], minlength=n))])
+        m = len(stop_time_updates)
+        stop_time_updates = _scan_wire_fields(data, buf, *_wire_spans(trip_updates, stop_time_updates))
+        stop_ids = _wire_strings(buf, *_wire_spans(stop_time_updates,
+                                                   _wire_field(stop_time_updates, m, 4, _WIRE_DELIMITED)))
+
+        arrivals = _wire_field(stop_time_updates, m, 2, _WIRE_DELIMITED)
+        departures = _wire_field(stop_time_updates, m, 3, _WIRE_DELIMITED)
+        events = _scan_wire_fields(data, buf, *[np.concatenate(spans) for spans in zip(
+            _wire_spans(stop_time_updates, arrivals), _wire_spans(stop_time_updates, departures)
+        )])
+        times = _wire_values(events, _wire_field(events, 2 * m, 2, _WIRE_VARINT))
+
+        stage.count(feeds=1, bytes=len(raw_feed))
+
+    return FeedFields(timestamp=timestamp, kinds=kinds, trip_ids=trip_ids, route_ids=route_ids,
+                      vehicle_statuses=vehicle_statuses, vehicle_stop_ids=vehicle_stop_ids, stop_offsets=stop_offsets,
+                      stop_ids=stop_ids, has_arrivals=arrivals != -1, arrival_times=times[:m],
+                      has_departures=departures != -1, departure_times=times[m:])
+
+
+def _index_feed_fields(fields):
+    """
+    Returns the FeedIndex of a feed decoded by `decode_feed_fields`.
+    """
+    trip_ids, positions = _decode_wire_strings(fields.trip_ids)
+    trip_ids = trip_ids[positions]
+    trip_ids[(fields.kinds != ENTITY_TRIP_UPDATE) & (fields.kinds != ENTITY_VEHICLE_UPDATE)] = None
+    return _build_feed_index(fields.kinds, trip_ids)
+
+
+# Action log actions, in the order of the categories of a pandas.Categorical built from them.
+_ACTION_LOG_ACTIONS = np.array(['EXPECTED_TO_ARRIVE_AT', 'EXPECTED_TO_DEPART_AT', 'EXPECTED_TO_SKIP', 'STOPPED_AT'],
+                               dtype=object)
+_ARRIVE, _DEPART, _SKIP, _STOP = range(len(_ACTION_LOG_ACTIONS))
+
+
+@_instrumented('action_log', lambda action_log, *args, **kwargs: {'rows': len(action_log)})
+def _parse_feed_fields_into_action_log(fields, information_time, index):
+    """
+    Parses a feed decoded by `decode_feed_fields` into a single pandas.DataFrame, the same one that
+    `processing._parse_message_list_into_action_log` builds out of the feed's messages.
+
+    The case analysis of `processing._ActionLogBuilder.add` is carried out for every stop time update of every trip
+    update at once. Each of its cases becomes a mask over the stop time updates, which are then expanded into the one
+    or two action log rows their cases call for.
+    """
+    trip_updates = np.flatnonzero(index.kinds == ENTITY_TRIP_UPDATE)
+    vehicles = index.vehicle_indices[trip_updates]
+    counts = fields.stop_offsets[trip_updates + 1] - fields.stop_offsets[trip_updates]
+
+    # The trip update each stop time update belongs to, and its position within it.
+    owners = np.repeat(np.arange(len(trip_updates)), counts)
+    positions = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    stops = fields.stop_offsets[trip_updates][owners] + positions
+
+    in_progress = (vehicles != -1)[owners]
+    stopped_at = in_progress & (fields.vehicle_statuses[vehicles][owners] == 1)
+    first, last = positions == 0, positions == counts[owners] - 1
+    has_arrival, has_departure = fields.has_arrivals[stops], fields.has_departures[stops]
+    at_vehicle_stop = fields.stop_ids[stops] == fields.vehicle_stop_ids[vehicles][owners]
+
+    # The cases, in the order in which they are considered.
+    planned_origin = ~in_progress & first
+    planned = ~in_progress & ~first & ~last
+    terminus = ~planned_origin & last
+    skipped = in_progress & ~last & ~(has_arrival & has_departure)
+    en_route = in_progress & ~last & ~skipped & ~stopped_at & at_vehicle_stop
+    stopped = in_progress & ~last & ~skipped & stopped_at & at_vehicle_stop
+    ahead = in_progress & ~last & ~skipped & ~at_vehicle_stop
+
+    if not ((~planned_origin | (~has_arrival & has_departure)) & (~planned | (has_arrival & has_departure)) &
+            (~terminus | has_arrival) & (~skipped | has_arrival | has_departure)).all():
+        raise AssertionError("The feed contains a stop time update without the times its case calls for.")
+    if not (planned_origin | planned | terminus | skipped | en_route | stopped | ahead).all():
+        raise ValueError
+
+    # Stop time updates with both an expected arrival and an expected departure expand into two rows.
+    actions = np.full(len(stops), _ARRIVE, dtype=np.int8)
+    actions[planned_origin] = _DEPART
+    actions[skipped] = _SKIP
+    actions[stopped | (terminus & stopped_at & (counts[owners] == 1))] = _STOP
+    times = np.where(planned_origin | (skipped & ~has_arrival), fields.departure_times[stops],
+                     fields.arrival_times[stops])
+
+    expanded = planned | en_route | ahead
+    rows = np.repeat(np.arange(len(stops)), 1 + expanded)
+    departures = np.zeros(len(rows), dtype=bool)
+    departures[(np.cumsum(1 + expanded) - 1)[expanded]] = True
+    actions = np.where(departures, _DEPART, actions[rows])
+    times = np.where(departures, fields.departure_times[stops][rows], times[rows])
+
+    # Identifiers are decoded before being spread over the rows, so that each is only looked at once. Those of trip
+    # updates without any stop time updates are left out, there being no rows for them.
+    trip_ids, trip_id_positions = _decode_wire_strings(fields.trip_ids[trip_updates][counts > 0])
+    route_ids, route_id_positions = _decode_wire_strings(fields.route_ids[trip_updates][counts > 0])
+    stop_ids, stop_id_positions = _decode_wire_strings(fields.stop_ids[stops])
+    owners = np.cumsum(counts > 0)[owners] - 1
+    trip_id_positions, route_id_positions = trip_id_positions[owners][rows], route_id_positions[owners][rows]
+    stop_id_positions = stop_id_positions[rows]
+    present_actions, action_codes = np.unique(actions, return_inverse=True)
+
+    n = len(rows)
+    information_time = np.nan if information_time is None else information_time
+    return pd.DataFrame({
+        'trip_id': trip_ids[trip_id_positions],
+        'route_id': pd.Categorical.from_codes(_code_tables.route_ids.encode(route_ids)[route_id_positions],
+                                              dtype=_code_tables.route_ids.dtype),
+        'information_time': np.full(n, information_time),
+        'action': pd.Categorical.from_codes(action_codes, categories=pd.Index(_ACTION_LOG_ACTIONS[present_actions])),
+        'stop_id': pd.Categorical.from_codes(_code_tables.stop_ids.encode(stop_ids)[stop_id_positions],
+                                             dtype=_code_tables.stop_ids.dtype),
+        'time_assigned': times.astype(np.int64)
+    }, columns=_ActionLogBuilder.columns)
+
+
+def parse_wire_feed_into_action_log(raw_feed, information_time, route_ids=None, trip_id_predicate=None):
+    """
+    Parses a raw feed into a single pandas.DataFrame by way of `decode_feed_fields`, without building a
+    gtfs_realtime_pb2.FeedMessage. Trips not selected by `route_ids` or `trip_id_predicate` are passed over, as in
+    `processing.filter_feed_index`.
+    """
+    fields = decode_feed_fields(raw_feed)
+    index = _index_feed_fields(fields)
+    if route_ids is not None or trip_id_predicate is not None:
+        entity_route_ids, positions = _decode_wire_strings(fields.route_ids)
+        index = filter_feed_index(None, index, route_ids=route_ids, trip_id_predicate=trip_id_predicate,
+                                  entity_route_ids=entity_route_ids[positions])
+    return _parse_feed_fields_into_action_log(fields, information_time, index)